@@ -0,0 +1,141 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils import PAYMENT_FIELDS, edit_version, expiry_dates, start_dates
+
+# Grouping keys of the aggregate cube; Expiry Date is static per row, so expiry
+# counters can be derived for any "today" without touching the raw rows again
+CUBE_KEYS = ["Paket", "Blockchain Network", "Month", "Expiry Date"]
+
+
+def _earlier_payments(df):
+    """Payments replaced by renewals (Payment History), as revenue without users"""
+    if "Payment History" not in df.columns:
+        return None
+    history = df["Payment History"].astype("string").fillna("")
+    entries = [entry.split("|") for value in history[history != ""] for entry in value.split("; ")]
+    if not entries:
+        return None
+    payments = pd.DataFrame([(e + [""] * len(PAYMENT_FIELDS))[:len(PAYMENT_FIELDS)] for e in entries],
+                            columns=PAYMENT_FIELDS)
+    return pd.DataFrame({
+        "Paket": payments["Paket"],
+        "Blockchain Network": payments["Blockchain Network"],
+        "Month": start_dates(payments).dt.strftime("%Y-%m").fillna(""),
+        "Expiry Date": pd.NaT,
+        "Users": 0,
+        "Revenue": pd.to_numeric(payments["Harga (USDT)"].str.replace(",", "", regex=False),
+                                 errors="coerce").fillna(0.0)
+    })
+
+
+def build_cube(df):
+    """Single grouped pass: user count and revenue per package/network/month/expiry date.
+
+    Earlier payments of renewed registrations add revenue in their own month but no users.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=CUBE_KEYS + ["Users", "Revenue"])
+
+    frame = pd.DataFrame({
+        "Paket": df["Paket"].astype(str),
+        "Blockchain Network": df["Blockchain Network"].astype(str),
+        "Month": start_dates(df).dt.strftime("%Y-%m").fillna(""),
+        "Expiry Date": expiry_dates(df),
+        "Users": 1,
+        "Revenue": pd.to_numeric(df["Harga (USDT)"], errors="coerce").fillna(0.0)
+    })
+    earlier = _earlier_payments(df)
+    if earlier is not None:
+        frame = pd.concat([frame, earlier], ignore_index=True)
+    cube = frame.groupby(CUBE_KEYS, dropna=False, sort=False)[["Users", "Revenue"]].sum()
+    return cube.reset_index()
+
+
+def merge_cubes(left, right):
+    """Combine two cubes (e.g. existing totals and newly appended rows)"""
+    if left.empty:
+        return right
+    if right.empty:
+        return left
+    combined = pd.concat([left, right], ignore_index=True)
+    return combined.groupby(CUBE_KEYS, dropna=False, sort=False)[["Users", "Revenue"]].sum().reset_index()
+
+
+class RegistrationAggregates:
+    """Counters and revenue rollups, maintained incrementally as rows are appended"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cube = build_cube(pd.DataFrame())
+        self.rows = 0
+        self.anchor = None
+
+    def update(self, df):
+        """Bring the aggregates up to date with df.
+
+        If df only grew since the last update (same row at the previous end and
+        no earlier row edited in place), just the new rows are aggregated;
+        otherwise the cube is rebuilt.
+        """
+        with self.lock:
+            anchor = self._anchor(df, self.rows)
+            if self.rows and len(df) >= self.rows and anchor == self.anchor:
+                if len(df) > self.rows:
+                    self.cube = merge_cubes(self.cube, build_cube(df.iloc[self.rows:]))
+            else:
+                self.cube = build_cube(df)
+            self.rows = len(df)
+            self.anchor = self._anchor(df, self.rows)
+        return self
+
+    @staticmethod
+    def _anchor(df, rows):
+        """Identity of the last already-aggregated row, and the edit version of all of them"""
+        if rows == 0 or len(df) < rows:
+            return None
+        last = df.iloc[rows - 1]
+        return (str(last.get("Timestamp")), str(last.get("Transaction Hash")), edit_version(df, rows))
+
+    def totals(self):
+        """Total users and revenue"""
+        return {"users": int(self.cube["Users"].sum()), "revenue": float(self.cube["Revenue"].sum())}
+
+    def package_counts(self):
+        """Number of users per package"""
+        return self.cube.groupby("Paket")["Users"].sum().astype(int).to_dict()
+
+    def expiry_counts(self, today=None):
+        """Active / expired / expiring soon (<=7 days) / lifetime counters, as on the expiry page"""
+        now = pd.Timestamp.now() if today is None else pd.Timestamp(today)
+        days = ((self.cube["Expiry Date"] - now) // pd.Timedelta(days=1)).to_numpy(dtype=float, na_value=np.nan)
+        users = self.cube["Users"].to_numpy()
+        return {
+            "active": int(users[days >= 0].sum()),
+            "expired": int(users[days < 0].sum()),
+            "expiring_soon": int(users[(days >= 0) & (days <= 7)].sum()),
+            "lifetime": int(users[(self.cube["Paket"] == "Lifetime").to_numpy()].sum())
+        }
+
+    def revenue_by(self, dimension):
+        """Users and revenue rolled up by 'Paket', 'Blockchain Network' or 'Month'"""
+        rollup = self.cube.groupby(dimension, dropna=False)[["Users", "Revenue"]].sum().reset_index()
+        rollup["Users"] = rollup["Users"].astype(int)
+        return rollup.sort_values(dimension if dimension == "Month" else "Revenue",
+                                  ascending=dimension == "Month").reset_index(drop=True)
+
+
+# One aggregate set per data source in this process
+_aggregates = {}
+_aggregates_lock = threading.Lock()
+
+
+def get_aggregates(df, source="default"):
+    """Shared aggregates for a data source, updated with the latest DataFrame"""
+    with _aggregates_lock:
+        if source not in _aggregates:
+            _aggregates[source] = RegistrationAggregates()
+        aggregates = _aggregates[source]
+    return aggregates.update(df)
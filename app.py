@@ -1,8 +1,25 @@
+import json
+import time
 import streamlit as st
 from datetime import datetime
 import pandas as pd
 from google_services import GoogleServices
-from utils import generate_telegram_link, generate_explorer_link, format_currency, calculate_expiry_date, get_days_remaining, get_status_color
+from local_store import LocalServices
+from registration import (PACKAGES, NETWORKS, DUPLICATE_TX_MESSAGE, TX_PREFIX_MESSAGE, validate_registration, build_user_data,
+                          submit_registration, submit_renewal)
+from repository import EditConflict
+from aggregates import get_aggregates
+from bulk_import import IMPORTED, IMPORT_COLUMNS, MAX_IMPORT_ROWS, check_batch, import_registrations, read_batch, read_images, template_csv
+from export import EXPORT_FORMATS, export_key, get_export
+from image_processing import upload_stats
+from metrics import Laps, metrics, start_exporters
+from schema import format_date, with_links
+from search_index import get_search_index
+from tx_verification import TxVerifier
+from utils import format_currency, compute_expiry, paginate
+
+# Start of this script run, for the render timing in the sidebar
+run_start = time.perf_counter()
 
 # Page config
 st.set_page_config(
@@ -14,12 +31,76 @@ st.set_page_config(
 # Initialize Google Services
 @st.cache_resource
 def init_google_services():
-    return GoogleServices()
+    # Run fully offline against the local SQLite stand-in when configured
+    local_config = st.secrets.get("local_store", {})
+    if local_config.get("offline"):
+        return LocalServices(
+            local_config.get("path", "data/registrations.db"),
+            local_config.get("image_dir", "data/images")
+        )
+    return GoogleServices(st.secrets)
 
 gs = init_google_services()
 
+# On-chain payment checks, shared by all sessions for the cache and rate limits
+@st.cache_resource
+def init_verifier():
+    return TxVerifier(st.secrets)
+
+verifier = init_verifier()
+
+# Optional JSON lines log / HTTP endpoint for the metrics (see [metrics] in README)
+start_exporters(st.secrets.get("metrics", {}))
+
+PAGE_SIZES = [10, 25, 50, 100]
+
+# Expiry page status filter on first load; expired users are only loaded when selected
+EXPIRY_DEFAULT_STATUSES = ["Active", "Expiring Soon", "Lifetime"]
+
+def list_controls(total_rows, sort_options, key):
+    """Render view mode, sort, page size and page cursor controls for a user list"""
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        view_mode = st.radio("Tampilan", ["Cards", "Table"], horizontal=True, key=f"{key}_view")
+    with col2:
+        sort_by = st.selectbox("Urutkan", list(sort_options), key=f"{key}_sort")
+    with col3:
+        page_size = st.selectbox("Per halaman", PAGE_SIZES, key=f"{key}_page_size")
+    
+    # Keep the cursor in range when filters shrink the result set
+    total_pages = max(1, -(-total_rows // page_size))
+    if st.session_state.get(f"{key}_page", 1) > total_pages:
+        st.session_state[f"{key}_page"] = total_pages
+    with col4:
+        page_number = st.number_input(f"Halaman (1-{total_pages})", min_value=1, max_value=total_pages,
+                                      step=1, key=f"{key}_page")
+    
+    return view_mode, sort_options[sort_by], page_size, page_number
+
+def export_controls(label, file_stem, filters, build_frame, key):
+    """Generate an export only when requested; repeated downloads of the same data are served from cache"""
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        fmt = st.selectbox("Format", list(EXPORT_FORMATS), key=f"{key}_export_format")
+    
+    cache_key = export_key(gs.data_version, filters, fmt)
+    with col2:
+        if st.button("📦 Siapkan file export", key=f"{key}_export_prepare"):
+            st.session_state[f"{key}_export"] = cache_key
+        
+        # Only offer the download while data, filters and format are unchanged
+        if st.session_state.get(f"{key}_export") == cache_key:
+            extension, mime = EXPORT_FORMATS[fmt]
+            st.download_button(
+                label=label,
+                data=get_export(cache_key, build_frame, fmt),
+                file_name=f"{file_stem}_{datetime.now().strftime('%Y%m%d')}{extension}",
+                mime=mime
+            )
+
 # Sidebar navigation
-page = st.sidebar.selectbox("Menu", ["📝 Registration Form", "📊 User Dashboard", "⏰ User Expiry"])
+page = st.sidebar.selectbox("Menu", ["📝 Registration Form", "📥 Bulk Import", "✏️ Edit Registrasi", "📊 User Dashboard",
+                                     "⏰ User Expiry", "📈 Analytics"])
 
 # ==================== REGISTRATION FORM ====================
 if page == "📝 Registration Form":
@@ -32,13 +113,12 @@ if page == "📝 Registration Form":
         with col1:
             user_name = st.text_input("Nama User *", placeholder="John Doe")
             telegram_user_id = st.text_input("Telegram User ID *", placeholder="7058728559")
-            package = st.selectbox("Paket *", ["Monthly", "Quarterly", "Lifetime"])
+            package = st.selectbox("Paket *", PACKAGES)
             price = st.number_input("Harga (USDT) *", min_value=0.0, step=0.01, format="%.2f")
         
         with col2:
             start_date = st.date_input("Tanggal Mulai *", value=datetime.now())
-            blockchain_network = st.selectbox("Blockchain Network *", 
-                ["BSC (BEP20)", "Ethereum (ERC20)", "Polygon", "Arbitrum", "Optimism"])
+            blockchain_network = st.selectbox("Blockchain Network *", NETWORKS)
             tx_hash = st.text_input("Transaction Hash *", placeholder="0x...")
             
         # Image upload
@@ -46,47 +126,49 @@ if page == "📝 Registration Form":
         uploaded_image = st.file_uploader("Upload gambar bukti pembayaran *", 
                                          type=['png', 'jpg', 'jpeg', 'webp'])
         
+        renew_in_place = st.checkbox("🔄 Jika Telegram User ID sudah terdaftar, perpanjang registrasi terakhirnya (tanpa baris baru)",
+                                     value=True)
+        
         # Submit button
-        submitted = st.form_submit_button("✅ Submit Registration", use_container_width=True)
+        submitted = st.form_submit_button("✅ Submit Registration", width="stretch")
         
         if submitted:
             # Validation
-            if not all([user_name, telegram_user_id, price, tx_hash, uploaded_image]):
-                st.error("❌ Semua field wajib diisi!")
-            elif not telegram_user_id.isdigit():
-                st.error("❌ Telegram User ID harus berupa angka!")
-            elif not tx_hash.startswith("0x"):
-                st.error("❌ Transaction Hash harus diawali dengan '0x'")
+            error = validate_registration(user_name, telegram_user_id, price, tx_hash, uploaded_image)
+            if error:
+                st.error(error)
+            elif gs.is_duplicate_transaction(tx_hash):
+                # O(1) index lookup, before anything is uploaded
+                st.error(f"❌ {DUPLICATE_TX_MESSAGE}")
             else:
+                existing = None
+                if gs.has_telegram_user(telegram_user_id):
+                    if renew_in_place:
+                        existing = gs.latest_registration(telegram_user_id)
+                    if existing and existing.get("Row ID"):
+                        st.info("ℹ️ Telegram User ID ini sudah terdaftar: registrasi terakhirnya diperpanjang.")
+                    else:
+                        existing = None
+                        st.info("ℹ️ Telegram User ID ini sudah terdaftar sebelumnya (perpanjangan).")
                 with st.spinner("⏳ Uploading data..."):
                     try:
-                        # Upload image to Google Cloud Storage
-                        image_url = gs.upload_image_to_gcs(uploaded_image, user_name)
-                        
-                        # Generate links
-                        telegram_link = generate_telegram_link(telegram_user_id)
-                        explorer_link = generate_explorer_link(blockchain_network, tx_hash)
-                        
-                        # Prepare data
-                        user_data = {
-                            "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            "Nama User": user_name,
-                            "Telegram User ID": telegram_user_id,
-                            "Telegram Link": telegram_link,
-                            "Paket": package,
-                            "Harga (USDT)": price,
-                            "Tanggal Mulai": start_date.strftime("%Y-%m-%d"),
-                            "Blockchain Network": blockchain_network,
-                            "Transaction Hash": tx_hash,
-                            "Explorer Link": explorer_link,
-                            "Bukti Transfer": image_url
-                        }
+                        # Prepare data (links are generated here)
+                        user_data = build_user_data(user_name, telegram_user_id, package, price,
+                                                    start_date, blockchain_network, tx_hash)
                         
-                        # Save to Google Sheets
-                        gs.append_to_sheet(user_data)
+                        # Upload image to Google Cloud Storage and save to Google Sheets
+                        with metrics.timed("registration.submit"):
+                            if existing:
+                                user_data = submit_renewal(gs, existing, user_data, uploaded_image)
+                            else:
+                                user_data = submit_registration(gs, user_data, uploaded_image)
+                        telegram_link = user_data["Telegram Link"]
+                        explorer_link = user_data["Explorer Link"]
                         
                         st.success("✅ Registrasi berhasil disimpan!")
                         st.balloons()
+                        if user_data.get("Proof Match"):
+                            st.warning(f"⚠️ Bukti transfer sama dengan registrasi sebelumnya ({user_data['Proof Match']}), mohon dicek manual.")
                         
                         # Show summary
                         st.markdown("### 📋 Summary")
@@ -101,14 +183,146 @@ if page == "📝 Registration Form":
                     except Exception as e:
                         st.error(f"❌ Error: {str(e)}")
 
+# ==================== BULK IMPORT ====================
+elif page == "📥 Bulk Import":
+    st.title("📥 Bulk Registration Import")
+    st.markdown("---")
+    
+    st.markdown(f"""
+    Upload file **CSV/XLSX** (maks. {MAX_IMPORT_ROWS} baris) dengan kolom: {', '.join(f'`{c}`' for c in IMPORT_COLUMNS)}.  
+    Kolom `Bukti Transfer` berisi nama file gambar di dalam **ZIP** bukti transfer.
+    """)
+    st.download_button("📄 Download template CSV", data=template_csv(), file_name="luxquant_import_template.csv",
+                       mime="text/csv")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        batch_file = st.file_uploader("File registrasi *", type=['csv', 'xlsx'])
+    with col2:
+        images_file = st.file_uploader("ZIP bukti transfer *", type=['zip'])
+    
+    if batch_file and images_file:
+        try:
+            batch_df = read_batch(batch_file.name, batch_file.getvalue())
+            images = read_images(images_file.getvalue())
+            
+            # Whole batch checked at once with the form's rules and the duplicate index
+            errors = check_batch(gs, batch_df, images)
+            valid_count = int((errors == "").sum())
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Baris", len(batch_df))
+            with col2:
+                st.metric("✅ Valid", valid_count)
+            with col3:
+                st.metric("❌ Error", len(batch_df) - valid_count)
+            
+            if valid_count < len(batch_df):
+                st.dataframe(batch_df.assign(Error=errors)[errors != ""], hide_index=True, width="stretch")
+            
+            if valid_count and st.button(f"🚀 Import {valid_count} registrasi valid", width="stretch"):
+                progress = st.progress(0.0, text="⏳ Uploading bukti transfer...")
+                with metrics.timed("registration.bulk_import"):
+                    result = import_registrations(
+                        gs, batch_df, images,
+                        progress=lambda done, total: progress.progress(done / total, text=f"⏳ Upload {done}/{total}")
+                    )
+                progress.empty()
+                
+                imported = int((result["Status"] == IMPORTED).sum())
+                if imported:
+                    st.success(f"✅ {imported} registrasi berhasil diimport!")
+                if imported < len(result):
+                    st.warning(f"⚠️ {len(result) - imported} baris tidak diimport, lihat kolom Status.")
+                reused = int((result["Proof Match"] != "").sum())
+                if reused:
+                    st.warning(f"⚠️ {reused} bukti transfer sama dengan registrasi sebelumnya, lihat kolom Proof Match.")
+                st.dataframe(result, hide_index=True, width="stretch")
+                st.download_button("📥 Download hasil import", data=result.to_csv(index=False).encode("utf-8"),
+                                   file_name=f"luxquant_import_result_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                                   mime="text/csv")
+        except Exception as e:
+            st.error(f"❌ Error: {str(e)}")
+
+# ==================== EDIT REGISTRATION ====================
+elif page == "✏️ Edit Registrasi":
+    st.title("✏️ Edit Registrasi")
+    st.markdown("---")
+    
+    lookup_id = st.text_input("Telegram User ID", placeholder="7058728559").strip()
+    if lookup_id:
+        history = gs.find_users(filters={"Telegram User ID": lookup_id})
+        if history.empty:
+            st.info("Tidak ada registrasi untuk Telegram User ID ini.")
+        else:
+            # Latest registration first
+            history = history.iloc[::-1].reset_index(drop=True)
+            choice = st.selectbox(
+                "Registrasi", history.index,
+                format_func=lambda i: f"{format_date(history.at[i, 'Tanggal Mulai'])} · {history.at[i, 'Paket']} · "
+                                      f"{str(history.at[i, 'Transaction Hash'])[:18]}..."
+            )
+            row = history.loc[choice]
+            row_id = row.get("Row ID")
+            if pd.isna(row_id) or not row_id:
+                st.warning("⚠️ Registrasi ini belum punya Row ID. Jalankan `python backfill_row_ids.py` dulu.")
+            else:
+                # The revision the operator loaded, kept across reruns until saved or reloaded
+                revision_key = f"edit_revision_{row_id}"
+                if revision_key not in st.session_state:
+                    st.session_state[revision_key] = str(row.get("Revision") or "")
+                if st.session_state[revision_key] != str(row.get("Revision") or ""):
+                    st.warning("⚠️ Registrasi ini sudah diubah sejak dibuka. Muat ulang sebelum menyimpan.")
+                if st.button("🔄 Muat ulang"):
+                    del st.session_state[revision_key]
+                    st.rerun()
+                
+                start_value = row['Tanggal Mulai'] if pd.notna(row['Tanggal Mulai']) else datetime.now()
+                with st.form(f"edit_{row_id}"):
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        edit_name = st.text_input("Nama User *", value=str(row['Nama User']))
+                        edit_package = st.selectbox("Paket *", PACKAGES, index=PACKAGES.index(row['Paket'])
+                                                    if row['Paket'] in PACKAGES else 0)
+                        edit_price = st.number_input("Harga (USDT) *", min_value=0.0, step=0.01, format="%.2f",
+                                                     value=float(row['Harga (USDT)']) if pd.notna(row['Harga (USDT)']) else 0.0)
+                    with col2:
+                        edit_start = st.date_input("Tanggal Mulai *", value=start_value)
+                        edit_network = st.selectbox("Blockchain Network *", NETWORKS,
+                                                    index=NETWORKS.index(row['Blockchain Network'])
+                                                    if row['Blockchain Network'] in NETWORKS else 0)
+                        edit_tx = st.text_input("Transaction Hash *", value=str(row['Transaction Hash']))
+                    
+                    if st.form_submit_button("💾 Simpan", width="stretch"):
+                        if not edit_tx.startswith("0x"):
+                            st.error(TX_PREFIX_MESSAGE)
+                        else:
+                            changes = {
+                                "Nama User": edit_name, "Paket": edit_package, "Harga (USDT)": edit_price,
+                                "Tanggal Mulai": edit_start.strftime("%Y-%m-%d"),
+                                "Blockchain Network": edit_network, "Transaction Hash": edit_tx,
+                            }
+                            try:
+                                saved = gs.update_registration(row_id, changes, st.session_state[revision_key])
+                                st.session_state[revision_key] = saved["Revision"]
+                                st.success(f"✅ Registrasi disimpan (revisi {saved['Revision']})")
+                            except EditConflict as e:
+                                st.error(f"❌ {str(e)}")
+                            except Exception as e:
+                                st.error(f"❌ Error: {str(e)}")
+
 # ==================== USER DASHBOARD ====================
 elif page == "📊 User Dashboard":
     st.title("📊 LuxQuant User Dashboard")
     st.markdown("---")
     
     try:
+        laps = Laps("dashboard")
+        
         # Load data from Google Sheets
         df = gs.get_all_users()
+        laps.lap("load")
         
         if df.empty:
             st.info("Belum ada data user terdaftar.")
@@ -116,14 +330,19 @@ elif page == "📊 User Dashboard":
             # Statistics
             col1, col2, col3, col4 = st.columns(4)
             
+            # Counters come from the incrementally maintained aggregates
+            aggregates = get_aggregates(df)
+            package_counts = aggregates.package_counts()
+            
             with col1:
-                st.metric("Total Users", len(df))
+                st.metric("Total Users", aggregates.totals()["users"])
             with col2:
-                st.metric("Monthly", len(df[df['Paket'] == 'Monthly']))
+                st.metric("Monthly", package_counts.get('Monthly', 0))
             with col3:
-                st.metric("Quarterly", len(df[df['Paket'] == 'Quarterly']))
+                st.metric("Quarterly", package_counts.get('Quarterly', 0))
             with col4:
-                st.metric("Lifetime", len(df[df['Paket'] == 'Lifetime']))
+                st.metric("Lifetime", package_counts.get('Lifetime', 0))
+            laps.lap("compute")
             
             st.markdown("---")
             
@@ -134,57 +353,116 @@ elif page == "📊 User Dashboard":
                                                options=["Monthly", "Quarterly", "Lifetime"],
                                                default=["Monthly", "Quarterly", "Lifetime"])
             with col2:
-                search = st.text_input("🔍 Search User", placeholder="Cari nama user...")
+                search = st.text_input("🔍 Search User", placeholder="Cari nama, Telegram ID atau TX hash...")
             
             # Apply filters
             filtered_df = df[df['Paket'].isin(package_filter)]
             if search:
-                filtered_df = filtered_df[filtered_df['Nama User'].str.contains(search, case=False, na=False)]
+                positions = get_search_index(df, gs.data_version).search(search)
+                filtered_df = filtered_df[filtered_df.index.isin(df.index[positions])]
+            laps.lap("filter")
             
             # Display table
             st.markdown(f"### Showing {len(filtered_df)} users")
             
-            # Format display
-            display_df = filtered_df.copy()
+            view_mode, (sort_column, ascending), page_size, page_number = list_controls(
+                len(filtered_df),
+                {
+                    "Terbaru": ("Timestamp", False),
+                    "Nama User (A-Z)": ("Nama User", True),
+                    "Harga tertinggi": ("Harga (USDT)", False),
+                    "Tanggal Mulai terbaru": ("Tanggal Mulai", False)
+                },
+                key="dashboard"
+            )
+            
+            # Sort server-side and materialize only the visible page
+            sorted_df = filtered_df.sort_values(sort_column, ascending=ascending, kind='stable')
+            display_df, _ = paginate(sorted_df, page_number, page_size)
+            display_df = with_links(display_df)
+            
+            # Payment status from the verification cache; lookups only on request
+            if verifier.enabled:
+                items = list(zip(display_df['Blockchain Network'].astype(str),
+                                 display_df['Transaction Hash'].astype(str),
+                                 display_df['Harga (USDT)']))
+                if st.button("🔍 Verifikasi transaksi di halaman ini"):
+                    with st.spinner("Memeriksa transaksi di blockchain..."):
+                        results = verifier.verify_many(items)
+                else:
+                    results = verifier.cached_results(items)
+                display_df['Verifikasi'] = [r['label'] for r in results]
+                display_df['Verifikasi Detail'] = [r['detail'] for r in results]
             display_df['Harga (USDT)'] = display_df['Harga (USDT)'].apply(format_currency)
+            display_df['Tanggal Mulai'] = display_df['Tanggal Mulai'].apply(format_date)
             
-            # Make links clickable
-            for idx, row in display_df.iterrows():
-                with st.expander(f"👤 {row['Nama User']} - {row['Paket']} ({row['Harga (USDT)']})"):
-                    col1, col2 = st.columns(2)
+            if view_mode == "Table":
+                table_columns = ['Nama User', 'Telegram User ID', 'Paket', 'Harga (USDT)', 'Tanggal Mulai',
+                                 'Blockchain Network', 'Transaction Hash', 'Telegram Link',
+                                 'Explorer Link', 'Bukti Transfer']
+                if 'Thumbnail' in display_df.columns:
+                    table_columns.append('Thumbnail')
+                if 'Proof Match' in display_df.columns:
+                    table_columns.append('Proof Match')
+                if 'Verifikasi' in display_df.columns:
+                    table_columns += ['Verifikasi', 'Verifikasi Detail']
+                st.dataframe(
+                    display_df[table_columns],
+                    column_config={
+                        "Thumbnail": st.column_config.ImageColumn("Preview"),
+                        "Telegram Link": st.column_config.LinkColumn("Telegram", display_text="Open Profile"),
+                        "Explorer Link": st.column_config.LinkColumn("Explorer", display_text="View Transaction"),
+                        "Bukti Transfer": st.column_config.LinkColumn("Bukti Transfer", display_text="View Image")
+                    },
+                    hide_index=True,
+                    width="stretch"
+                )
+            else:
+                # Make links clickable
+                for idx, row in display_df.iterrows():
+                    with st.expander(f"👤 {row['Nama User']} - {row['Paket']} ({row['Harga (USDT)']})"):
+                        col1, col2 = st.columns(2)
                     
-                    with col1:
-                        st.markdown(f"""
-                        **Telegram ID:** {row['Telegram User ID']}  
-                        **Telegram:** [Open Profile]({row['Telegram Link']})  
-                        **Paket:** {row['Paket']}  
-                        **Harga:** {row['Harga (USDT)']}  
-                        **Tanggal Mulai:** {row['Tanggal Mulai']}
-                        """)
+                        with col1:
+                            st.markdown(f"""
+                            **Telegram ID:** {row['Telegram User ID']}  
+                            **Telegram:** [Open Profile]({row['Telegram Link']})  
+                            **Paket:** {row['Paket']}  
+                            **Harga:** {row['Harga (USDT)']}  
+                            **Tanggal Mulai:** {row['Tanggal Mulai']}
+                            """)
                     
-                    with col2:
-                        st.markdown(f"""
-                        **Network:** {row['Blockchain Network']}  
-                        **TX Hash:** `{row['Transaction Hash'][:20]}...`  
-                        **Explorer:** [View Transaction]({row['Explorer Link']})  
-                        **Bukti Transfer:** [View Image]({row['Bukti Transfer']})
-                        """)
+                        with col2:
+                            st.markdown(f"""
+                            **Network:** {row['Blockchain Network']}  
+                            **TX Hash:** `{row['Transaction Hash'][:20]}...`  
+                            **Explorer:** [View Transaction]({row['Explorer Link']})  
+                            **Bukti Transfer:** [View Image]({row['Bukti Transfer']})
+                            """)
+                            if row.get('Verifikasi Detail'):
+                                st.markdown(f"**Verifikasi:** {row['Verifikasi']} {row['Verifikasi Detail']}")
+                            proof_match = row.get('Proof Match')
+                            if pd.notna(proof_match) and proof_match:
+                                st.warning(f"⚠️ Bukti transfer sama dengan registrasi sebelumnya: {proof_match}")
                         
-                        # Display image
-                        try:
-                            st.image(row['Bukti Transfer'], width=300)
-                        except:
-                            st.warning("Image preview not available")
+                            # Load the proof image only on request, preferring the small thumbnail
+                            if st.toggle("🖼️ Tampilkan bukti transfer", key=f"proof_{idx}"):
+                                try:
+                                    st.image(row.get('Thumbnail') or row['Bukti Transfer'], width=300)
+                                except:
+                                    st.warning("Image preview not available")
+            laps.lap("render")
             
-            # Download as CSV
+            # Download (generated on request)
             st.markdown("---")
-            csv = filtered_df.to_csv(index=False)
-            st.download_button(
-                label="📥 Download Data (CSV)",
-                data=csv,
-                file_name=f"luxquant_users_{datetime.now().strftime('%Y%m%d')}.csv",
-                mime="text/csv"
+            export_controls(
+                "📥 Download Data",
+                "luxquant_users",
+                (tuple(package_filter), search),
+                lambda: with_links(filtered_df),
+                key="dashboard"
             )
+            laps.lap("export")
             
     except Exception as e:
         st.error(f"❌ Error loading data: {str(e)}")
@@ -195,36 +473,39 @@ elif page == "⏰ User Expiry":
     st.markdown("---")
     
     try:
-        # Load data from Google Sheets
-        df = gs.get_all_users()
+        laps = Laps("expiry")
+        
+        # Without expired users in the filter only their registrations are loaded, and
+        # on a partitioned store only the partitions that can still hold them are read
+        status_filter = st.session_state.get("expiry_status", EXPIRY_DEFAULT_STATUSES)
+        show_expired = "Expired" in status_filter
+        df = gs.get_all_users() if show_expired else gs.get_active_users()
+        data_source = "default" if show_expired else "expiry-active"
+        laps.lap("load")
         
         if df.empty:
             st.info("Belum ada data user terdaftar.")
         else:
-            # Calculate expiry for each user
-            df['Expiry Date'] = df.apply(
-                lambda row: calculate_expiry_date(row['Tanggal Mulai'], row['Paket']), 
-                axis=1
-            )
-            df['Days Remaining'] = df['Expiry Date'].apply(get_days_remaining)
-            df['Status'] = df['Days Remaining'].apply(get_status_color)
+            # Calculate expiry for all users at once (Expiry Date, Days Remaining, Status, Sort Key)
+            df = df.join(compute_expiry(df))
             
             # Statistics
             col1, col2, col3, col4 = st.columns(4)
             
-            active_users = len(df[(df['Days Remaining'].notna()) & (df['Days Remaining'] >= 0)])
-            expired_users = len(df[(df['Days Remaining'].notna()) & (df['Days Remaining'] < 0)])
-            expiring_soon = len(df[(df['Days Remaining'].notna()) & (df['Days Remaining'] >= 0) & (df['Days Remaining'] <= 7)])
-            lifetime_users = len(df[df['Paket'] == 'Lifetime'])
+            counts = get_aggregates(df, data_source).expiry_counts()
             
             with col1:
-                st.metric("🟢 Active", active_users)
+                st.metric("🟢 Active", counts["active"])
             with col2:
-                st.metric("🔴 Expired", expired_users)
+                if show_expired:
+                    st.metric("🔴 Expired", counts["expired"])
+                else:
+                    st.metric("🔴 Expired", "—", help="Pilih status Expired untuk memuat dan menghitung user expired")
             with col3:
-                st.metric("🟠 Expiring Soon (≤7d)", expiring_soon)
+                st.metric("🟠 Expiring Soon (≤7d)", counts["expiring_soon"])
             with col4:
-                st.metric("♾️ Lifetime", lifetime_users)
+                st.metric("♾️ Lifetime", counts["lifetime"])
+            laps.lap("compute")
             
             st.markdown("---")
             
@@ -234,10 +515,11 @@ elif page == "⏰ User Expiry":
                 status_filter = st.multiselect(
                     "Filter by Status",
                     options=["Active", "Expired", "Expiring Soon", "Lifetime"],
-                    default=["Active", "Expiring Soon", "Lifetime"]
+                    default=EXPIRY_DEFAULT_STATUSES,
+                    key="expiry_status"
                 )
             with col2:
-                search = st.text_input("🔍 Search User", placeholder="Cari nama user...")
+                search = st.text_input("🔍 Search User", placeholder="Cari nama, Telegram ID atau TX hash...")
             
             # Apply filters
             filtered_df = df.copy()
@@ -258,83 +540,166 @@ elif page == "⏰ User Expiry":
             
             # Search filter
             if search:
-                filtered_df = filtered_df[filtered_df['Nama User'].str.contains(search, case=False, na=False)]
+                # The active subset also changes with the date, not only with the data
+                version = gs.data_version if show_expired else (gs.data_version, str(datetime.now().date()))
+                positions = get_search_index(df, version, data_source).search(search)
+                filtered_df = filtered_df[filtered_df.index.isin(df.index[positions])]
             
-            # Sort by expiry date (soonest first, but put expired at end)
-            filtered_df['Sort Key'] = filtered_df['Days Remaining'].apply(
-                lambda x: 999999 if x is None else (1000000 + abs(x) if x < 0 else x)
-            )
-            filtered_df = filtered_df.sort_values('Sort Key')
+            laps.lap("filter")
             
             # Display users
             st.markdown(f"### Showing {len(filtered_df)} users")
             
-            for idx, row in filtered_df.iterrows():
-                expiry_date = row['Expiry Date']
-                days_remaining = row['Days Remaining']
-                status = row['Status']
+            view_mode, (sort_column, ascending), page_size, page_number = list_controls(
+                len(filtered_df),
+                {
+                    # Soonest first, but put expired at end
+                    "Expiry terdekat": ("Sort Key", True),
+                    "Nama User (A-Z)": ("Nama User", True),
+                    "Tanggal Mulai terbaru": ("Tanggal Mulai", False)
+                },
+                key="expiry"
+            )
+            
+            # Sort server-side and materialize only the visible page
+            filtered_df = filtered_df.sort_values(sort_column, ascending=ascending, kind='stable')
+            page_df, _ = paginate(filtered_df, page_number, page_size)
+            page_df = with_links(page_df)
+            page_df['Tanggal Mulai'] = page_df['Tanggal Mulai'].apply(format_date)
+            
+            if view_mode == "Table":
+                table_df = page_df[['Status', 'Nama User', 'Paket', 'Tanggal Mulai', 'Expiry Date',
+                                    'Days Remaining', 'Telegram Link']].copy()
+                table_df['Expiry Date'] = table_df['Expiry Date'].dt.strftime("%Y-%m-%d").fillna("Never")
+                st.dataframe(
+                    table_df,
+                    column_config={
+                        "Telegram Link": st.column_config.LinkColumn("Telegram", display_text="Open Profile")
+                    },
+                    hide_index=True,
+                    width="stretch"
+                )
+            else:
+                for idx, row in page_df.iterrows():
+                    expiry_date = row['Expiry Date']
+                    days_remaining = row['Days Remaining']
+                    status = row['Status']
                 
-                # Determine status text
-                if row['Paket'] == 'Lifetime':
-                    status_text = "♾️ Lifetime (No Expiry)"
-                    expiry_display = "Never"
-                elif days_remaining is None:
-                    status_text = "❓ Unknown"
-                    expiry_display = "N/A"
-                elif days_remaining < 0:
-                    status_text = f"🔴 Expired ({abs(days_remaining)} days ago)"
-                    expiry_display = expiry_date.strftime("%Y-%m-%d")
-                elif days_remaining == 0:
-                    status_text = "🟠 Expires Today"
-                    expiry_display = expiry_date.strftime("%Y-%m-%d")
-                elif days_remaining <= 7:
-                    status_text = f"🟠 Expiring in {days_remaining} days"
-                    expiry_display = expiry_date.strftime("%Y-%m-%d")
-                else:
-                    status_text = f"🟢 Active ({days_remaining} days left)"
-                    expiry_display = expiry_date.strftime("%Y-%m-%d")
+                    # Determine status text
+                    if row['Paket'] == 'Lifetime':
+                        status_text = "♾️ Lifetime (No Expiry)"
+                        expiry_display = "Never"
+                    elif pd.isna(days_remaining):
+                        status_text = "❓ Unknown"
+                        expiry_display = "N/A"
+                    elif days_remaining < 0:
+                        status_text = f"🔴 Expired ({abs(days_remaining)} days ago)"
+                        expiry_display = expiry_date.strftime("%Y-%m-%d")
+                    elif days_remaining == 0:
+                        status_text = "🟠 Expires Today"
+                        expiry_display = expiry_date.strftime("%Y-%m-%d")
+                    elif days_remaining <= 7:
+                        status_text = f"🟠 Expiring in {days_remaining} days"
+                        expiry_display = expiry_date.strftime("%Y-%m-%d")
+                    else:
+                        status_text = f"🟢 Active ({days_remaining} days left)"
+                        expiry_display = expiry_date.strftime("%Y-%m-%d")
                 
-                with st.expander(f"{status} {row['Nama User']} - {row['Paket']} - {status_text}"):
-                    col1, col2 = st.columns(2)
+                    with st.expander(f"{status} {row['Nama User']} - {row['Paket']} - {status_text}"):
+                        col1, col2 = st.columns(2)
                     
-                    with col1:
-                        st.markdown(f"""
-                        **User Info:**
-                        - Name: {row['Nama User']}
-                        - Package: {row['Paket']}
-                        - Price: {format_currency(row['Harga (USDT)'])}
-                        - Telegram: [Open Profile]({row['Telegram Link']})
-                        """)
+                        with col1:
+                            st.markdown(f"""
+                            **User Info:**
+                            - Name: {row['Nama User']}
+                            - Package: {row['Paket']}
+                            - Price: {format_currency(row['Harga (USDT)'])}
+                            - Telegram: [Open Profile]({row['Telegram Link']})
+                            """)
                     
-                    with col2:
-                        st.markdown(f"""
-                        **Subscription Info:**
-                        - Start Date: {row['Tanggal Mulai']}
-                        - Expiry Date: {expiry_display}
-                        - Status: {status_text}
-                        """)
+                        with col2:
+                            st.markdown(f"""
+                            **Subscription Info:**
+                            - Start Date: {row['Tanggal Mulai']}
+                            - Expiry Date: {expiry_display}
+                            - Status: {status_text}
+                            """)
+            laps.lap("render")
             
             # Export
             st.markdown("---")
             
-            # Prepare export data
-            export_df = filtered_df.copy()
-            export_df['Expiry Date'] = export_df['Expiry Date'].apply(
-                lambda x: x.strftime("%Y-%m-%d") if x is not None else "Never"
-            )
-            export_df['Days Remaining'] = export_df['Days Remaining'].apply(
-                lambda x: str(x) if x is not None else "N/A"
-            )
-            export_df = export_df[['Nama User', 'Paket', 'Harga (USDT)', 'Tanggal Mulai', 
-                                   'Expiry Date', 'Days Remaining', 'Status']]
+            # Prepare export data (only runs when a file is generated)
+            def build_expiry_export():
+                export_df = filtered_df[['Nama User', 'Paket', 'Harga (USDT)', 'Tanggal Mulai', 
+                                         'Expiry Date', 'Days Remaining', 'Status']].copy()
+                export_df['Tanggal Mulai'] = export_df['Tanggal Mulai'].dt.strftime("%Y-%m-%d").fillna("")
+                export_df['Expiry Date'] = export_df['Expiry Date'].dt.strftime("%Y-%m-%d").fillna("Never")
+                export_df['Days Remaining'] = export_df['Days Remaining'].astype("string").fillna("N/A")
+                return export_df
             
-            csv = export_df.to_csv(index=False)
-            st.download_button(
-                label="📥 Download Expiry Report (CSV)",
-                data=csv,
-                file_name=f"luxquant_expiry_report_{datetime.now().strftime('%Y%m%d')}.csv",
-                mime="text/csv"
+            # Days Remaining changes daily, so today's date is part of the cache key
+            export_controls(
+                "📥 Download Expiry Report",
+                "luxquant_expiry_report",
+                (tuple(status_filter), search, sort_column, ascending, datetime.now().strftime('%Y%m%d')),
+                build_expiry_export,
+                key="expiry"
             )
+            laps.lap("export")
+            
+    except Exception as e:
+        st.error(f"❌ Error loading data: {str(e)}")
+
+# ==================== ANALYTICS PAGE ====================
+elif page == "📈 Analytics":
+    st.title("📈 Revenue Analytics")
+    st.markdown("---")
+    
+    try:
+        laps = Laps("analytics")
+        
+        # Load data from Google Sheets
+        df = gs.get_all_users()
+        laps.lap("load")
+        
+        if df.empty:
+            st.info("Belum ada data user terdaftar.")
+        else:
+            aggregates = get_aggregates(df)
+            totals = aggregates.totals()
+            counts = aggregates.expiry_counts()
+            
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Total Revenue", format_currency(totals["revenue"]))
+            with col2:
+                st.metric("Total Users", totals["users"])
+            with col3:
+                st.metric("Avg / User", format_currency(totals["revenue"] / totals["users"]))
+            with col4:
+                st.metric("🟢 Active Subscriptions", counts["active"] + counts["lifetime"])
+            
+            st.markdown("---")
+            
+            # Revenue by month
+            st.markdown("### 📅 Revenue per Bulan")
+            by_month = aggregates.revenue_by("Month")
+            st.bar_chart(by_month.set_index("Month")["Revenue"])
+            
+            # Revenue by package and network
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown("### 📦 Revenue per Paket")
+                by_package = aggregates.revenue_by("Paket")
+                st.bar_chart(by_package.set_index("Paket")["Revenue"])
+                st.dataframe(by_package, hide_index=True, width="stretch")
+            with col2:
+                st.markdown("### 🔗 Revenue per Network")
+                by_network = aggregates.revenue_by("Blockchain Network")
+                st.bar_chart(by_network.set_index("Blockchain Network")["Revenue"])
+                st.dataframe(by_network, hide_index=True, width="stretch")
+            laps.lap("render")
             
     except Exception as e:
         st.error(f"❌ Error loading data: {str(e)}")
@@ -342,3 +707,43 @@ elif page == "⏰ User Expiry":
 # Footer
 st.markdown("---")
 st.markdown("Made with ❤️ for LuxQuant | Powered by Streamlit")
+
+# Startup timing report (one-time setup steps of this process + this rerun)
+with st.sidebar.expander("⏱️ Startup timings"):
+    timings = gs.startup_report()
+    timings["this_rerun"] = time.perf_counter() - run_start
+    st.dataframe(
+        pd.DataFrame({"Step": list(timings), "Seconds": [round(v, 3) for v in timings.values()]}),
+        hide_index=True
+    )
+
+metrics.record("app.rerun", time.perf_counter() - run_start)
+
+# Performance panel, only with ?admin=<token> matching [admin].token in secrets
+admin_token = st.secrets.get("admin", {}).get("token")
+if admin_token and st.query_params.get("admin") == admin_token:
+    with st.sidebar.expander("📈 Performance", expanded=True):
+        snapshot = metrics.snapshot()
+        stages = snapshot["stages"]
+        st.caption(f"Process uptime {snapshot['uptime_seconds']:.0f}s · stage = app page step, services.* = GoogleServices, rows.*/blobs.* = backend API calls")
+        st.dataframe(
+            pd.DataFrame([
+                {"Stage": name, "Calls": s["count"], "Errors": s["errors"], "p50 ms": s["p50_ms"],
+                 "p90 ms": s["p90_ms"], "p99 ms": s["p99_ms"], "Max ms": s["max_ms"], "Payload": s["payload"]}
+                for name, s in stages.items()
+            ]),
+            hide_index=True
+        )
+        histogram_stage = st.selectbox("Histogram", list(stages), key="perf_histogram")
+        if histogram_stage:
+            # Numbered labels keep the buckets in order on the chart's sorted axis
+            histogram = stages[histogram_stage]["histogram"]
+            st.bar_chart(pd.Series(list(histogram.values()), name="calls",
+                                   index=[f"{i:02d} ≤{bound} ms" for i, bound in enumerate(histogram)]))
+        stats = upload_stats()
+        st.caption(f"Uploads: {stats['images']} images, {stats['bytes_saved'] / 1024 / 1024:.1f} MB saved by re-encoding, "
+                   f"{stats['reused']} already stored")
+        st.download_button("⬇️ metrics.json", data=json.dumps(snapshot, indent=2),
+                           file_name="metrics.json", mime="application/json")
+        if st.button("Reset metrics"):
+            metrics.reset()
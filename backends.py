@@ -0,0 +1,320 @@
+"""
+Storage backends behind GoogleServices.
+
+A row store holds the registration table (header + rows, addressed by sheet
+row numbers, data from row 2) and a blob store holds proof images. The Google
+implementations live in google_services; this module has the interfaces, a
+SQLite/filesystem pair and an in-memory pair with injected latency for load
+tests and benchmarks.
+"""
+
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from metrics import instrument_methods
+
+# Payload size recorded per backend call: rows for row stores, bytes for blob stores
+ROW_PAYLOADS = {
+    "read_all": lambda args, kwargs, result: len(result),
+    "read_from": lambda args, kwargs, result: len(result),
+    "append_rows": lambda args, kwargs, result: len(args[1]),
+    "update_cells": lambda args, kwargs, result: len(args[1]),
+    "read_rows": lambda args, kwargs, result: len(result),
+    "update_rows": lambda args, kwargs, result: len(args[1]),
+}
+BLOB_PAYLOADS = {
+    "upload": lambda args, kwargs, result: len(args[2]),
+    "download": lambda args, kwargs, result: len(result),
+}
+
+
+class RowStore(ABC):
+    """Table of string rows; row 1 is the header"""
+
+    # Identifies the table; keys the shared cache and write-behind spool
+    key = "rows"
+
+    def __init__(self):
+        self.timings = {}
+
+    # Row numbers survive a restart, so the SQLite mirror can warm-start the cache
+    stable_rows = True
+
+    def __init_subclass__(cls, metrics_prefix="rows", **kwargs):
+        # Every backend call shows up as rows.<method> in the metrics
+        super().__init_subclass__(**kwargs)
+        instrument_methods(metrics_prefix, ROW_PAYLOADS)(cls)
+
+    @abstractmethod
+    def header(self):
+        """Header row, or an empty list for an empty table"""
+
+    @abstractmethod
+    def set_header(self, header):
+        """Write the header row"""
+
+    @abstractmethod
+    def read_all(self):
+        """All rows including the header, like Worksheet.get_values()"""
+
+    @abstractmethod
+    def read_from(self, start_row, width):
+        """Rows from sheet row ``start_row`` to the end, ``width`` columns wide"""
+
+    @abstractmethod
+    def append_rows(self, rows):
+        """Append rows after the last row"""
+
+    @abstractmethod
+    def update_cells(self, updates):
+        """Write single cells given as (row, col, value), both 1-based, in one call"""
+
+    @abstractmethod
+    def read_rows(self, row_numbers, width):
+        """The given rows, ``width`` columns wide, in one call ([] for rows past the end)"""
+
+    @abstractmethod
+    def update_rows(self, rows):
+        """Overwrite whole rows given as (row, values) in one call.
+
+        Returns the row numbers whose rows now live elsewhere (a partitioned
+        store moves a row whose partition changed); callers re-read those.
+        """
+
+
+class BlobStore(ABC):
+    """Flat namespace of binary objects addressed by URL"""
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        instrument_methods("blobs", BLOB_PAYLOADS)(cls)
+
+    @abstractmethod
+    def upload(self, name, data, content_type):
+        """Store an object and return its URL"""
+
+    @abstractmethod
+    def download(self, name):
+        """Bytes of a stored object"""
+
+    @abstractmethod
+    def delete(self, name):
+        """Delete a stored object"""
+
+    @abstractmethod
+    def exists(self, name):
+        """True if an object with this name is stored"""
+
+    @abstractmethod
+    def url_for(self, name):
+        """URL of an object, as upload returns it"""
+
+    @abstractmethod
+    def name_from_url(self, url):
+        """Object name for a URL of this store, or None for other URLs"""
+
+
+class Latency:
+    """Injected delay per backend call: fixed seconds plus seeded uniform jitter"""
+
+    def __init__(self, seconds=0.0, jitter=0.0, seed=0):
+        self.seconds = seconds
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def pause(self):
+        if not self.seconds and not self.jitter:
+            return
+        with self.lock:
+            delay = self.seconds + self.random.uniform(0, self.jitter)
+        time.sleep(delay)
+
+
+class MemoryRowStore(RowStore):
+    """In-process row store; every call sleeps for the injected latency"""
+
+    def __init__(self, latency=None, key=None):
+        super().__init__()
+        self.latency = latency or Latency()
+        self.key = key or f"memory-{id(self)}"
+        self.lock = threading.Lock()
+        self.values = []
+        self.calls = 0
+
+    def _call(self):
+        self.calls += 1
+        self.latency.pause()
+
+    def header(self):
+        self._call()
+        with self.lock:
+            return list(self.values[0]) if self.values else []
+
+    def set_header(self, header):
+        self._call()
+        with self.lock:
+            header = [str(h) for h in header]
+            if self.values:
+                self.values[0] = header
+            else:
+                self.values.append(header)
+
+    def read_all(self):
+        self._call()
+        with self.lock:
+            return [list(row) for row in self.values]
+
+    def read_from(self, start_row, width):
+        self._call()
+        with self.lock:
+            return [list(row[:width]) for row in self.values[start_row - 1:]]
+
+    def append_rows(self, rows):
+        self._call()
+        with self.lock:
+            self.values.extend([str(v) for v in row] for row in rows)
+
+    def update_cells(self, updates):
+        self._call()
+        with self.lock:
+            for row, col, value in updates:
+                cells = self.values[row - 1]
+                cells.extend([""] * (col - len(cells)))
+                cells[col - 1] = str(value)
+
+    def read_rows(self, row_numbers, width):
+        self._call()
+        with self.lock:
+            return [list(self.values[row - 1][:width]) if row <= len(self.values) else [] for row in row_numbers]
+
+    def update_rows(self, rows):
+        self._call()
+        with self.lock:
+            for row, values in rows:
+                self.values[row - 1] = [str(v) for v in values]
+        return []
+
+
+class MemoryBlobStore(BlobStore):
+    """In-process blob store with memory:// URLs and injected latency"""
+
+    PREFIX = "memory://"
+
+    def __init__(self, latency=None):
+        self.latency = latency or Latency()
+        self.lock = threading.Lock()
+        self.objects = {}
+
+    def upload(self, name, data, content_type):
+        self.latency.pause()
+        with self.lock:
+            self.objects[name] = (bytes(data), content_type)
+        return self.PREFIX + name
+
+    def download(self, name):
+        self.latency.pause()
+        with self.lock:
+            return self.objects[name][0]
+
+    def delete(self, name):
+        self.latency.pause()
+        with self.lock:
+            self.objects.pop(name, None)
+
+    def exists(self, name):
+        self.latency.pause()
+        with self.lock:
+            return name in self.objects
+
+    def url_for(self, name):
+        return self.PREFIX + name
+
+    def name_from_url(self, url):
+        if isinstance(url, str) and url.startswith(self.PREFIX):
+            return url[len(self.PREFIX):]
+        return None
+
+
+class SqliteRowStore(RowStore):
+    """Row store on a LocalStore SQLite file"""
+
+    def __init__(self, path):
+        from local_store import LocalStore
+
+        super().__init__()
+        self.store = LocalStore(path)
+        # Absolute path: two databases with the same file name in different folders are different stores
+        self.key = "sqlite-" + os.path.abspath(path)
+
+    def header(self):
+        return list(self.store.header)
+
+    def set_header(self, header):
+        if not self.store.header:
+            self.store.replace_all(list(header), [])
+        else:
+            self.store.add_columns(header)
+
+    def read_all(self):
+        header, rows = self.store.get_rows()
+        return [header] + rows if header else []
+
+    def read_from(self, start_row, width):
+        if start_row <= 1:
+            return [row[:width] for row in self.read_all()]
+        _, rows = self.store.rows_after(start_row - 1)
+        return [row[:width] for _, row in rows]
+
+    def append_rows(self, rows):
+        self.store.append_rows(rows)
+
+    def update_cells(self, updates):
+        self.store.update_cells(updates)
+
+    def read_rows(self, row_numbers, width):
+        found = self.store.rows_at(row_numbers)
+        return [found.get(row, [])[:width] for row in row_numbers]
+
+    def update_rows(self, rows):
+        for row, values in rows:
+            self.store.upsert_rows(row, [values])
+        return []
+
+
+class FileBlobStore(BlobStore):
+    """Blob store on a local folder; URLs are file paths"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def upload(self, name, data, content_type):
+        path = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def download(self, name):
+        with open(os.path.join(self.directory, name), "rb") as f:
+            return f.read()
+
+    def delete(self, name):
+        path = os.path.join(self.directory, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.directory, name))
+
+    def url_for(self, name):
+        return os.path.join(self.directory, name)
+
+    def name_from_url(self, url):
+        if isinstance(url, str) and url.startswith(self.directory + os.sep):
+            return os.path.relpath(url, self.directory)
+        return None
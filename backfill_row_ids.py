@@ -0,0 +1,19 @@
+"""
+Row ID Backfill
+Gives registrations created before row IDs existed a Row ID and Revision in
+one batched sheet update, so they can be renewed and edited in place.
+
+    python backfill_row_ids.py
+"""
+
+from google_services import GoogleServices
+
+
+def main():
+    gs = GoogleServices()
+    updated = gs.backfill_row_ids()
+    print(f"✅ Row IDs assigned to {updated} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+Thumbnail Backfill
+Creates WebP thumbnails for registrations uploaded before thumbnails existed
+and fills the Thumbnail column in one batched sheet update.
+
+    python backfill_thumbnails.py [--limit N]
+"""
+
+import argparse
+
+from google_services import GoogleServices
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill proof image thumbnails")
+    parser.add_argument("--limit", type=int, default=None, help="maximum number of rows to process")
+    args = parser.parse_args()
+
+    gs = GoogleServices()
+    updated = gs.backfill_thumbnails(limit=args.limit)
+    print(f"✅ Thumbnails created for {updated} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Expiry computation benchmark
+Compares the per-row apply path with utils.compute_expiry and checks both agree.
+
+    python benchmarks/bench_expiry.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import calculate_expiry_date, compute_expiry, get_days_remaining, get_status_color
+
+
+def make_users(n, seed=42):
+    """Synthetic registrations with realistic start dates and package mix"""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp.now().normalize() - pd.to_timedelta(rng.integers(0, 400, n), unit="D")
+    return pd.DataFrame({
+        'Tanggal Mulai': start.strftime("%Y-%m-%d"),
+        'Paket': rng.choice(["Monthly", "Quarterly", "Lifetime"], n, p=[0.6, 0.3, 0.1]),
+    })
+
+
+def apply_path(df):
+    """The original row-by-row computation from the expiry page"""
+    out = pd.DataFrame(index=df.index)
+    out['Expiry Date'] = df.apply(
+        lambda row: calculate_expiry_date(row['Tanggal Mulai'], row['Paket']),
+        axis=1
+    )
+    out['Days Remaining'] = out['Expiry Date'].apply(get_days_remaining)
+    out['Status'] = out['Days Remaining'].apply(get_status_color)
+    return out
+
+
+def check_same(df, today):
+    """Verify the vectorized engine matches the scalar helpers row for row"""
+    fast = compute_expiry(df, today=today)
+    for i, (start, package) in enumerate(zip(df['Tanggal Mulai'], df['Paket'])):
+        expiry = calculate_expiry_date(start, package)
+        days = None if expiry is None else (expiry - today).days
+        got = fast['Days Remaining'].iloc[i]
+        assert (days is None and pd.isna(got)) or days == got, (start, package, days, got)
+        assert get_status_color(days) == fast['Status'].iloc[i]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--skip-apply-above", type=int, default=1_000_000,
+                        help="skip the slow apply path for larger sizes")
+    args = parser.parse_args()
+
+    check_same(make_users(5_000), datetime.now())
+    print("✅ vectorized results match calculate_expiry_date/get_days_remaining/get_status_color")
+
+    print(f"{'rows':>10} {'apply (s)':>12} {'vectorized (s)':>15} {'speedup':>10}")
+    for n in args.sizes:
+        df = make_users(n)
+
+        t0 = time.perf_counter()
+        compute_expiry(df)
+        vectorized = time.perf_counter() - t0
+
+        if n <= args.skip_apply_above:
+            t0 = time.perf_counter()
+            apply_path(df)
+            applied = time.perf_counter() - t0
+            print(f"{n:>10} {applied:>12.3f} {vectorized:>15.4f} {applied / vectorized:>9.0f}x")
+        else:
+            print(f"{n:>10} {'skipped':>12} {vectorized:>15.4f} {'-':>10}")
+
+
+if __name__ == "__main__":
+    main()
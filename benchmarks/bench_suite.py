@@ -0,0 +1,248 @@
+"""
+Benchmark suite for the submit and dashboard paths
+Runs GoogleServices on the in-memory backends (no Google account needed) against
+synthetic registrations and reports latency percentiles, throughput and peak
+memory per case. Results are written to JSON; pass --compare to diff two runs.
+
+    python benchmarks/bench_suite.py --sizes 1000 10000 100000 [--latency-ms 0]
+    python benchmarks/bench_suite.py --compare old.json new.json
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import Latency, MemoryBlobStore, MemoryRowStore
+from export import build_export
+from google_services import GoogleServices
+from schema import with_links
+from search_index import SearchIndex
+from utils import SHEET_HEADERS, compute_expiry, generate_explorer_link, generate_telegram_link
+
+NETWORKS = ["BSC (BEP20)", "Ethereum (ERC20)", "Polygon", "Arbitrum", "Optimism"]
+PACKAGES = {"Monthly": 25.0, "Quarterly": 65.0, "Lifetime": 300.0}
+FIRST_NAMES = ["Budi", "Siti", "Agus", "Dewi", "Kadek", "Wijaya", "Andi", "Rina", "José", "Putri"]
+LAST_NAMES = ["Santoso", "Wijaya", "Pratama", "Saputra", "Lestari", "Hidayat", "Nugroho", "Kusuma"]
+SEARCH_QUERIES = ["budi", "wijay", "santoso", "0x00ab", "7000123", "kadek lest"]
+
+
+def make_rows(n, seed=42):
+    """Synthetic sheet rows (strings, SHEET_HEADERS order) with a realistic mix"""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp.now().normalize() - pd.to_timedelta(rng.integers(0, 400, n), unit="D")
+    stamp = start + pd.to_timedelta(rng.integers(0, 86400, n), unit="s")
+    first = rng.choice(FIRST_NAMES, n)
+    last = rng.choice(LAST_NAMES, n)
+    packages = rng.choice(list(PACKAGES), n, p=[0.6, 0.3, 0.1])
+    networks = rng.choice(NETWORKS, n)
+    telegram_ids = rng.integers(1_000_000, 9_999_999_999, n)
+    start_str = start.strftime("%Y-%m-%d")
+    stamp_str = stamp.strftime("%Y-%m-%d %H:%M:%S")
+
+    rows = []
+    for i in range(n):
+        tx_hash = f"0x{i:08x}{int(telegram_ids[i]):056x}"
+        rows.append([
+            stamp_str[i], f"{first[i]} {last[i]} {i}", str(telegram_ids[i]),
+            generate_telegram_link(telegram_ids[i]), packages[i], str(PACKAGES[packages[i]]),
+            start_str[i], networks[i], tx_hash, generate_explorer_link(networks[i], tx_hash),
+            f"memory://proof_{i}.webp", f"memory://thumbnails/proof_{i}.webp",
+        ])
+    return rows
+
+
+def make_image(width=1600, height=1200, seed=0):
+    """PNG roughly the size of a phone screenshot: gradients plus sensor-like noise"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1)
+    pixels = np.clip(base + rng.integers(-12, 12, (height, width, 3)), 0, 255).astype(np.uint8)
+    output = io.BytesIO()
+    Image.fromarray(pixels).save(output, "PNG")
+    return output.getvalue()
+
+
+def make_services(rows, latency_ms, spool_dir):
+    """GoogleServices on fresh in-memory backends preloaded with rows"""
+    latency = Latency(latency_ms / 1000)
+    row_store = MemoryRowStore(latency)
+    row_store.values = [list(SHEET_HEADERS)] + rows
+    config = {"google_config": {
+        "cache_ttl_seconds": 3600, "spool_dir": spool_dir,
+        "write_batch_size": 1_000_000, "write_flush_seconds": 3600,
+    }}
+    return GoogleServices(config, row_store=row_store, blob_store=MemoryBlobStore(latency))
+
+
+def measure(fn, iterations, setup=None, items=1):
+    """Time fn() per iteration, then one more run under tracemalloc for peak memory"""
+    samples = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ms = np.array(samples) * 1000
+    return {
+        "iterations": iterations,
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p90_ms": round(float(np.percentile(ms, 90)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "max_ms": round(float(ms.max()), 4),
+        "throughput_per_s": round(items * iterations / max(sum(samples), 1e-12), 2),
+        "peak_mb": round(peak / 1024 / 1024, 3),
+    }
+
+
+def run_size(n, args, spool_dir, image):
+    """All cases for one dataset size; returns {case: stats}"""
+    rows = make_rows(n)
+    gs = make_services(rows, args.latency_ms, spool_dir)
+    results = {}
+    small = max(3, args.iterations // 4) if n >= 100_000 else args.iterations
+
+    # Submit path
+    counter = iter(range(10 ** 9))
+    # Bytes after the PNG end marker give every upload a new content hash (same pixels)
+    results["upload_image_to_gcs"] = measure(
+        lambda: gs.upload_image_to_gcs(io.BytesIO(image + str(next(counter)).encode()), "bench user"),
+        max(3, args.iterations // 4)
+    )
+    gs.upload_image_to_gcs(io.BytesIO(image), "bench user")
+    results["upload_image_reused"] = measure(
+        lambda: gs.upload_image_to_gcs(io.BytesIO(image), "bench user"), args.iterations
+    )
+
+    def append():
+        i = next(counter)
+        gs.append_to_sheet({h: "" for h in SHEET_HEADERS} | {
+            "Nama User": f"Bench {i}", "Telegram User ID": str(i), "Transaction Hash": f"0xbench{i}",
+            "Paket": "Monthly", "Tanggal Mulai": "2026-01-01",
+        })
+    results["append_to_sheet"] = measure(append, args.iterations)
+    results["flush_writes"] = measure(gs.flush_writes, 1, setup=lambda: [append() for _ in range(20)], items=20)
+
+    # Dashboard path
+    results["get_all_users_cold"] = measure(
+        gs.get_all_users, small, setup=lambda: gs.invalidate_cache(full=True), items=n
+    )
+    results["get_all_users_warm"] = measure(gs.get_all_users, args.iterations, items=n)
+
+    df = gs.get_all_users()
+    results["compute_expiry"] = measure(lambda: compute_expiry(df), small, items=n)
+    results["filter_paket"] = measure(lambda: df[df["Paket"].isin(["Monthly", "Quarterly"])], args.iterations, items=n)
+    results["search_contains"] = measure(
+        lambda: [df["Nama User"].str.contains(q, case=False, na=False) for q in SEARCH_QUERIES],
+        small, items=len(SEARCH_QUERIES)
+    )
+    index = SearchIndex().build(df)
+    results["search_index_build"] = measure(lambda: SearchIndex().build(df), max(1, small // 4), items=n)
+    results["search_index_query"] = measure(
+        lambda: [index.search(q) for q in SEARCH_QUERIES], args.iterations, items=len(SEARCH_QUERIES)
+    )
+
+    # Export
+    # Exports carry the derived link columns, as in the app
+    results["export_csv"] = measure(lambda: build_export(with_links(df), "CSV"), small, items=n)
+    results["export_csv_gzip"] = measure(lambda: build_export(with_links(df), "CSV (gzip)"), small, items=n)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(old_path, new_path):
+    """Print p50 change per case between two result files"""
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+
+    print(f"{old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    print(f"{'rows':>8} {'case':<22} {'old p50 ms':>12} {'new p50 ms':>12} {'change':>8}")
+    for size, cases in new["results"].items():
+        for case, stats in cases.items():
+            before = old["results"].get(size, {}).get(case)
+            if before is None:
+                continue
+            change = (stats["p50_ms"] - before["p50_ms"]) / max(before["p50_ms"], 1e-9) * 100
+            print(f"{size:>8} {case:<22} {before['p50_ms']:>12.3f} {stats['p50_ms']:>12.3f} {change:>+7.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--iterations", type=int, default=20, help="timed runs per case")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="injected latency per backend call")
+    parser.add_argument("--output", default=None, help="result file (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    commit = git_commit()
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                         f"{commit or datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    image = make_image()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "latency_ms": args.latency_ms,
+            "iterations": args.iterations,
+        },
+        "results": {},
+    }
+
+    with tempfile.TemporaryDirectory() as spool_dir:
+        for n in args.sizes:
+            results = run_size(n, args, spool_dir, image)
+            report["results"][str(n)] = results
+            print(f"\n{n:,} rows")
+            print(f"{'case':<22} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'ops/s':>12} {'peak MB':>9}")
+            for case, stats in results.items():
+                print(f"{case:<22} {stats['p50_ms']:>10.3f} {stats['p90_ms']:>10.3f} {stats['p99_ms']:>10.3f} "
+                      f"{stats['throughput_per_s']:>12.1f} {stats['peak_mb']:>9.2f}")
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Bulk registration import.
+
+Reads a CSV/XLSX of registrations plus a ZIP of proof images, checks the
+whole batch with the form's rules in one vectorized pass, uploads the proof
+images concurrently and stores every valid row with one batched write.
+Invalid rows are reported per row and do not stop the rest of the batch.
+"""
+
+import logging
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+
+import pandas as pd
+
+from image_processing import MAX_UPLOAD_BYTES
+from registration import (DUPLICATE_TX_MESSAGE, NETWORKS, PACKAGES, REQUIRED_MESSAGE, TELEGRAM_ID_MESSAGE,
+                          TX_PREFIX_MESSAGE, build_user_data)
+from utils import normalize_key
+
+logger = logging.getLogger(__name__)
+
+# Columns of the import file; Bukti Transfer is the image's file name inside the ZIP
+IMPORT_COLUMNS = ["Nama User", "Telegram User ID", "Paket", "Harga (USDT)", "Tanggal Mulai",
+                  "Blockchain Network", "Transaction Hash", "Bukti Transfer"]
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+MAX_IMPORT_ROWS = 5000
+UPLOAD_WORKERS = 8
+
+IMPORTED = "✅ Imported"
+
+
+def template_csv():
+    """Empty import file with the expected columns and one example row"""
+    example = ["John Doe", "7058728559", "Monthly", "25", "2026-01-31", "BSC (BEP20)", "0x...", "john_doe.png"]
+    return pd.DataFrame([example], columns=IMPORT_COLUMNS).to_csv(index=False).encode("utf-8")
+
+
+def read_batch(file_name, data):
+    """Registrations from CSV or XLSX bytes as a DataFrame of stripped strings"""
+    if file_name.lower().endswith(".xlsx"):
+        try:
+            df = pd.read_excel(BytesIO(data), dtype=str)
+        except ImportError:
+            raise Exception("Import XLSX membutuhkan package 'openpyxl'")
+    else:
+        df = pd.read_csv(BytesIO(data), dtype=str, keep_default_na=False, encoding="utf-8-sig")
+
+    df.columns = [str(c).strip() for c in df.columns]
+    missing = [c for c in IMPORT_COLUMNS if c not in df.columns]
+    if missing:
+        raise Exception(f"Kolom tidak ditemukan: {', '.join(missing)}")
+    if len(df) > MAX_IMPORT_ROWS:
+        raise Exception(f"Maksimal {MAX_IMPORT_ROWS} baris per import")
+
+    df = df[IMPORT_COLUMNS].fillna("").astype(str)
+    for column in IMPORT_COLUMNS:
+        df[column] = df[column].str.strip()
+    # Blank lines at the end of a spreadsheet export are not registrations
+    return df[(df != "").any(axis=1)].reset_index(drop=True)
+
+
+def read_images(data):
+    """Proof images from a ZIP as {lowercased file name: bytes}; folders inside the ZIP are ignored"""
+    images = {}
+    with zipfile.ZipFile(BytesIO(data)) as archive:
+        for info in archive.infolist():
+            name = os.path.basename(info.filename)
+            if info.is_dir() or not name.lower().endswith(IMAGE_EXTENSIONS) or name.startswith("."):
+                continue
+            # Sizes come from the ZIP directory, so oversized entries are skipped unread
+            if info.file_size > MAX_UPLOAD_BYTES:
+                continue
+            images[name.lower()] = archive.read(info)
+    return images
+
+
+def validate_registrations(df, image_names):
+    """validate_registration for a whole batch: Series of error messages, '' for valid rows.
+
+    Only the first failing rule per row is reported, in the order the form
+    checks them, followed by the rules the form enforces through its widgets.
+    """
+    errors = pd.Series("", index=df.index, dtype=object)
+
+    def flag(mask, message):
+        errors[(errors == "") & mask] = message
+
+    price = pd.to_numeric(df["Harga (USDT)"].str.replace(",", "", regex=False), errors="coerce")
+    start = pd.to_datetime(df["Tanggal Mulai"].str[:10], format="%Y-%m-%d", errors="coerce")
+    required = ["Nama User", "Telegram User ID", "Harga (USDT)", "Transaction Hash", "Bukti Transfer"]
+
+    flag((df[required] == "").any(axis=1) | (price == 0), REQUIRED_MESSAGE)
+    flag(~df["Telegram User ID"].str.isdigit(), TELEGRAM_ID_MESSAGE)
+    flag(~df["Transaction Hash"].str.startswith("0x"), TX_PREFIX_MESSAGE)
+    flag(price.isna() | (price < 0), "❌ Harga (USDT) harus berupa angka positif!")
+    flag(~df["Paket"].isin(PACKAGES), f"❌ Paket harus salah satu dari: {', '.join(PACKAGES)}")
+    flag(~df["Blockchain Network"].isin(NETWORKS), "❌ Blockchain Network tidak dikenal!")
+    flag(start.isna(), "❌ Tanggal Mulai harus berformat YYYY-MM-DD!")
+    flag(~df["Bukti Transfer"].str.lower().isin(image_names), "❌ Bukti transfer tidak ada di file ZIP!")
+    flag(df["Transaction Hash"].map(normalize_key).duplicated(), "❌ Transaction Hash dobel di file ini!")
+    return errors
+
+
+def check_batch(gs, df, images):
+    """validate_registrations plus transaction hashes that are already registered"""
+    errors = validate_registrations(df, images)
+    candidates = df.loc[errors == "", "Transaction Hash"]
+    registered = candidates.map(gs.is_duplicate_transaction).astype(bool)
+    errors[registered.index[registered]] = f"❌ {DUPLICATE_TX_MESSAGE}"
+    return errors
+
+
+def import_registrations(gs, df, images, max_workers=UPLOAD_WORKERS, progress=None):
+    """Validate, upload and store a batch; returns df with a Status column per row.
+
+    Rows that fail validation, duplicate checks or their image upload get the
+    error as Status; all other rows are written with one batched append.
+    Proof Match names an earlier registration (or row of this batch) with the
+    same proof image. ``progress(done, total)`` is called as uploads finish.
+    """
+    status = check_batch(gs, df, images)
+
+    # Claim hashes before uploading, exactly like a single submit
+    reserved = []
+    for idx in status.index[status == ""]:
+        if gs.reserve_transaction(df.at[idx, "Transaction Hash"]):
+            reserved.append(idx)
+        else:
+            status[idx] = f"❌ {DUPLICATE_TX_MESSAGE}"
+
+    uploaded = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bulk-upload") as pool:
+        futures = {
+            pool.submit(gs.upload_image_to_gcs, BytesIO(images[df.at[idx, "Bukti Transfer"].lower()]),
+                        df.at[idx, "Nama User"]): idx
+            for idx in reserved
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            idx = futures[future]
+            try:
+                uploaded[idx] = future.result()
+            except Exception as e:
+                status[idx] = f"❌ {str(e)}"
+                gs.release_transaction(df.at[idx, "Transaction Hash"])
+            if progress:
+                progress(done, len(futures))
+
+    users = []
+    matches = pd.Series("", index=df.index, dtype=object)
+    for idx in sorted(uploaded):
+        row = df.loc[idx]
+        user_data = build_user_data(
+            row["Nama User"], row["Telegram User ID"], row["Paket"],
+            float(row["Harga (USDT)"].replace(",", "")), pd.Timestamp(row["Tanggal Mulai"][:10]),
+            row["Blockchain Network"], row["Transaction Hash"]
+        )
+        user_data["Bukti Transfer"] = uploaded[idx]
+        user_data["Thumbnail"] = gs.thumbnail_url_for(uploaded[idx])
+        user_data.update(gs.proof_fields_for(uploaded[idx]))
+        users.append(user_data)
+
+    if users:
+        try:
+            gs.append_many_to_sheet(users)
+        except Exception as e:
+            # Nothing was stored: undo the uploads and free the hashes
+            for idx, image_url in uploaded.items():
+                gs.delete_image(image_url)
+                gs.release_transaction(df.at[idx, "Transaction Hash"])
+                status[idx] = f"❌ {str(e)}"
+        else:
+            for idx, user_data in zip(sorted(uploaded), users):
+                status[idx] = IMPORTED
+                matches[idx] = user_data.get("Proof Match", "")
+            try:
+                gs.flush_writes()
+            except Exception as e:
+                # Rows are spooled and the write-behind queue retries them
+                logger.warning("Bulk import flush failed, rows stay queued: %s", e)
+
+    result = df.copy()
+    result.insert(0, "Status", status)
+    result["Proof Match"] = matches
+    return result
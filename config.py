@@ -0,0 +1,54 @@
+"""
+Configuration without Streamlit.
+
+Settings come from the same TOML file Streamlit reads (``.streamlit/secrets.toml``)
+with environment variables layered on top, so CLI tools, workers and the app
+share one configuration. The app passes ``st.secrets`` instead when it runs
+under Streamlit.
+"""
+
+import json
+import os
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
+
+DEFAULT_CONFIG_PATH = os.path.join(".streamlit", "secrets.toml")
+
+# Environment variable -> (section, key) it overrides
+ENV_OVERRIDES = {
+    "LUXQUANT_SHEET_ID": ("google_config", "sheet_id"),
+    "LUXQUANT_BUCKET_NAME": ("google_config", "bucket_name"),
+    "LUXQUANT_SPOOL_DIR": ("google_config", "spool_dir"),
+    "LUXQUANT_LOCAL_STORE_PATH": ("local_store", "path"),
+    "LUXQUANT_IMAGE_DIR": ("local_store", "image_dir"),
+}
+
+
+def load_config(path=None):
+    """Load settings as a plain dict of sections.
+
+    ``path`` defaults to ``$LUXQUANT_CONFIG`` or ``.streamlit/secrets.toml``; a
+    missing file is fine when everything comes from the environment.
+    ``GOOGLE_APPLICATION_CREDENTIALS`` may point to a service account JSON key
+    that replaces the ``[gcp_service_account]`` section.
+    """
+    path = path or os.environ.get("LUXQUANT_CONFIG", DEFAULT_CONFIG_PATH)
+    config = {}
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            config = tomllib.load(f)
+
+    credentials_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
+    if credentials_path:
+        with open(credentials_path, encoding="utf-8") as f:
+            config["gcp_service_account"] = json.load(f)
+
+    for variable, (section, key) in ENV_OVERRIDES.items():
+        if os.environ.get(variable):
+            config.setdefault(section, {})[key] = os.environ[variable]
+
+    return config
+
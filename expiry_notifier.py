@@ -0,0 +1,266 @@
+"""
+Expiry Notifier
+Headless batch job for cron: finds users whose subscription expires within N
+days or has just expired and sends them to a sink. Reads the SQLite mirror
+(see [local_store] in README) and never imports Streamlit.
+
+    python expiry_notifier.py [--db data/registrations.db | --source storage] [--days 7]
+                              [--sink stdout | file:notifications.jsonl | webhook:https://...]
+
+Only rows added since the previous run are read from the mirror (all rows
+after an edit or renewal); the latest subscription per Telegram User ID and
+the notifications already sent are kept in a JSON state file, so every user
+is notified once per expiry date and event. With ``--source storage`` the
+[storage] backend is read instead (users active within the lookback only; on
+a partitioned store just the partitions that can hold them).
+"""
+
+import argparse
+import json
+import os
+import sys
+import urllib.request
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from local_store import LocalStore
+from utils import compute_expiry, expiry_dates, normalize_key, start_dates
+
+EXPIRING = "expiring"
+EXPIRED = "expired"
+
+# Fields of the latest registration kept per user in the state file
+USER_FIELDS = ["Nama User", "Telegram User ID", "Paket", "Tanggal Mulai", "Transaction Hash"]
+
+
+class StdoutSink:
+    """Print notifications as JSON lines"""
+
+    def emit(self, notifications):
+        for notification in notifications:
+            print(json.dumps(notification, ensure_ascii=False))
+
+
+class FileSink:
+    """Append notifications as JSON lines to a file"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def emit(self, notifications):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for notification in notifications:
+                f.write(json.dumps(notification, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class WebhookSink:
+    """POST all notifications of a run as one JSON document"""
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def emit(self, notifications):
+        body = json.dumps({"notifications": notifications}, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(
+            self.url, data=body, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            if response.status >= 300:
+                raise Exception(f"Webhook returned HTTP {response.status}")
+
+
+def make_sink(spec):
+    """Build a sink from 'stdout', 'file:<path>' or 'webhook:<url>'"""
+    kind, _, target = spec.partition(":")
+    if kind == "stdout":
+        return StdoutSink()
+    if kind == "file" and target:
+        return FileSink(target)
+    if kind == "webhook" and target:
+        return WebhookSink(target)
+    raise ValueError(f"Unknown sink: {spec}")
+
+
+def load_state(path):
+    """Read the notifier state, or a fresh one if the file does not exist yet"""
+    if not os.path.exists(path):
+        return {"generation": None, "last_row": 1, "users": {}, "notified": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(path, state):
+    """Write the state atomically so a crash never leaves a half-written file"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def update_users(state, store):
+    """Fold rows added since the last run into the latest subscription per user.
+
+    A user's subscription is the registration that expires last; a Lifetime
+    registration never expires and always wins. If the mirror was fully
+    reloaded or a row was rewritten in place (an edit or renewal) since the
+    last run, every row is read again.
+    """
+    generation = store.generation()
+    if state["generation"] != generation:
+        state.update(generation=generation, last_row=1, users={})
+
+    header, rows = store.rows_after(state["last_row"])
+    if not rows:
+        return 0
+
+    fold_users(state["users"], pd.DataFrame([row for _, row in rows], columns=header))
+    state["last_row"] = rows[-1][0]
+    return len(rows)
+
+
+def update_users_from_storage(state, services, expired_lookback, today=None):
+    """Rebuild the latest subscription per user from the configured storage backend.
+
+    Only users still active ``expired_lookback`` days before today are needed, so
+    on a partitioned store just the partitions that can hold them are read.
+    """
+    now = pd.Timestamp.now() if today is None else pd.Timestamp(today)
+    users = services.get_active_users(today=now - pd.Timedelta(days=expired_lookback))
+
+    # Back to sheet strings, as the mirror rows are
+    raw = pd.DataFrame({c: users[c].astype("string").fillna("") for c in USER_FIELDS})
+    raw["Tanggal Mulai"] = start_dates(users).dt.strftime("%Y-%m-%d").fillna("")
+    state.update(generation=None, last_row=1, users={})
+    fold_users(state["users"], raw)
+    return len(raw)
+
+
+def fold_users(users, new):
+    """Keep per Telegram User ID the registration of ``new`` that expires last (Lifetime wins)"""
+    new_expiry = expiry_dates(new)
+
+    for record, expiry in zip(new[USER_FIELDS].to_dict("records"), new_expiry):
+        key = normalize_key(record["Telegram User ID"])
+        if not key:
+            continue
+        lifetime = record["Paket"] == "Lifetime"
+        if pd.isna(expiry) and not lifetime:
+            continue
+        record["Expiry Date"] = None if lifetime else expiry.strftime("%Y-%m-%d")
+
+        current = users.get(key)
+        if current is not None and (
+            current["Expiry Date"] is None
+            or (record["Expiry Date"] is not None and record["Expiry Date"] < current["Expiry Date"])
+        ):
+            continue
+        users[key] = record
+
+
+def find_notifications(state, days, expired_lookback, today=None):
+    """Users expiring within ``days`` days or expired within ``expired_lookback`` days, not yet notified"""
+    users = pd.DataFrame(list(state["users"].values()), columns=USER_FIELDS + ["Expiry Date"])
+    users = users[users["Expiry Date"].notna()]
+    if users.empty:
+        return []
+
+    users = users.join(compute_expiry(users, today=today)[["Days Remaining"]])
+    remaining = users["Days Remaining"]
+    users["Event"] = None
+    users.loc[(remaining >= 0) & (remaining <= days), "Event"] = EXPIRING
+    users.loc[(remaining < 0) & (remaining >= -expired_lookback), "Event"] = EXPIRED
+    users = users[users["Event"].notna()]
+
+    notifications = []
+    for record in users.to_dict("records"):
+        key = f"{normalize_key(record['Telegram User ID'])}:{record['Expiry Date']}:{record['Event']}"
+        if key in state["notified"]:
+            continue
+        notifications.append({
+            "key": key,
+            "event": record["Event"],
+            "nama_user": record["Nama User"],
+            "telegram_user_id": str(record["Telegram User ID"]),
+            "paket": record["Paket"],
+            "tanggal_mulai": record["Tanggal Mulai"],
+            "expiry_date": record["Expiry Date"],
+            "days_remaining": int(record["Days Remaining"]),
+            "transaction_hash": record["Transaction Hash"],
+        })
+    return notifications
+
+
+def prune_notified(state, expired_lookback, today=None):
+    """Forget notifications for expiry dates that can no longer come up again"""
+    now = datetime.now() if today is None else pd.Timestamp(today).to_pydatetime()
+    cutoff = (now - timedelta(days=expired_lookback + 1)).strftime("%Y-%m-%d")
+    state["notified"] = {
+        key: sent_at for key, sent_at in state["notified"].items()
+        if key.rsplit(":", 2)[1] >= cutoff
+    }
+
+
+def run(store, state, sink, days=7, expired_lookback=7, today=None):
+    """One notifier pass; returns (rows scanned, notifications sent).
+
+    ``store`` is the SQLite mirror (LocalStore), or a repository such as
+    GoogleServices to read the configured storage backend directly.
+    """
+    if isinstance(store, LocalStore):
+        scanned = update_users(state, store)
+    else:
+        scanned = update_users_from_storage(state, store, expired_lookback, today=today)
+    notifications = find_notifications(state, days, expired_lookback, today=today)
+
+    # Only mark as notified once the sink accepted them, so a failed run is retried
+    if notifications:
+        sink.emit(notifications)
+        sent_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for notification in notifications:
+            state["notified"][notification["key"]] = sent_at
+
+    prune_notified(state, expired_lookback, today=today)
+    return scanned, len(notifications)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Notify users whose subscription is expiring or expired")
+    parser.add_argument("--db", default="data/registrations.db", help="SQLite mirror of the registration sheet")
+    parser.add_argument("--state", default="data/expiry_notifier.json", help="notifier state file")
+    parser.add_argument("--days", type=int, default=7, help="notify users expiring within this many days")
+    parser.add_argument("--expired-lookback", type=int, default=7,
+                        help="notify users who expired at most this many days ago")
+    parser.add_argument("--sink", default="stdout", help="stdout, file:<path> or webhook:<url>")
+    parser.add_argument("--source", choices=["mirror", "storage"], default="mirror",
+                        help="read the SQLite mirror, or the [storage] backend (partitioned: only active partitions)")
+    args = parser.parse_args()
+
+    if args.source == "mirror" and not os.path.exists(args.db):
+        sys.exit(f"❌ Mirror not found: {args.db}")
+
+    sink = make_sink(args.sink)
+    if args.source == "storage":
+        from google_services import GoogleServices
+
+        store = GoogleServices()
+    else:
+        store = LocalStore(args.db)
+    state = load_state(args.state)
+
+    scanned, sent = run(store, state, sink, days=args.days, expired_lookback=args.expired_lookback)
+    save_state(args.state, state)
+    print(f"✅ Scanned {scanned} {'new ' if args.source == 'mirror' else ''}rows, sent {sent} notifications",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
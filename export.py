@@ -0,0 +1,77 @@
+import gzip
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+# Label -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "CSV (gzip)": (".csv.gz", "application/gzip"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet")
+}
+
+# Rows serialized per CSV chunk
+CHUNK_ROWS = 5000
+
+# Generated files kept per process, keyed on data version + filters + format;
+# bounded by their total size, least recently used dropped first
+MAX_CACHED_EXPORT_BYTES = 64 * 1024 * 1024
+
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+
+def iter_csv_chunks(df, chunk_rows=CHUNK_ROWS):
+    """Yield the CSV text of a DataFrame in chunks (header first)"""
+    yield df.iloc[:0].to_csv(index=False)
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].to_csv(index=False, header=False)
+
+
+def build_export(df, fmt):
+    """Serialize a DataFrame in the given export format and return the file bytes"""
+    output = BytesIO()
+    if fmt == "CSV":
+        for chunk in iter_csv_chunks(df):
+            output.write(chunk.encode("utf-8"))
+    elif fmt == "CSV (gzip)":
+        with gzip.GzipFile(fileobj=output, mode="wb") as gz:
+            for chunk in iter_csv_chunks(df):
+                gz.write(chunk.encode("utf-8"))
+    elif fmt == "Parquet":
+        try:
+            df.to_parquet(output, index=False)
+        except ImportError:
+            raise Exception("Parquet export membutuhkan package 'pyarrow'")
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return output.getvalue()
+
+
+def export_key(data_version, filters, fmt):
+    """Cache key for an export: same data, same filters, same format -> same file"""
+    return (data_version, repr(filters), fmt)
+
+
+def get_export(key, build_frame, fmt):
+    """Return the export for a key, building it with build_frame() only on a cache miss"""
+    global _cache_bytes
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    data = build_export(build_frame(), fmt)
+    if len(data) > MAX_CACHED_EXPORT_BYTES:
+        # Would push everything else out: serve it once without keeping it
+        return data
+
+    with _cache_lock:
+        if key not in _cache:
+            _cache[key] = data
+            _cache_bytes += len(data)
+        _cache.move_to_end(key)
+        while _cache_bytes > MAX_CACHED_EXPORT_BYTES:
+            _cache_bytes -= len(_cache.popitem(last=False)[1])
+    return data
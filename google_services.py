@@ -1,120 +1,1356 @@
-import streamlit as st
-import gspread
-from google.oauth2.service_account import Credentials
-from google.cloud import storage
-import pandas as pd
-from io import BytesIO
+import atexit
+import glob
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 from datetime import datetime
+from urllib.parse import unquote
+from config import load_config
+from image_processing import make_thumbnail, perceptual_hash, prepare_proof_image, record_reused_proof, thumbnail_name
+from local_store import LocalStore
+from metrics import instrument_methods, timed
+from backends import BlobStore, FileBlobStore, Latency, MemoryBlobStore, MemoryRowStore, RowStore, SqliteRowStore
+from partitions import MemoryCatalog, PartitionCatalog, PartitionedRowStore, SqliteCatalog
+from proof_index import MATCH_DISTANCE, ProofIndex, content_hash, proof_blob_name
+from repository import DUPLICATE_TX_MESSAGE, EditConflict, RegistrationRepository
+from utils import RECENT_UPLOADS, SHEET_HEADERS, RecentItems, active_users, column_letter, edit_row, new_row_id, normalize_key, row_revision
+
+# gspread, google-auth, google-cloud-storage, requests and pandas are imported
+# where they are first needed, so importing this module stays cheap for CLI tools
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks (Windows): a starting process takes over every spool, as with a single process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Uploads above this size use chunked resumable uploads (chunk size must be a multiple of 256 KB)
+RESUMABLE_UPLOAD_THRESHOLD = 5 * 1024 * 1024
+RESUMABLE_CHUNK_SIZE = 4 * 256 * 1024
+
+GOOGLE_SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/cloud-platform'
+]
+
+# Keep-alive connections kept open to Google APIs per process
+HTTP_POOL_SIZE = 20
+
+# HTTP statuses from Sheets/Storage that are worth retrying
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def _is_transient(error):
+    """True for rate limits, server errors and network failures, including wrapped ones"""
+    import requests
+    
+    while error is not None:
+        if isinstance(error, (ConnectionError, TimeoutError,
+                              requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return True
+        # gspread.exceptions.APIError and google.api_core exceptions both expose the HTTP status as .code
+        if getattr(error, "code", None) in TRANSIENT_STATUS_CODES:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def with_retries(fn, *args, attempts=4, base_delay=0.5, max_delay=8.0, **kwargs):
+    """Call fn, retrying transient Google API errors with exponential backoff and jitter"""
+    for attempt in range(attempts):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == attempts - 1 or not _is_transient(e):
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+            logger.warning("Transient error from %s (attempt %d/%d), retrying in %.1fs: %s",
+                           getattr(fn, "__name__", fn), attempt + 1, attempts, delay, e)
+            time.sleep(delay)
+
+
+class _SheetCache:
+    """Process-wide cache of raw sheet rows, shared by every GoogleServices instance"""
 
-class GoogleServices:
     def __init__(self):
-        """Initialize Google Sheets and Cloud Storage services"""
-        # Get credentials from Streamlit secrets
-        self.credentials_dict = dict(st.secrets["gcp_service_account"])
-        self.sheet_id = st.secrets["google_config"]["sheet_id"]
-        self.bucket_name = st.secrets["google_config"]["bucket_name"]
-        
-        # Setup credentials
-        self.scopes = [
-            'https://www.googleapis.com/auth/spreadsheets',
-            'https://www.googleapis.com/auth/cloud-platform'
-        ]
-        
-        self.credentials = Credentials.from_service_account_info(
-            self.credentials_dict,
-            scopes=self.scopes
+        self.lock = threading.RLock()
+        self.header = []
+        self.rows = []
+        self.fetched_at = 0.0
+        self.full_fetched_at = 0.0
+        self.stale = True
+        self.version = 0
+        self.df = None
+        self.df_version = -1
+        # O(1) duplicate checks; reserved_tx holds hashes queued or in flight in this process
+        self.tx_hashes = set()
+        self.telegram_ids = set()
+        self.reserved_tx = set()
+        # Proof image hashes -> first registration using them
+        self.proofs = ProofIndex()
+        # Positions in rows: Row ID -> its row, Telegram key -> the user's latest row
+        self.row_ids = {}
+        self.user_rows = {}
+        # Pruned partition reads: query -> (data version, fetched at, typed frame)
+        self.partition_frames = {}
+
+
+# One cache per spreadsheet, shared across Streamlit sessions in this process
+_sheet_caches = {}
+_sheet_caches_lock = threading.Lock()
+
+
+def _get_sheet_cache(sheet_id):
+    """Return the shared cache for a sheet, creating it on first use"""
+    with _sheet_caches_lock:
+        if sheet_id not in _sheet_caches:
+            _sheet_caches[sheet_id] = _SheetCache()
+        return _sheet_caches[sheet_id]
+
+
+def _drop_blank_tail(rows):
+    """Rows without their trailing blank rows (as Sheets returns them); blank rows in between keep their place"""
+    end = len(rows)
+    while end and not any(str(v).strip() for v in rows[end - 1]):
+        end -= 1
+    return rows[:end]
+
+
+def _lock_file(f, blocking=False):
+    """Exclusive advisory lock on an open file, released when the process exits; False if another process holds it"""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        return True
+    except OSError:
+        return False
+
+
+class _WriteBehindQueue:
+    """Buffers appended rows and flushes them to the sheet in one append_rows call.
+
+    Every row is spooled to a local JSONL file before it is acknowledged, so
+    pending registrations survive a restart. Each process spools to its own
+    file (``<prefix>.<pid>-<token>.jsonl``) and holds a lock on it while it
+    runs; a starting process takes over the rows of spools whose lock is free,
+    i.e. whose process is gone, and flushes them with its own.
+    """
+
+    def __init__(self, spool_dir, name, batch_size, flush_interval):
+        self.spool_prefix = os.path.join(spool_dir, name)
+        self.spool_path = f"{self.spool_prefix}.{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.flush_fn = None
+        self.on_flushed = None
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pending = []
+        self.oldest_at = None
+        self.version = 0
+        
+        # Held until this process exits; marks the spool as owned
+        self._owner = open(self.spool_path + ".lock", "a")
+        _lock_file(self._owner)
+        self._claim_orphans()
+        
+        self.thread = threading.Thread(target=self._run, name="sheet-write-behind", daemon=True)
+        self.thread.start()
+        atexit.register(self._flush_at_exit)
+    
+    def _claim_orphans(self):
+        """Take over the rows of spools left by processes that are gone"""
+        with open(self.spool_prefix + ".claim", "a") as claim:
+            # One claimant at a time, so two starting processes never replay the same spool
+            _lock_file(claim, blocking=True)
+            
+            # Spools of other processes, and the single spool of earlier versions
+            paths = {path[:-len(".lock")] for path in glob.glob(glob.escape(self.spool_prefix) + ".*.jsonl.lock")}
+            paths.update(glob.glob(glob.escape(self.spool_prefix) + ".*.jsonl"))
+            paths.discard(self.spool_path)
+            if os.path.exists(self.spool_prefix + ".jsonl"):
+                paths.add(self.spool_prefix + ".jsonl")
+            
+            claimed = []
+            try:
+                for path in sorted(paths):
+                    owner = open(path + ".lock", "a")
+                    if not _lock_file(owner):
+                        owner.close()
+                        continue
+                    claimed.append((path, owner))
+                    if os.path.exists(path):
+                        with open(path, encoding="utf-8") as f:
+                            self.pending.extend(json.loads(line) for line in f if line.strip())
+                
+                # Durable in this spool before the orphans go; a crash in between replays them twice at worst
+                with self.lock:
+                    self._rewrite_spool()
+                for path, _ in claimed:
+                    for stale in (path, path + ".lock"):
+                        if os.path.exists(stale):
+                            os.remove(stale)
+            finally:
+                for _, owner in claimed:
+                    owner.close()
+        
+        if self.pending:
+            logger.info("Replaying %d spooled rows from %d stopped processes", len(self.pending), len(claimed))
+            self.oldest_at = time.monotonic()
+            self.version += 1
+    
+    def put(self, row):
+        """Durably spool a row and schedule it for the next batch"""
+        self.put_many([row])
+    
+    def put_many(self, rows):
+        """Durably spool several rows with one fsync and schedule them for the next batch"""
+        with self.lock:
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(row) + "\n" for row in rows))
+                f.flush()
+                os.fsync(f.fileno())
+            self.pending.extend(rows)
+            if self.oldest_at is None:
+                self.oldest_at = time.monotonic()
+            self.version += 1
+            if len(self.pending) >= self.batch_size:
+                self.wakeup.set()
+    
+    def snapshot(self):
+        """Return a copy of rows not yet written to the sheet"""
+        with self.lock:
+            return list(self.pending)
+    
+    def flush(self):
+        """Write all pending rows to the sheet now; returns the number of rows written"""
+        with self.flush_lock:
+            with self.lock:
+                batch = list(self.pending)
+            if not batch or self.flush_fn is None:
+                return 0
+            
+            self.flush_fn(batch)
+            
+            # Rows added while the batch was in flight stay pending and stay spooled.
+            # A crash between the append and this rewrite can replay the batch once.
+            with self.lock:
+                self.pending = self.pending[len(batch):]
+                self.oldest_at = time.monotonic() if self.pending else None
+                self.version += 1
+                self._rewrite_spool()
+            
+            if self.on_flushed:
+                self.on_flushed()
+            return len(batch)
+    
+    def _rewrite_spool(self):
+        """Atomically replace the spool file with the still-pending rows"""
+        tmp_path = self.spool_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for row in self.pending:
+                f.write(json.dumps(row) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.spool_path)
+    
+    def _due(self):
+        with self.lock:
+            if not self.pending:
+                return False
+            return (len(self.pending) >= self.batch_size
+                    or time.monotonic() - self.oldest_at >= self.flush_interval)
+    
+    def _run(self):
+        while True:
+            self.wakeup.wait(timeout=self.flush_interval)
+            self.wakeup.clear()
+            if self._due():
+                try:
+                    self.flush()
+                except Exception:
+                    # Rows stay spooled; the next window retries them
+                    logger.exception("Write-behind flush failed")
+    
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Write-behind flush at exit failed; rows remain spooled")
+            return
+        # Nothing left to replay: remove this process's spool
+        with self.lock:
+            if not self.pending:
+                for path in (self.spool_path, self.spool_path + ".lock"):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+
+# One write queue per spreadsheet, shared across Streamlit sessions in this process
+_write_queues = {}
+
+
+def _spool_name(key):
+    """Spool file name for a row store key; keys may hold paths or "sheet/title", file names may not"""
+    safe = re.sub(r"[^A-Za-z0-9_-]", "_", key)
+    if safe != key:
+        # Keep keys that differ only in replaced characters apart (no "." left, so no glob overlap either)
+        safe += "-" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:8]
+    return f"pending_rows_{safe}"
+
+
+def _get_write_queue(sheet_id, spool_dir, batch_size, flush_interval):
+    """Return the shared write-behind queue for a sheet, creating it on first use"""
+    with _sheet_caches_lock:
+        if sheet_id not in _write_queues:
+            os.makedirs(spool_dir, exist_ok=True)
+            _write_queues[sheet_id] = _WriteBehindQueue(spool_dir, _spool_name(sheet_id), batch_size, flush_interval)
+        return _write_queues[sheet_id]
+
+
+class _GoogleClients:
+    """Credentials, pooled HTTP session and API clients for one service account.
+
+    Everything is built on first use and shared by all GoogleServices
+    instances in the process, so later sessions skip auth and client setup.
+    """
+
+    def __init__(self, credentials_dict):
+        self.credentials_dict = credentials_dict
+        self.lock = threading.RLock()
+        self.timings = {}
+        self.spreadsheets = {}
+        self.worksheets = {}
+        self._credentials = None
+        self._session = None
+        self._sheets_client = None
+        self._storage_client = None
+    
+    @contextmanager
+    def timed(self, name):
+        """Record how long a one-time setup step took"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter() - start
+            logger.info("Startup step %s took %.3fs", name, self.timings[name])
+    
+    @property
+    def credentials(self):
+        with self.lock:
+            if self._credentials is None:
+                with self.timed("credentials"):
+                    from google.oauth2.service_account import Credentials
+                    self._credentials = Credentials.from_service_account_info(
+                        self.credentials_dict,
+                        scopes=GOOGLE_SCOPES
+                    )
+            return self._credentials
+    
+    @property
+    def session(self):
+        """Keep-alive HTTP session shared by the Sheets and Storage clients"""
+        with self.lock:
+            if self._session is None:
+                with self.timed("http_session"):
+                    import requests
+                    from google.auth.transport.requests import AuthorizedSession
+                    session = AuthorizedSession(self.credentials)
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_SIZE,
+                                                            pool_maxsize=HTTP_POOL_SIZE)
+                    session.mount("https://", adapter)
+                    self._session = session
+            return self._session
+    
+    @property
+    def sheets_client(self):
+        with self.lock:
+            if self._sheets_client is None:
+                with self.timed("sheets_client"):
+                    import gspread
+                    self._sheets_client = gspread.Client(auth=self.credentials, session=self.session)
+            return self._sheets_client
+    
+    @property
+    def storage_client(self):
+        with self.lock:
+            if self._storage_client is None:
+                with self.timed("storage_client"):
+                    from google.cloud import storage
+                    self._storage_client = storage.Client(
+                        credentials=self.credentials,
+                        project=self.credentials_dict['project_id'],
+                        _http=self.session
+                    )
+            return self._storage_client
+    
+    def spreadsheet(self, sheet_id):
+        """Open (once) a spreadsheet"""
+        with self.lock:
+            if sheet_id not in self.spreadsheets:
+                self.spreadsheets[sheet_id] = self.sheets_client.open_by_key(sheet_id)
+            return self.spreadsheets[sheet_id]
+    
+    def worksheet(self, sheet_id, title=None):
+        """Open (once) a worksheet by title, or the first worksheet of the spreadsheet"""
+        with self.lock:
+            if (sheet_id, title) not in self.worksheets:
+                if title is None:
+                    with self.timed("open_sheet"):
+                        self.worksheets[(sheet_id, None)] = self.spreadsheet(sheet_id).sheet1
+                else:
+                    # One metadata call opens every worksheet; a missing title raises WorksheetNotFound
+                    self.worksheet_titles(sheet_id, refresh=True)
+                    if (sheet_id, title) not in self.worksheets:
+                        self.worksheets[(sheet_id, title)] = self.spreadsheet(sheet_id).worksheet(title)
+            return self.worksheets[(sheet_id, title)]
+    
+    def worksheet_titles(self, sheet_id, refresh=False):
+        """Titles of the worksheets of a spreadsheet, as of the last listing"""
+        with self.lock:
+            titles = {title for sid, title in self.worksheets if sid == sheet_id and title is not None}
+            if refresh or not titles:
+                for worksheet in self.spreadsheet(sheet_id).worksheets():
+                    self.worksheets[(sheet_id, worksheet.title)] = worksheet
+                    titles.add(worksheet.title)
+            return titles
+    
+    def add_worksheet(self, sheet_id, title, cols):
+        """Create a worksheet, or open it if another process created it first"""
+        import gspread
+        
+        with self.lock:
+            try:
+                worksheet = self.spreadsheet(sheet_id).add_worksheet(title=title, rows=1, cols=cols)
+            except gspread.exceptions.APIError:
+                if title not in self.worksheet_titles(sheet_id, refresh=True):
+                    raise
+                worksheet = self.worksheets[(sheet_id, title)]
+            self.worksheets[(sheet_id, title)] = worksheet
+            return worksheet
+
+
+# One client set per service account
+_google_clients = {}
+
+
+def _get_google_clients(credentials_dict):
+    """Return the shared clients for a service account, creating the holder on first use"""
+    key = credentials_dict.get('client_email', '')
+    with _sheet_caches_lock:
+        if key not in _google_clients:
+            _google_clients[key] = _GoogleClients(credentials_dict)
+        return _google_clients[key]
+
+
+class GoogleSheetRowStore(RowStore):
+    """Row store on a worksheet of a Google Sheet (the first one unless a title is given)"""
+
+    def __init__(self, clients, sheet_id, title=None):
+        super().__init__()
+        self.clients = clients
+        self.key = sheet_id if title is None else f"{sheet_id}/{title}"
+        self.sheet_id = sheet_id
+        self.title = title
+        # Setup timings are reported together with the client timings
+        self.timings = clients.timings
+
+    @property
+    def sheet(self):
+        return self.clients.worksheet(self.sheet_id, self.title)
+
+    def header(self):
+        return self.sheet.row_values(1)
+
+    def set_header(self, header):
+        self.sheet.update(range_name="A1", values=[list(header)])
+
+    def read_all(self):
+        return self.sheet.get_values()
+
+    def read_from(self, start_row, width):
+        # Ranges starting past the grid are rejected once the data fills the sheet, so
+        # start at the last known row (the header at least) and drop it again
+        return self.sheet.get_values(f"A{start_row - 1}:{column_letter(width)}")[1:]
+
+    def append_rows(self, rows):
+        self.sheet.append_rows(rows)
+
+    def update_cells(self, updates):
+        self.sheet.batch_update([
+            {"range": f"{column_letter(col)}{row}", "values": [[value]]} for row, col, value in updates
+        ])
+
+    def read_rows(self, row_numbers, width):
+        ranges = self.sheet.batch_get([f"A{row}:{column_letter(width)}{row}" for row in row_numbers])
+        return [list(values[0]) if values else [] for values in ranges]
+
+    def update_rows(self, rows):
+        self.sheet.batch_update([
+            {"range": f"A{row}:{column_letter(len(values))}{row}", "values": [list(values)]} for row, values in rows
+        ])
+        return []
+
+
+def _a1_title(title):
+    """Worksheet title quoted for A1 notation"""
+    return "'" + title.replace("'", "''") + "'"
+
+
+class GoogleSheetCatalog(PartitionCatalog):
+    """Partitions as worksheets named reg_<partition>, listed in a _manifest worksheet.
+
+    Locations are ``<spreadsheet id>/<worksheet title>``. New partitions are
+    created in ``partition_sheet_id`` when set, so the history can be spread
+    over several spreadsheets.
+    """
+
+    TITLE_PREFIX = "reg_"
+
+    def __init__(self, clients, sheet_id, partition_sheet_id=None):
+        self.clients = clients
+        self.sheet_id = sheet_id
+        self.partition_sheet_id = partition_sheet_id or sheet_id
+        self.manifest_location = f"{sheet_id}/_manifest"
+        self.lock = threading.Lock()
+        self.stores = {}
+
+    @staticmethod
+    def _split(location):
+        sheet_id, title = location.split("/", 1)
+        return sheet_id, title
+
+    def open(self, location):
+        with self.lock:
+            if location not in self.stores:
+                self.stores[location] = GoogleSheetRowStore(self.clients, *self._split(location))
+            return self.stores[location]
+
+    def exists(self, location):
+        sheet_id, title = self._split(location)
+        return (title in self.clients.worksheet_titles(sheet_id)
+                or title in self.clients.worksheet_titles(sheet_id, refresh=True))
+
+    def open_new(self, location, header):
+        sheet_id, title = self._split(location)
+        self.clients.add_worksheet(sheet_id, title, len(header))
+        return super().open_new(location, header)
+
+    def create(self, name, header):
+        location = f"{self.partition_sheet_id}/{self.TITLE_PREFIX}{name}"
+        self.open_new(location, header)
+        return location
+
+    def _batch_get(self, ranges):
+        """values_batch_get per spreadsheet; ranges are (location, A1 range) and results keep their order"""
+        results = [None] * len(ranges)
+        by_sheet = {}
+        for i, (location, a1) in enumerate(ranges):
+            sheet_id, title = self._split(location)
+            by_sheet.setdefault(sheet_id, []).append((i, f"{_a1_title(title)}{a1}"))
+        for sheet_id, items in by_sheet.items():
+            with timed("rows.values_batch_get"):
+                response = with_retries(self.clients.spreadsheet(sheet_id).values_batch_get, [r for _, r in items])
+            for (i, _), value_range in zip(items, response.get("valueRanges", [])):
+                results[i] = value_range.get("values", [])
+        return [r or [] for r in results]
+
+    def read_headers(self, locations):
+        tables = self._batch_get([(location, "!1:1") for location in locations])
+        return [values[0] if values else [] for values in tables]
+
+    def read_tables(self, requests):
+        tables = self._batch_get([
+            (location, "" if width is None else f"!A{first_row}:{column_letter(width)}")
+            for location, first_row, width in requests
+        ])
+        return [values[first_row - 1:] if width is None else values
+                for (_, first_row, width), values in zip(requests, tables)]
+
+
+class GcsBlobStore(BlobStore):
+    """Blob store on a public Google Cloud Storage bucket"""
+
+    def __init__(self, clients, bucket_name):
+        self.clients = clients
+        self.bucket_name = bucket_name
+        self._bucket = None
+
+    @property
+    def bucket(self):
+        if self._bucket is None:
+            self._bucket = self.clients.storage_client.bucket(self.bucket_name)
+        return self._bucket
+
+    def upload(self, name, data, content_type):
+        blob = self.bucket.blob(name)
+        if len(data) > RESUMABLE_UPLOAD_THRESHOLD:
+            # Chunked resumable upload, so a dropped connection resumes instead of restarting
+            blob.chunk_size = RESUMABLE_CHUNK_SIZE
+        blob.upload_from_string(data, content_type=content_type)
+        # Bucket is already public via allUsers permission
+        return blob.public_url
+
+    def download(self, name):
+        return self.bucket.blob(name).download_as_bytes()
+
+    def delete(self, name):
+        self.bucket.blob(name).delete()
+
+    def exists(self, name):
+        return self.bucket.blob(name).exists()
+
+    def url_for(self, name):
+        return self.bucket.blob(name).public_url
+
+    def name_from_url(self, url):
+        prefix = f"https://storage.googleapis.com/{self.bucket_name}/"
+        if isinstance(url, str) and url.startswith(prefix):
+            return unquote(url[len(prefix):])
+        return None
+
+
+# Stores per configured backend, shared like the caches and clients
+_stores = {}
+
+
+def make_stores(config):
+    """Row and blob store for the backend selected in ``[storage]`` (google, sqlite or memory).
+
+    With ``partition = "month"`` or ``"year"`` the registration table is split
+    into partitions listed in a manifest (see partitions.py).
+    """
+    storage_config = config.get("storage") or {}
+    backend = storage_config.get("backend", "google")
+    partition = storage_config.get("partition") or ""
+    
+    if backend == "google":
+        key = (backend, config["google_config"]["sheet_id"], config["google_config"]["bucket_name"],
+               storage_config.get("partition_sheet_id", ""))
+    elif backend == "sqlite":
+        key = (backend, storage_config.get("path", "data/registrations.db"),
+               storage_config.get("image_dir", "data/images"), storage_config.get("partition_dir", "data/partitions"))
+    elif backend == "memory":
+        key = (backend, "")
+    else:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    key += (partition,)
+    
+    clients = _get_google_clients(dict(config["gcp_service_account"])) if backend == "google" else None
+    with _sheet_caches_lock:
+        if key not in _stores:
+            latency = Latency(float(storage_config.get("latency_ms", 0)) / 1000,
+                              float(storage_config.get("jitter_ms", 0)) / 1000,
+                              int(storage_config.get("seed", 0)))
+            if backend == "google":
+                blobs = GcsBlobStore(clients, key[2])
+                if partition:
+                    rows = PartitionedRowStore(GoogleSheetCatalog(clients, key[1], key[3]), partition,
+                                               key=f"{key[1]}-{partition}")
+                else:
+                    rows = GoogleSheetRowStore(clients, key[1])
+            elif backend == "sqlite":
+                blobs = FileBlobStore(key[2])
+                if partition:
+                    rows = PartitionedRowStore(SqliteCatalog(key[3]), partition, key=f"sqlite-partitions-{partition}")
+                else:
+                    rows = SqliteRowStore(key[1])
+            else:
+                blobs = MemoryBlobStore(latency)
+                if partition:
+                    rows = PartitionedRowStore(MemoryCatalog(latency), partition, key=f"memory-{partition}")
+                else:
+                    rows = MemoryRowStore(latency, key="memory")
+            _stores[key] = (rows, blobs)
+        return _stores[key]
+
+
+# Scratch table for write probes (verify_setup.py), next to the registrations
+PROBE_TABLE = "_healthcheck"
+
+
+def make_probe_store(config):
+    """Empty scratch row store on the backend selected in ``[storage]``, for write probes.
+
+    A ``_healthcheck`` worksheet in the registration spreadsheet (google), a
+    ``_healthcheck.db`` file next to the registration database (sqlite) or an
+    in-memory table. It is emptied on every call, so it never grows past one run.
+    """
+    storage_config = config.get("storage") or {}
+    backend = storage_config.get("backend", "google")
+    
+    if backend == "google":
+        clients = _get_google_clients(dict(config["gcp_service_account"]))
+        sheet_id = config["google_config"]["sheet_id"]
+        if PROBE_TABLE in clients.worksheet_titles(sheet_id, refresh=True):
+            clients.worksheet(sheet_id, PROBE_TABLE).clear()
+        else:
+            clients.add_worksheet(sheet_id, PROBE_TABLE, cols=4)
+        return GoogleSheetRowStore(clients, sheet_id, PROBE_TABLE)
+    if backend == "sqlite":
+        path = os.path.join(os.path.dirname(storage_config.get("path", "data/registrations.db")), f"{PROBE_TABLE}.db")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        return SqliteRowStore(path)
+    if backend == "memory":
+        latency = Latency(float(storage_config.get("latency_ms", 0)) / 1000,
+                          float(storage_config.get("jitter_ms", 0)) / 1000,
+                          int(storage_config.get("seed", 0)))
+        return MemoryRowStore(latency, key=f"memory-{PROBE_TABLE}")
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+# Row stores whose header was checked in this process
+_verified_stores = set()
+_verified_lock = threading.Lock()
+
+
+@instrument_methods("services", {"get_all_users": lambda args, kwargs, result: len(result),
+                                 "get_active_users": lambda args, kwargs, result: len(result)})
+class GoogleServices(RegistrationRepository):
+    def __init__(self, config=None, row_store=None, blob_store=None):
+        """Initialize the registration store (Google Sheets and Cloud Storage by default).
+
+        ``config`` is a mapping of sections like ``st.secrets``; by default it is
+        read from the secrets TOML file and environment (see config.load_config).
+        ``row_store``/``blob_store`` replace the backends selected by ``[storage]``.
+        """
+        init_start = time.perf_counter()
+        
+        if config is None:
+            config = load_config() if row_store is None or blob_store is None else {}
+        google_config = config.get("google_config") or {}
+        
+        # Backends; Google clients inside are created lazily on first use and shared process-wide
+        if row_store is None or blob_store is None:
+            default_rows, default_blobs = make_stores(config)
+            row_store = row_store or default_rows
+            blob_store = blob_store or default_blobs
+        self._rows = row_store
+        self.blob_store = blob_store
+        self._header_checked = False
+        
+        # Read cache settings (seconds)
+        self.cache_ttl = float(google_config.get("cache_ttl_seconds", 60))
+        self.full_refresh_interval = float(google_config.get("full_refresh_seconds", 900))
+        self._cache = _get_sheet_cache(self._rows.key)
+        
+        # Read write-behind settings
+        self._writes = _get_write_queue(
+            self._rows.key,
+            google_config.get("spool_dir", ".spool"),
+            int(google_config.get("write_batch_size", 20)),
+            float(google_config.get("write_flush_seconds", 5)),
         )
         
-        # Initialize services
-        self.sheets_client = gspread.authorize(self.credentials)
-        self.storage_client = storage.Client(credentials=self.credentials, project=self.credentials_dict['project_id'])
-        self.bucket = self.storage_client.bucket(self.bucket_name)
+        # Thumbnail URLs and proof hashes of images uploaded by this process, keyed by original URL;
+        # only needed until the registration is written, so just the latest uploads are kept
+        self._thumbnails = RecentItems(RECENT_UPLOADS)
+        self._proofs = RecentItems(RECENT_UPLOADS)
+        self.proof_match_distance = int(google_config.get("proof_match_distance", MATCH_DISTANCE))
         
-        # Open the sheet
-        self.sheet = self.sheets_client.open_by_key(self.sheet_id).sheet1
+        # Optional SQLite mirror: warm starts and indexed lookups without a full sheet read
+        self.mirror = None
+        local_config = config.get("local_store") or {}
+        if local_config.get("path"):
+            self.mirror = LocalStore(local_config["path"])
         
-        # Initialize headers if needed
-        self._initialize_sheet()
+        # Start flushing queued rows through this connection
+        self._writes.flush_fn = self._write_rows
+        self._writes.on_flushed = self.invalidate_cache
+        
+        # Rows replayed from the spool count as registered for duplicate checks
+        tx_col = SHEET_HEADERS.index("Transaction Hash")
+        with self._cache.lock:
+            for row in self._writes.snapshot():
+                if len(row) > tx_col and row[tx_col]:
+                    self._cache.reserved_tx.add(normalize_key(row[tx_col]))
+        
+        self._rows.timings.setdefault("services_init", time.perf_counter() - init_start)
+    
+    @property
+    def rows(self):
+        """Row store; the header check runs once per process"""
+        if not self._header_checked:
+            with _verified_lock:
+                if self._rows.key not in _verified_stores:
+                    start = time.perf_counter()
+                    self._initialize_sheet()
+                    self._rows.timings["header_check"] = time.perf_counter() - start
+                    _verified_stores.add(self._rows.key)
+            self._header_checked = True
+        return self._rows
+    
+    def startup_report(self):
+        """Seconds spent in each one-time setup step (credentials, clients, first read, ...)"""
+        return dict(self._rows.timings)
     
     def _initialize_sheet(self):
         """Initialize sheet with headers if empty"""
         try:
-            headers = self.sheet.row_values(1)
+            headers = with_retries(self._rows.header)
             if not headers:
-                headers = [
-                    "Timestamp",
-                    "Nama User",
-                    "Telegram User ID",
-                    "Telegram Link",
-                    "Paket",
-                    "Harga (USDT)",
-                    "Tanggal Mulai",
-                    "Blockchain Network",
-                    "Transaction Hash",
-                    "Explorer Link",
-                    "Bukti Transfer"
-                ]
-                self.sheet.append_row(headers)
+                self._rows.set_header(SHEET_HEADERS)
+            else:
+                # Add columns introduced after the sheet was created (e.g. Thumbnail)
+                missing = [h for h in SHEET_HEADERS if h not in headers]
+                if missing:
+                    self._rows.set_header(headers + missing)
+                    self.invalidate_cache(full=True)
         except Exception as e:
-            st.error(f"Error initializing sheet: {str(e)}")
+            logger.error("Error initializing sheet: %s", e)
     
     def upload_image_to_gcs(self, uploaded_file, user_name):
-        """Upload image to Google Cloud Storage and return public URL"""
+        """Upload image to the blob store (Cloud Storage) and return its public URL.
+
+        Blobs are named by the SHA-256 of the uploaded file, so a file that is
+        already stored (known from the sheet, or found in the bucket) is not
+        processed or uploaded again.
+        """
         try:
-            # Prepare file metadata
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            file_extension = uploaded_file.name.split('.')[-1]
-            blob_name = f"{user_name.replace(' ', '_')}_{timestamp}.{file_extension}"
-            
-            # Create blob
-            blob = self.bucket.blob(blob_name)
-            
-            # Upload file
             uploaded_file.seek(0)
-            blob.upload_from_file(uploaded_file, content_type=uploaded_file.type)
+            data = uploaded_file.read()
+            digest = content_hash(data)
+            blob_name = proof_blob_name(digest)
             
-            # Get public URL (bucket is already public via allUsers permission)
-            public_url = blob.public_url
+            with self._cache.lock:
+                known = self._cache.proofs.stored(digest)
+            if known:
+                public_url, thumb_url, dhash = known
+                record_reused_proof()
+            elif with_retries(self.blob_store.exists, blob_name):
+                # Stored by another process or a registration not in the sheet yet
+                public_url = self.blob_store.url_for(blob_name)
+                thumb_name = thumbnail_name(blob_name)
+                thumb_url = self.blob_store.url_for(thumb_name) if with_retries(self.blob_store.exists, thumb_name) else ""
+                dhash = self._proofs.get(public_url, {}).get("Proof dHash") or perceptual_hash(data)
+                record_reused_proof()
+            else:
+                # Validate, strip EXIF and shrink in memory before anything goes over the network
+                image_bytes = prepare_proof_image(data)
+                dhash = perceptual_hash(data)
+                public_url = with_retries(self.blob_store.upload, blob_name, image_bytes, "image/webp")
+                
+                # Store a small WebP thumbnail next to the original for the dashboard
+                thumb_url = ""
+                try:
+                    thumb_url = self._upload_thumbnail(blob_name, image_bytes)
+                except Exception as e:
+                    logger.warning("Thumbnail generation failed for %s: %s", blob_name, e)
             
+            if thumb_url:
+                self._thumbnails[public_url] = thumb_url
+            self._proofs[public_url] = {"Proof Hash": digest, "Proof dHash": dhash}
             return public_url
             
         except Exception as e:
-            st.error(f"❌ Error uploading image: {str(e)}")
+            # Runs on a worker thread during submit; the caller reports the error
             raise Exception(f"Failed to upload image: {str(e)}")
     
+    def _upload_thumbnail(self, blob_name, image_bytes):
+        """Upload the WebP thumbnail for an original blob and return its URL"""
+        return with_retries(self.blob_store.upload, thumbnail_name(blob_name), make_thumbnail(image_bytes), "image/webp")
+    
+    def delete_image(self, image_url):
+        """Roll back a proof upload after a failed registration: nothing to delete.
+
+        Blobs are named by the SHA-256 of their content, so another submit (in this
+        or another process) may already be using this one. It stays in the bucket,
+        where a retry of the same file finds it again instead of re-uploading.
+        """
+    
+    def _forget_uploads(self, image_urls):
+        """Drop what upload_image_to_gcs remembered once the rows using these images are written"""
+        for image_url in image_urls:
+            self._thumbnails.pop(image_url)
+            self._proofs.pop(image_url)
+    
+    def prepare_append(self):
+        """Refresh the sheet cache ahead of an append so it overlaps with other submit work"""
+        with self._cache.lock:
+            self._ensure_fresh()
+    
+    def thumbnail_url_for(self, image_url):
+        """Thumbnail URL created by upload_image_to_gcs for an image, or empty string"""
+        return self._thumbnails.get(image_url, "")
+    
+    def proof_fields_for(self, image_url):
+        """Proof Hash / Proof dHash of an image stored by upload_image_to_gcs"""
+        return dict(self._proofs.get(image_url, {}))
+    
+    def backfill_thumbnails(self, limit=None):
+        """Create thumbnails for existing rows without one; returns the number of rows updated"""
+        try:
+            # Work on the exact sheet layout so row numbers are right
+            self.flush_writes()
+            self.invalidate_cache(full=True)
+            with self._cache.lock:
+                self._ensure_fresh()
+                header = list(self._cache.header)
+                rows = [list(row) + [""] * (len(header) - len(row)) for row in self._cache.rows]
+            
+            proof_col = header.index("Bukti Transfer")
+            thumb_col = header.index("Thumbnail")
+            updates = []
+            for i, row in enumerate(rows):
+                if row[thumb_col] or not row[proof_col]:
+                    continue
+                blob_name = self.blob_store.name_from_url(row[proof_col])
+                if blob_name is None:
+                    continue
+                try:
+                    image_bytes = with_retries(self.blob_store.download, blob_name)
+                    thumb_url = self._upload_thumbnail(blob_name, image_bytes)
+                except Exception as e:
+                    logger.warning("Skipping thumbnail for row %d: %s", i + 2, e)
+                    continue
+                updates.append((i + 2, thumb_col + 1, thumb_url))
+                if limit and len(updates) >= limit:
+                    break
+            
+            # One batched write for all thumbnail cells
+            if updates:
+                with_retries(self.rows.update_cells, updates)
+                self.invalidate_cache(full=True)
+            return len(updates)
+            
+        except Exception as e:
+            raise Exception(f"Error backfilling thumbnails: {str(e)}")
+    
+    def backfill_row_ids(self):
+        """Give rows from before row IDs existed a Row ID and Revision; returns the number of rows updated"""
+        try:
+            # Same exact-layout pass as backfill_thumbnails, with one batched write
+            self.flush_writes()
+            self.invalidate_cache(full=True)
+            with self._cache.lock:
+                self._ensure_fresh()
+                header = list(self._cache.header)
+                rows = [list(row) + [""] * (len(header) - len(row)) for row in self._cache.rows]
+            
+            id_col = header.index("Row ID")
+            rev_col = header.index("Revision")
+            updates = []
+            for i, row in enumerate(rows):
+                if row[id_col]:
+                    continue
+                updates.append((i + 2, id_col + 1, new_row_id()))
+                if not row[rev_col]:
+                    updates.append((i + 2, rev_col + 1, "1"))
+            
+            if updates:
+                with_retries(self.rows.update_cells, updates)
+                self.invalidate_cache(full=True)
+            return sum(1 for _, col, _ in updates if col == id_col + 1)
+            
+        except Exception as e:
+            raise Exception(f"Error backfilling row IDs: {str(e)}")
+    
     def append_to_sheet(self, user_data):
-        """Append user data to Google Sheets"""
+        """Queue user data for a batched append to Google Sheets; fills in its Proof Match"""
         try:
-            row = [
-                user_data["Timestamp"],
-                user_data["Nama User"],
-                user_data["Telegram User ID"],
-                user_data["Telegram Link"],
-                user_data["Paket"],
-                user_data["Harga (USDT)"],
-                user_data["Tanggal Mulai"],
-                user_data["Blockchain Network"],
-                user_data["Transaction Hash"],
-                user_data["Explorer Link"],
-                user_data["Bukti Transfer"]
-            ]
-            
-            self.sheet.append_row(row)
+            with self._cache.lock:
+                indexed = self._match_proof(user_data)
+            row = [user_data.get(header, "") for header in SHEET_HEADERS]
+            
+            # Spooled locally; the write-behind queue flushes by size or time window
+            try:
+                self._writes.put(row)
+            except Exception:
+                self._forget_proofs([indexed])
+                raise
+            self._forget_uploads([user_data.get("Bukti Transfer", "")])
+            
+            # Keep the duplicate index current without waiting for the flush
+            with self._cache.lock:
+                self._cache.reserved_tx.add(normalize_key(user_data.get("Transaction Hash", "")))
+                self._cache.telegram_ids.add(normalize_key(user_data.get("Telegram User ID", "")))
             
         except Exception as e:
             raise Exception(f"Error saving to sheet: {str(e)}")
     
-    def get_all_users(self):
-        """Get all users from Google Sheets as DataFrame"""
+    def append_many_to_sheet(self, users):
+        """Queue several registrations at once; the next flush appends them with one API call"""
         try:
-            data = self.sheet.get_all_records()
-            df = pd.DataFrame(data)
+            # One after another, so a proof reused within the batch is flagged too
+            with self._cache.lock:
+                indexed = [self._match_proof(user_data) for user_data in users]
+            try:
+                self._writes.put_many([[user_data.get(header, "") for header in SHEET_HEADERS] for user_data in users])
+            except Exception:
+                self._forget_proofs(indexed)
+                raise
+            self._forget_uploads([user_data.get("Bukti Transfer", "") for user_data in users])
             
-            # Convert price to float
-            if not df.empty and 'Harga (USDT)' in df.columns:
-                df['Harga (USDT)'] = pd.to_numeric(df['Harga (USDT)'], errors='coerce')
+            with self._cache.lock:
+                for user_data in users:
+                    self._cache.reserved_tx.add(normalize_key(user_data.get("Transaction Hash", "")))
+                    self._cache.telegram_ids.add(normalize_key(user_data.get("Telegram User ID", "")))
             
-            return df
+        except Exception as e:
+            raise Exception(f"Error saving to sheet: {str(e)}")
+    
+    def _match_proof(self, user_data):
+        """Set Proof Match from the proof index and index this registration's proof (cache lock held).
+
+        Returns the digest if it was newly indexed, so a failed write can take it back out.
+        """
+        digest, dhash = user_data.get("Proof Hash", ""), user_data.get("Proof dHash", "")
+        if not digest:
+            return ""
+        self._ensure_fresh()
+        proofs = self._cache.proofs
+        user_data["Proof Match"] = proofs.match(digest, dhash)
+        added = proofs.add(digest, dhash, user_data.get("Bukti Transfer", ""), user_data.get("Thumbnail", ""),
+                           user_data.get("Transaction Hash", ""))
+        return digest if added else ""
+    
+    def _forget_proofs(self, digests):
+        """Drop proofs indexed by _match_proof for rows that were never written"""
+        with self._cache.lock:
+            for digest in digests:
+                if digest:
+                    self._cache.proofs.remove(digest)
+    
+    def _write_rows(self, rows):
+        """Append a batch of rows with a single API call"""
+        with_retries(self.rows.append_rows, rows)
+    
+    def flush_writes(self):
+        """Synchronously write every queued row to the sheet"""
+        try:
+            return self._writes.flush()
+        except Exception as e:
+            raise Exception(f"Error saving to sheet: {str(e)}")
+    
+    def invalidate_cache(self, full=False):
+        """Mark cached rows as stale so the next read refreshes them"""
+        # Plain attribute writes, no lock: this is also called from the header
+        # check, which runs while the shared client lock is held
+        if full:
+            self._cache.full_fetched_at = 0.0
+        self._cache.stale = True
+    
+    @property
+    def data_version(self):
+        """Counter that changes whenever the cached or queued rows change"""
+        return self._cache.version + self._writes.version
+    
+    def _ensure_fresh(self):
+        """Refresh cached rows if they are stale or older than the TTL"""
+        cache = self._cache
+        if cache.stale or time.monotonic() - cache.fetched_at >= self.cache_ttl:
+            self._refresh_cache()
+    
+    def _refresh_cache(self):
+        """Refresh cached rows, fetching only rows past the last known row count when possible"""
+        cache = self._cache
+        now = time.monotonic()
+        
+        if not cache.header and self.mirror is not None and self._rows.stable_rows and self.mirror.row_count():
+            # Warm start from the local mirror, then catch up incrementally below
+            cache.header, cache.rows = self.mirror.get_rows()
+            self._index_rows(cache.rows, reset=True)
+            cache.full_fetched_at = now
+            cache.version += 1
+        
+        if not cache.header or now - cache.full_fetched_at >= self.full_refresh_interval:
+            # Full reload: first read, or periodic resync to catch manual edits in the sheet
+            rows = self.rows
+            read_start = time.perf_counter()
+            values = with_retries(rows.read_all)
+            rows.timings.setdefault("first_sheet_read", time.perf_counter() - read_start)
+            cache.header = values[0] if values else []
+            cache.rows = _drop_blank_tail(values[1:])
+            self._index_rows(cache.rows, reset=True)
+            cache.full_fetched_at = now
+            cache.version += 1
+            if self.mirror is not None:
+                self.mirror.replace_all(cache.header, cache.rows)
+        else:
+            # Incremental: data rows start at sheet row 2, so the next unseen row is len(rows) + 2
+            start_row = len(cache.rows) + 2
+            new_rows = with_retries(self.rows.read_from, start_row, len(cache.header))
+            # Blank rows keep their place so positions stay sheet row - 2, as in the full read;
+            # trailing ones are left out in both, the next append goes there
+            new_rows = _drop_blank_tail(new_rows)
+            if new_rows:
+                if self.mirror is not None:
+                    self.mirror.upsert_rows(start_row, new_rows)
+                cache.rows.extend(new_rows)
+                self._index_rows(new_rows)
+                cache.version += 1
+        
+        cache.fetched_at = now
+        cache.stale = False
+    
+    def _index_rows(self, rows, reset=False, start=None):
+        """Add raw sheet rows to the transaction hash / Telegram ID / row / proof index.
+
+        ``start`` is the position of the first row in the cache; by default the
+        rows are the last ones of the cache.
+        """
+        cache = self._cache
+        if reset:
+            cache.tx_hashes = set()
+            cache.telegram_ids = set()
+            cache.row_ids = {}
+            cache.user_rows = {}
+            cache.proofs = ProofIndex(self.proof_match_distance)
+        cache.proofs.add_rows(cache.header, rows)
+        if reset:
+            # Queued rows come after the sheet, so earlier registrations stay the reference
+            cache.proofs.add_rows(SHEET_HEADERS, self._writes.snapshot())
+        for column, index in (("Transaction Hash", cache.tx_hashes), ("Telegram User ID", cache.telegram_ids)):
+            if column not in cache.header:
+                continue
+            col = cache.header.index(column)
+            index.update(normalize_key(row[col]) for row in rows if len(row) > col and str(row[col]).strip())
+        
+        # Hashes replaced by a renewal stay used
+        if "TX History" in cache.header:
+            col = cache.header.index("TX History")
+            cache.tx_hashes.update(normalize_key(tx) for row in rows if len(row) > col for tx in str(row[col]).split())
+        
+        # Queued rows that reached the sheet are in tx_hashes now; drop their reservations
+        cache.reserved_tx.difference_update([tx for tx in cache.reserved_tx if tx in cache.tx_hashes])
+        
+        if start is None:
+            start = len(cache.rows) - len(rows)
+        for column, index in (("Row ID", cache.row_ids), ("Telegram User ID", cache.user_rows)):
+            if column not in cache.header:
+                continue
+            col = cache.header.index(column)
+            for pos, row in enumerate(rows, start):
+                if len(row) > col and str(row[col]).strip():
+                    key = normalize_key(row[col]) if index is cache.user_rows else str(row[col]).strip()
+                    index[key] = max(pos, index.get(key, pos))
+    
+    def is_duplicate_transaction(self, tx_hash):
+        """True if the transaction hash is already registered (or queued for registration)"""
+        key = normalize_key(tx_hash)
+        with self._cache.lock:
+            self._ensure_fresh()
+            return key in self._cache.tx_hashes or key in self._cache.reserved_tx
+    
+    def has_telegram_user(self, telegram_user_id):
+        """True if the Telegram User ID already has a registration"""
+        with self._cache.lock:
+            self._ensure_fresh()
+            return normalize_key(telegram_user_id) in self._cache.telegram_ids
+    
+    def reserve_transaction(self, tx_hash):
+        """Atomically claim a transaction hash for a new registration; False if already taken"""
+        key = normalize_key(tx_hash)
+        with self._cache.lock:
+            self._ensure_fresh()
+            if key in self._cache.tx_hashes or key in self._cache.reserved_tx:
+                return False
+            self._cache.reserved_tx.add(key)
+            return True
+    
+    def release_transaction(self, tx_hash):
+        """Give back a reserved transaction hash after a failed registration"""
+        with self._cache.lock:
+            self._cache.reserved_tx.discard(normalize_key(tx_hash))
+    
+    def _sync_pending(self):
+        """Write queued rows and refresh, so every registration has a sheet row (cache lock held)"""
+        if self._writes.snapshot():
+            self.flush_writes()
+        self._ensure_fresh()
+    
+    def latest_registration(self, telegram_user_id):
+        """Most recent registration row of a Telegram user as a dict of sheet strings, or None"""
+        try:
+            cache = self._cache
+            with cache.lock:
+                self._sync_pending()
+                pos = cache.user_rows.get(normalize_key(telegram_user_id))
+                if pos is None:
+                    return None
+                row = cache.rows[pos]
+                return dict(zip(cache.header, list(row) + [""] * (len(cache.header) - len(row))))
+            
+        except Exception as e:
+            raise Exception(f"Error reading sheet: {str(e)}")
+    
+    def update_registration(self, row_id, changes, expected_revision, renewal=False):
+        """Edit a registration in place with one batched range write.
+
+        Optimistic concurrency: the row is re-read from the sheet right before
+        the write and the edit is refused with EditConflict when its Revision
+        is no longer ``expected_revision`` (someone saved in between). Edits in
+        this process are serialized by the cache lock; across processes only the
+        short window between that read and the write remains. A ``renewal``
+        keeps the replaced payment in Payment History. Returns the stored row
+        as a dict.
+        """
+        try:
+            cache = self._cache
+            with cache.lock:
+                self._sync_pending()
+                for _ in range(2):
+                    pos = cache.row_ids.get(str(row_id).strip())
+                    if pos is None:
+                        raise EditConflict("Registrasi tidak ditemukan, muat ulang data")
+                    header = list(cache.header)
+                    current = with_retries(self.rows.read_rows, [pos + 2], len(header))[0]
+                    current = list(current) + [""] * (len(header) - len(current))
+                    if current[header.index("Row ID")] == row_id:
+                        break
+                    # Rows shifted by an edit in the sheet itself: re-read everything and look again
+                    self.invalidate_cache(full=True)
+                    self._ensure_fresh()
+                else:
+                    raise EditConflict("Baris registrasi berpindah, muat ulang data")
+                
+                if row_revision(current[header.index("Revision")]) != row_revision(expected_revision):
+                    raise EditConflict("Registrasi sudah diubah oleh operator lain, muat ulang lalu coba lagi")
+                
+                old_tx = normalize_key(current[header.index("Transaction Hash")])
+                new_tx = normalize_key(changes.get("Transaction Hash", old_tx))
+                # The cache lock is held through the write, so a pending submit's reservation is all that can race
+                if new_tx != old_tx and (new_tx in cache.tx_hashes or new_tx in cache.reserved_tx):
+                    raise Exception(DUPLICATE_TX_MESSAGE)
+                
+                changes = dict(changes)
+                indexed = self._match_proof(changes) if changes.get("Proof Hash") else ""
+                row = edit_row(header, current, changes, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), renewal)
+                try:
+                    moved = with_retries(self.rows.update_rows, [(pos + 2, row)])
+                except Exception:
+                    self._forget_proofs([indexed])
+                    raise
+                self._forget_uploads([changes.get("Bukti Transfer", "")])
+                
+                cache.rows[pos] = row
+                self._index_rows([row], start=pos)
+                cache.version += 1
+                if moved or (self.mirror is not None and not self._rows.stable_rows):
+                    # The row went to another partition (renumber on the next read), or the mirror's
+                    # row numbers don't follow this store's: resync it with the next full read
+                    self.invalidate_cache(full=True)
+                elif self.mirror is not None:
+                    self.mirror.upsert_rows(pos + 2, [row])
+                return dict(zip(header, row))
+            
+        except EditConflict:
+            raise
+        except Exception as e:
+            raise Exception(f"Error updating sheet: {str(e)}")
+    
+    def find_users(self, filters=None, start_from=None, start_to=None):
+        """Look up users by exact column values and/or a Tanggal Mulai range.
+
+        Served from the SQLite mirror indexes when configured, otherwise by
+        filtering the cached DataFrame.
+        """
+        import pandas as pd
+        
+        try:
+            if (start_from or start_to) and self._prune_reads():
+                df = self._partitions_frame(start_from=start_from, start_to=start_to)
+            elif self.mirror is not None:
+                with self._cache.lock:
+                    self._ensure_fresh()
+                return self.mirror.query(filters, start_from, start_to)
+            else:
+                df = self.get_all_users()
+            if df.empty:
+                return df
+            mask = pd.Series(True, index=df.index)
+            for column, value in (filters or {}).items():
+                mask &= df[column].astype(str) == str(value)
+            if start_from:
+                mask &= df['Tanggal Mulai'] >= pd.Timestamp(start_from)
+            if start_to:
+                mask &= df['Tanggal Mulai'] <= pd.Timestamp(start_to)
+            return df[mask].reset_index(drop=True)
+            
+        except Exception as e:
+            raise Exception(f"Error reading sheet: {str(e)}")
+    
+    def _prune_reads(self):
+        """True if a query should read only the partitions it needs"""
+        return isinstance(self._rows, PartitionedRowStore)
+    
+    def _partitions_frame(self, **query):
+        """Typed users of just the partitions a query needs (see PartitionedRowStore.select), plus queued rows.
+
+        Independent of the shared cache, so the full read behind it is never
+        triggered; the frame is reused until the data changes or cache_ttl passes.
+        """
+        from schema import users_frame
+        
+        cache = self._cache
+        key = tuple(sorted(query.items()))
+        version = self.data_version
+        with cache.lock:
+            cached = cache.partition_frames.get(key)
+            if cached and cached[0] == version and time.monotonic() - cached[1] < self.cache_ttl:
+                return cached[2].copy()
+        
+        header, rows = with_retries(self.rows.read_partitions, self.rows.select(**query))
+        pending = [dict(zip(SHEET_HEADERS, row)) for row in self._writes.snapshot()]
+        df = users_frame(header, rows + [[record.get(h, "") for h in header] for record in pending])
+        with cache.lock:
+            cache.partition_frames = {k: v for k, v in cache.partition_frames.items() if v[0] == version}
+            cache.partition_frames[key] = (version, time.monotonic(), df)
+        return df.copy()
+    
+    def get_active_users(self, today=None):
+        """Users whose subscription has not expired on ``today``; on a partitioned store only the
+        partitions that can hold them are read"""
+        import pandas as pd
+        
+        try:
+            if self._prune_reads():
+                active_on = (pd.Timestamp.now() if today is None else pd.Timestamp(today)).date()
+                df = self._partitions_frame(active_on=active_on)
+            else:
+                df = self.get_all_users()
+            return active_users(df, today).reset_index(drop=True)
+            
+        except Exception as e:
+            raise Exception(f"Error reading sheet: {str(e)}")
+    
+    def get_all_users(self):
+        """Get all users from Google Sheets as a typed DataFrame (see schema.py)"""
+        from schema import users_frame
+        
+        try:
+            cache = self._cache
+            with cache.lock:
+                self._ensure_fresh()
+                
+                # Rebuild the DataFrame only when the underlying rows changed
+                version = self.data_version
+                if cache.df is None or cache.df_version != version:
+                    # Queued rows are shown right away, before they reach the sheet
+                    header = cache.header or SHEET_HEADERS
+                    pending = [dict(zip(SHEET_HEADERS, row)) for row in self._writes.snapshot()]
+                    rows = cache.rows + [[record.get(h, "") for h in header] for record in pending]
+                    
+                    # Typed once per data version: parsed dates, categoricals, no derivable link columns
+                    cache.df = users_frame(header, rows)
+                    cache.df_version = version
+                
+                # Callers add columns in place, so hand out a copy
+                return cache.df.copy()
             
         except Exception as e:
             raise Exception(f"Error reading sheet: {str(e)}")
@@ -0,0 +1,139 @@
+import logging
+import os
+import threading
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# Bounding box and quality for proof thumbnails shown on the dashboard
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_QUALITY = 70
+THUMBNAIL_PREFIX = "thumbnails/"
+
+# Limits for uploaded proof images
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+MAX_IMAGE_PIXELS = 50_000_000
+MAX_DIMENSION = 2000
+TARGET_BYTES = 1024 * 1024
+PROOF_QUALITY = 85
+MIN_QUALITY = 55
+MIN_DIMENSION = 640
+
+# dHash grid: (size + 1) x size grayscale pixels -> size * size bits
+DHASH_SIZE = 8
+
+logger = logging.getLogger(__name__)
+
+# Process-wide counters for the upload pipeline
+_stats_lock = threading.Lock()
+_upload_stats = {"images": 0, "bytes_in": 0, "bytes_out": 0, "reused": 0}
+
+
+def thumbnail_name(blob_name):
+    """Blob name of the WebP thumbnail stored alongside an original image"""
+    return f"{THUMBNAIL_PREFIX}{os.path.splitext(blob_name)[0]}.webp"
+
+
+def make_thumbnail(image_bytes, size=THUMBNAIL_SIZE, quality=THUMBNAIL_QUALITY):
+    """Return a downscaled WebP thumbnail of an image as bytes"""
+    with Image.open(BytesIO(image_bytes)) as image:
+        # Respect phone camera orientation before resizing
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        image.thumbnail(size)
+
+        output = BytesIO()
+        image.save(output, format="WEBP", quality=quality, method=4)
+        return output.getvalue()
+
+
+def _to_web_mode(image):
+    """Convert palette/CMYK/etc. images to a mode WebP can encode"""
+    if image.mode in ("RGB", "RGBA"):
+        return image
+    return image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+
+
+def prepare_proof_image(image_bytes, max_dimension=MAX_DIMENSION, target_bytes=TARGET_BYTES):
+    """Validate and shrink a proof image before upload.
+
+    Rejects non-images and oversized files, applies the EXIF orientation and
+    drops all metadata, caps the longest side at ``max_dimension`` and
+    re-encodes to WebP, lowering quality (then dimensions) until the result
+    fits in ``target_bytes``. Returns the encoded bytes.
+    """
+    if len(image_bytes) > MAX_UPLOAD_BYTES:
+        raise ValueError(f"Gambar terlalu besar (maks {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)")
+    
+    try:
+        with Image.open(BytesIO(image_bytes)) as probe:
+            probe.verify()
+    except Exception:
+        raise ValueError("File bukan gambar yang valid")
+    
+    with Image.open(BytesIO(image_bytes)) as image:
+        if image.width * image.height > MAX_IMAGE_PIXELS:
+            raise ValueError("Resolusi gambar terlalu besar")
+        
+        image = _to_web_mode(ImageOps.exif_transpose(image))
+        image.thumbnail((max_dimension, max_dimension))
+        
+        quality = PROOF_QUALITY
+        while True:
+            output = BytesIO()
+            # exif=b"" makes sure no location/device metadata is written
+            image.save(output, format="WEBP", quality=quality, method=4, exif=b"")
+            encoded = output.getvalue()
+            
+            if len(encoded) <= target_bytes:
+                break
+            if quality > MIN_QUALITY:
+                quality -= 10
+            elif max(image.size) > MIN_DIMENSION:
+                image.thumbnail((int(image.width * 0.75), int(image.height * 0.75)))
+            else:
+                break
+    
+    with _stats_lock:
+        _upload_stats["images"] += 1
+        _upload_stats["bytes_in"] += len(image_bytes)
+        _upload_stats["bytes_out"] += len(encoded)
+    logger.info("Proof image %d -> %d bytes (quality %d)", len(image_bytes), len(encoded), quality)
+    
+    return encoded
+
+
+def perceptual_hash(image_bytes, size=DHASH_SIZE):
+    """64-bit difference hash (dHash) of an image as 16 hex digits.
+
+    Each bit says whether a pixel of the shrunken grayscale picture is brighter
+    than its right neighbour, so re-encoded or resized copies hash (nearly) alike.
+    """
+    with Image.open(BytesIO(image_bytes)) as image:
+        # JPEG decoders can shrink while decoding, which keeps large photos cheap
+        image.draft("L", (size * 8, size * 8))
+        small = ImageOps.exif_transpose(image).convert("L").resize((size + 1, size), Image.LANCZOS)
+        # One byte per pixel in mode L, row by row
+        pixels = small.tobytes()
+    
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left, right = pixels[row * (size + 1) + col], pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:0{size * size // 4}x}"
+
+
+def record_reused_proof():
+    """Count an upload that matched an already stored proof and was not uploaded again"""
+    with _stats_lock:
+        _upload_stats["reused"] += 1
+
+
+def upload_stats():
+    """Counters for processed proof images, including total bytes saved"""
+    with _stats_lock:
+        stats = dict(_upload_stats)
+    stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+    return stats
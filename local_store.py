@@ -0,0 +1,479 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from image_processing import make_thumbnail, perceptual_hash, prepare_proof_image, record_reused_proof, thumbnail_name
+from metrics import instrument_methods
+from proof_index import ProofIndex, content_hash, proof_blob_name
+from repository import DUPLICATE_TX_MESSAGE, EditConflict, RegistrationRepository
+from utils import RECENT_UPLOADS, SHEET_HEADERS, RecentItems, edit_row, new_row_id, normalize_key, row_revision
+
+# Columns that get a SQLite index for fast lookups
+INDEXED_COLUMNS = ["Telegram User ID", "Paket", "Transaction Hash", "Tanggal Mulai", "Row ID"]
+
+
+def _quote(name):
+    """Quote a sheet header for use as a SQLite identifier"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+class LocalStore:
+    """SQLite mirror of the registration sheet.
+
+    Rows are stored exactly as the sheet returns them (strings), keyed by their
+    sheet row number, so the mirror can be kept in sync incrementally.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.version = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+        self.header = self._load_header()
+
+    def _load_header(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'header'").fetchone()
+        return row[0].split("\t") if row and row[0] else []
+
+    def _create_table(self, header):
+        """(Re)create the registrations table for the given header"""
+        self.conn.execute("DROP TABLE IF EXISTS registrations")
+        columns = ", ".join(f"{_quote(h)} TEXT" for h in header)
+        self.conn.execute(f"CREATE TABLE registrations (row_num INTEGER PRIMARY KEY, {columns})")
+        for column in INDEXED_COLUMNS:
+            if column in header:
+                self._create_index(column)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('header', ?)", ("\t".join(header),)
+        )
+        self.header = list(header)
+
+    def _create_index(self, column):
+        index_name = "idx_" + column.lower().replace(" ", "_")
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON registrations ({_quote(column)})")
+
+    def add_columns(self, columns):
+        """Add columns missing from the stored header, keeping existing rows"""
+        with self.lock:
+            for column in columns:
+                if column not in self.header:
+                    self.conn.execute(f"ALTER TABLE registrations ADD COLUMN {_quote(column)} TEXT DEFAULT ''")
+                    self.header.append(column)
+                    if column in INDEXED_COLUMNS:
+                        self._create_index(column)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('header', ?)", ("\t".join(self.header),)
+            )
+            self.conn.commit()
+            self.version += 1
+
+    def _insert(self, start_row, rows):
+        width = len(self.header)
+        placeholders = ", ".join("?" * (width + 1))
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO registrations VALUES ({placeholders})",
+            [
+                [start_row + i] + [str(v) for v in (list(row) + [""] * width)[:width]]
+                for i, row in enumerate(rows)
+            ],
+        )
+
+    def replace_all(self, header, rows):
+        """Replace the mirror with a full copy of the sheet (data rows start at sheet row 2)"""
+        with self.lock:
+            if header != self.header:
+                self._create_table(header)
+            else:
+                self.conn.execute("DELETE FROM registrations")
+            self._insert(2, rows)
+            self._bump_generation()
+            self.conn.commit()
+            self.version += 1
+
+    def _bump_generation(self):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)", (str(self.generation() + 1),)
+        )
+
+    def upsert_rows(self, start_row, rows):
+        """Write rows starting at the given sheet row number"""
+        if not rows:
+            return
+        with self.lock:
+            rewrites = self.conn.execute(
+                "SELECT 1 FROM registrations WHERE row_num BETWEEN ? AND ? LIMIT 1",
+                (start_row, start_row + len(rows) - 1),
+            ).fetchone()
+            self._insert(start_row, rows)
+            if rewrites:
+                self._bump_generation()
+            self.conn.commit()
+            self.version += 1
+
+    def update_cells(self, updates):
+        """Write single cells given as (sheet row, 1-based column, value)"""
+        with self.lock:
+            for row, col, value in updates:
+                column = _quote(self.header[col - 1])
+                self.conn.execute(f"UPDATE registrations SET {column} = ? WHERE row_num = ?", (str(value), row))
+            if updates:
+                self._bump_generation()
+            self.conn.commit()
+            self.version += 1
+
+    def append_rows(self, rows):
+        """Append rows after the last stored row"""
+        with self.lock:
+            self.upsert_rows(self.row_count() + 2, rows)
+
+    def generation(self):
+        """Counter bumped on every full replace and in-place rewrite of stored rows (appends
+        leave it), so incremental readers know to rescan"""
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+            return int(row[0]) if row else 0
+
+    def row_count(self):
+        """Number of data rows in the mirror"""
+        with self.lock:
+            if not self.header:
+                return 0
+            return self.conn.execute("SELECT COUNT(*) FROM registrations").fetchone()[0]
+
+    def get_rows(self):
+        """Return (header, rows) with rows as lists of strings in sheet order"""
+        with self.lock:
+            if not self.header:
+                return [], []
+            cursor = self.conn.execute("SELECT * FROM registrations ORDER BY row_num")
+            return list(self.header), [list(r[1:]) for r in cursor]
+
+    def rows_at(self, row_nums):
+        """Stored rows by sheet row number as {row_num: row}; missing rows are left out"""
+        with self.lock:
+            if not self.header or not row_nums:
+                return {}
+            placeholders = ", ".join("?" * len(row_nums))
+            cursor = self.conn.execute(
+                f"SELECT * FROM registrations WHERE row_num IN ({placeholders})", list(row_nums)
+            )
+            return {r[0]: list(r[1:]) for r in cursor}
+
+    def find_row(self, column, value, last=False):
+        """(row_num, row) of the first (or last) row whose column equals value, or None"""
+        with self.lock:
+            if column not in self.header:
+                return None
+            order = "DESC" if last else "ASC"
+            r = self.conn.execute(
+                f"SELECT * FROM registrations WHERE {_quote(column)} = ? ORDER BY row_num {order} LIMIT 1", (str(value),)
+            ).fetchone()
+            return (r[0], list(r[1:])) if r else None
+
+    def replace_row_if(self, row_num, row, column, expected):
+        """Overwrite a row only if ``column`` still holds ``expected``; True if it was written"""
+        with self.lock:
+            width = len(self.header)
+            values = [str(v) for v in (list(row) + [""] * width)[:width]]
+            assignments = ", ".join(f"{_quote(h)} = ?" for h in self.header)
+            cursor = self.conn.execute(
+                f"UPDATE registrations SET {assignments} WHERE row_num = ? AND COALESCE({_quote(column)}, '') = ?",
+                values + [row_num, str(expected)],
+            )
+            if cursor.rowcount:
+                self._bump_generation()
+            self.conn.commit()
+            if cursor.rowcount:
+                self.version += 1
+            return bool(cursor.rowcount)
+
+    def rows_after(self, row_num):
+        """Return (header, [(row_num, row), ...]) for rows stored after the given sheet row"""
+        with self.lock:
+            if not self.header:
+                return [], []
+            cursor = self.conn.execute(
+                "SELECT * FROM registrations WHERE row_num > ? ORDER BY row_num", (row_num,)
+            )
+            return list(self.header), [(r[0], list(r[1:])) for r in cursor]
+
+    def query(self, filters=None, start_from=None, start_to=None):
+        """Return matching rows as a DataFrame using the column indexes.
+
+        ``filters`` maps column names to exact values; ``start_from``/``start_to``
+        bound ``Tanggal Mulai`` (inclusive, YYYY-MM-DD).
+        """
+        import pandas as pd
+        
+        with self.lock:
+            if not self.header:
+                return pd.DataFrame()
+
+            clauses, params = [], []
+            for column, value in (filters or {}).items():
+                clauses.append(f"{_quote(column)} = ?")
+                params.append(str(value))
+            if start_from:
+                clauses.append('"Tanggal Mulai" >= ?')
+                params.append(str(start_from))
+            if start_to:
+                clauses.append('"Tanggal Mulai" <= ?')
+                params.append(str(start_to))
+
+            where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+            cursor = self.conn.execute(f"SELECT * FROM registrations{where} ORDER BY row_num", params)
+            rows = [list(r[1:]) for r in cursor]
+            return records_to_dataframe(self.header, rows)
+
+
+def records_to_dataframe(header, rows):
+    """Build the typed users DataFrame from raw sheet rows (see schema.users_frame)"""
+    from schema import users_frame
+    
+    return users_frame(header, rows)
+
+
+@instrument_methods("services", {"get_all_users": lambda args, kwargs, result: len(result)})
+class LocalServices(RegistrationRepository):
+    """Offline stand-in for GoogleServices backed by SQLite and a local image folder"""
+
+    def __init__(self, db_path="data/registrations.db", image_dir="data/images"):
+        self.store = LocalStore(db_path)
+        self.image_dir = image_dir
+        os.makedirs(image_dir, exist_ok=True)
+
+        if not self.store.header:
+            self.store.replace_all(SHEET_HEADERS, [])
+        elif any(h not in self.store.header for h in SHEET_HEADERS):
+            self.store.add_columns(SHEET_HEADERS)
+
+        # Duplicate index, built once and updated on append
+        self.lock = threading.Lock()
+        self.reserved_tx = set()
+        header, rows = self.store.get_rows()
+        tx_col = header.index("Transaction Hash")
+        id_col = header.index("Telegram User ID")
+        history_col = header.index("TX History")
+        self.tx_hashes = {normalize_key(row[tx_col]) for row in rows if row[tx_col]}
+        self.tx_hashes.update(normalize_key(tx) for row in rows for tx in row[history_col].split())
+        self.telegram_ids = {normalize_key(row[id_col]) for row in rows if row[id_col]}
+        self.proofs = ProofIndex()
+        self.proofs.add_rows(header, rows)
+        # Kept for the latest uploads until their rows are written, as in GoogleServices
+        self._proof_fields = RecentItems(RECENT_UPLOADS)
+
+    @property
+    def data_version(self):
+        """Counter that changes whenever stored rows change"""
+        return self.store.version
+
+    def upload_image_to_gcs(self, uploaded_file, user_name):
+        """Save image to the local image folder under its content hash and return its path"""
+        try:
+            uploaded_file.seek(0)
+            data = uploaded_file.read()
+            digest = content_hash(data)
+            blob_name = proof_blob_name(digest)
+            path = os.path.join(self.image_dir, blob_name)
+
+            if os.path.exists(path):
+                # Same file already stored: nothing to re-encode or write
+                record_reused_proof()
+            else:
+                # Same validation and re-encoding as the GCS upload
+                image_bytes = prepare_proof_image(data)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(image_bytes)
+
+                # Thumbnail next to the original, mirroring the GCS layout
+                thumb_path = os.path.join(self.image_dir, thumbnail_name(blob_name))
+                os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+                with open(thumb_path, "wb") as f:
+                    f.write(make_thumbnail(image_bytes))
+
+            known = self.proofs.stored(digest)
+            dhash = known[2] if known else self._proof_fields.get(path, {}).get("Proof dHash") or perceptual_hash(data)
+            self._proof_fields[path] = {"Proof Hash": digest, "Proof dHash": dhash}
+            return path
+
+        except Exception as e:
+            raise Exception(f"Failed to upload image: {str(e)}")
+
+    def delete_image(self, image_path):
+        """Nothing to delete: images are named by content and may already be reused, as in GoogleServices"""
+
+    def _forget_uploads(self, image_paths):
+        """Drop what upload_image_to_gcs remembered once the rows using these images are written"""
+        for path in image_paths:
+            self._proof_fields.pop(path)
+
+    def proof_fields_for(self, image_path):
+        """Proof Hash / Proof dHash of an image stored by upload_image_to_gcs"""
+        return dict(self._proof_fields.get(image_path, {}))
+
+    def thumbnail_url_for(self, image_path):
+        """Thumbnail path for a locally stored image, or empty string"""
+        if not image_path.startswith(self.image_dir):
+            return ""
+        blob_name = os.path.relpath(image_path, self.image_dir)
+        thumb_path = os.path.join(self.image_dir, thumbnail_name(blob_name))
+        return thumb_path if os.path.exists(thumb_path) else ""
+
+    def _match_proof(self, user_data):
+        """Set Proof Match from the proof index and index this registration's proof (lock held);
+        returns the digest if it was newly indexed"""
+        digest, dhash = user_data.get("Proof Hash", ""), user_data.get("Proof dHash", "")
+        if not digest:
+            return ""
+        user_data["Proof Match"] = self.proofs.match(digest, dhash)
+        added = self.proofs.add(digest, dhash, user_data.get("Bukti Transfer", ""), user_data.get("Thumbnail", ""),
+                                user_data.get("Transaction Hash", ""))
+        return digest if added else ""
+
+    def _forget_proofs(self, digests):
+        """Drop proofs indexed by _match_proof for rows that were never written"""
+        with self.lock:
+            for digest in digests:
+                if digest:
+                    self.proofs.remove(digest)
+
+    def append_to_sheet(self, user_data):
+        """Append user data to the local store; fills in its Proof Match"""
+        try:
+            with self.lock:
+                indexed = self._match_proof(user_data)
+            try:
+                self.store.append_rows([[user_data.get(h, "") for h in self.store.header]])
+            except Exception:
+                self._forget_proofs([indexed])
+                raise
+            self._forget_uploads([user_data.get("Bukti Transfer", "")])
+            with self.lock:
+                self.tx_hashes.add(normalize_key(user_data.get("Transaction Hash", "")))
+                self.telegram_ids.add(normalize_key(user_data.get("Telegram User ID", "")))
+        except Exception as e:
+            raise Exception(f"Error saving to sheet: {str(e)}")
+
+    def append_many_to_sheet(self, users):
+        """Append several registrations in one transaction"""
+        try:
+            with self.lock:
+                indexed = [self._match_proof(user_data) for user_data in users]
+            try:
+                self.store.append_rows([[user_data.get(h, "") for h in self.store.header] for user_data in users])
+            except Exception:
+                self._forget_proofs(indexed)
+                raise
+            self._forget_uploads([user_data.get("Bukti Transfer", "") for user_data in users])
+            with self.lock:
+                for user_data in users:
+                    self.tx_hashes.add(normalize_key(user_data.get("Transaction Hash", "")))
+                    self.telegram_ids.add(normalize_key(user_data.get("Telegram User ID", "")))
+        except Exception as e:
+            raise Exception(f"Error saving to sheet: {str(e)}")
+
+    def latest_registration(self, telegram_user_id):
+        """Most recent registration row of a Telegram user as a dict of strings, or None"""
+        found = self.store.find_row("Telegram User ID", str(telegram_user_id).strip(), last=True)
+        return dict(zip(self.store.header, found[1])) if found else None
+
+    def update_registration(self, row_id, changes, expected_revision, renewal=False):
+        """Edit a registration in place; the Revision check and the write are one SQLite statement"""
+        try:
+            found = self.store.find_row("Row ID", str(row_id).strip())
+            if found is None:
+                raise EditConflict("Registrasi tidak ditemukan, muat ulang data")
+            row_num, current = found
+            header = list(self.store.header)
+            revision = current[header.index("Revision")]
+            if row_revision(revision) != row_revision(expected_revision):
+                raise EditConflict("Registrasi sudah diubah oleh operator lain, muat ulang lalu coba lagi")
+
+            old_tx = normalize_key(current[header.index("Transaction Hash")])
+            new_tx = normalize_key(changes.get("Transaction Hash", old_tx))
+            changes = dict(changes)
+            # A changed hash is reserved like a new registration's until the write lands
+            claimed = new_tx != old_tx
+            if claimed and not self.reserve_transaction(new_tx):
+                raise Exception(DUPLICATE_TX_MESSAGE)
+            try:
+                with self.lock:
+                    indexed = self._match_proof(changes) if changes.get("Proof Hash") else ""
+
+                row = edit_row(header, current, changes, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), renewal)
+                try:
+                    replaced = self.store.replace_row_if(row_num, row, "Revision", revision)
+                except Exception:
+                    self._forget_proofs([indexed])
+                    raise
+                if not replaced:
+                    self._forget_proofs([indexed])
+                    raise EditConflict("Registrasi sudah diubah oleh operator lain, muat ulang lalu coba lagi")
+                self._forget_uploads([changes.get("Bukti Transfer", "")])
+
+                with self.lock:
+                    self.tx_hashes.add(new_tx)
+                    self.telegram_ids.add(normalize_key(row[header.index("Telegram User ID")]))
+            finally:
+                if claimed:
+                    self.release_transaction(new_tx)
+            return dict(zip(header, row))
+        except EditConflict:
+            raise
+        except Exception as e:
+            raise Exception(f"Error updating sheet: {str(e)}")
+
+    def backfill_row_ids(self):
+        """Give rows from before row IDs existed a Row ID and Revision; returns the number of rows updated"""
+        header, rows = self.store.get_rows()
+        id_col, rev_col = header.index("Row ID") + 1, header.index("Revision") + 1
+        missing = [i + 2 for i, row in enumerate(rows) if not row[id_col - 1]]
+        self.store.update_cells([u for row in missing for u in ((row, id_col, new_row_id()), (row, rev_col, "1"))])
+        return len(missing)
+
+    def is_duplicate_transaction(self, tx_hash):
+        """True if the transaction hash is already registered"""
+        key = normalize_key(tx_hash)
+        with self.lock:
+            return key in self.tx_hashes or key in self.reserved_tx
+
+    def has_telegram_user(self, telegram_user_id):
+        """True if the Telegram User ID already has a registration"""
+        with self.lock:
+            return normalize_key(telegram_user_id) in self.telegram_ids
+
+    def reserve_transaction(self, tx_hash):
+        """Atomically claim a transaction hash; False if already taken"""
+        key = normalize_key(tx_hash)
+        with self.lock:
+            if key in self.tx_hashes or key in self.reserved_tx:
+                return False
+            self.reserved_tx.add(key)
+            return True
+
+    def release_transaction(self, tx_hash):
+        """Give back a reserved transaction hash after a failed registration"""
+        with self.lock:
+            self.reserved_tx.discard(normalize_key(tx_hash))
+
+    def find_users(self, filters=None, start_from=None, start_to=None):
+        """Indexed lookup of users, see LocalStore.query"""
+        return self.store.query(filters, start_from, start_to)
+
+    def get_all_users(self):
+        """Get all users from the local store as DataFrame"""
+        try:
+            header, rows = self.store.get_rows()
+            return records_to_dataframe(header, rows)
+        except Exception as e:
+            raise Exception(f"Error reading sheet: {str(e)}")
@@ -0,0 +1,220 @@
+"""
+Process-wide latency and call metrics.
+
+Stages are timed with ``timed("stage")`` or the ``instrument_methods`` class
+decorator; backend calls (row/blob store) are counted with their payload size.
+Snapshots are available as a dict, a JSON lines log written in the background
+and an optional local HTTP endpoint (``/metrics`` JSON).
+"""
+
+import functools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float("inf")]
+
+# Recent samples kept per stage for percentiles
+RESERVOIR_SIZE = 512
+
+
+class _Stage:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.payload = 0
+        self.buckets = [0] * len(BUCKETS_MS)
+        self.recent = deque(maxlen=RESERVOIR_SIZE)
+
+
+class Metrics:
+    """Latency histograms, call counts and payload totals per stage name"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.started_at = time.time()
+
+    def record(self, name, seconds, payload=0, error=False):
+        """Add one observation for a stage"""
+        ms = seconds * 1000
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = _Stage()
+            stage.count += 1
+            stage.errors += bool(error)
+            stage.total += ms
+            stage.max = max(stage.max, ms)
+            stage.payload += payload or 0
+            stage.recent.append(ms)
+            for i, bound in enumerate(BUCKETS_MS):
+                if ms <= bound:
+                    stage.buckets[i] += 1
+                    break
+
+    @contextmanager
+    def timed(self, name):
+        """Time a block; an exception is recorded as an error and re-raised"""
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start, error=error)
+
+    def snapshot(self):
+        """Plain dict of every stage: count, errors, mean/p50/p90/p99/max ms, payload, histogram"""
+        with self.lock:
+            stages = {name: (s.count, s.errors, s.total, s.max, s.payload, list(s.buckets), sorted(s.recent))
+                      for name, s in self.stages.items()}
+
+        def percentile(samples, q):
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+        result = {}
+        for name, (count, errors, total, max_ms, payload, buckets, recent) in sorted(stages.items()):
+            result[name] = {
+                "count": count,
+                "errors": errors,
+                "mean_ms": round(total / count, 3) if count else 0.0,
+                "p50_ms": round(percentile(recent, 0.50), 3),
+                "p90_ms": round(percentile(recent, 0.90), 3),
+                "p99_ms": round(percentile(recent, 0.99), 3),
+                "max_ms": round(max_ms, 3),
+                "payload": payload,
+                "histogram": {("inf" if b == float("inf") else str(b)): n for b, n in zip(BUCKETS_MS, buckets)},
+            }
+        return {"uptime_seconds": round(time.time() - self.started_at, 1), "stages": result}
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+            self.started_at = time.time()
+
+
+# Shared by the app, services and backends in this process
+metrics = Metrics()
+timed = metrics.timed
+
+
+class Laps:
+    """Record consecutive stages of one run as ``<prefix>.<stage>``, each timed from the previous lap"""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        metrics.record(f"{self.prefix}.{stage}", now - self.last)
+        self.last = now
+
+
+def _wrap(fn, name, payload=None):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        error = False
+        result = None
+        try:
+            result = fn(*args, **kwargs)
+            return result
+        except BaseException:
+            error = True
+            raise
+        finally:
+            size = 0
+            if payload is not None and not error:
+                try:
+                    size = payload(args, kwargs, result)
+                except Exception:
+                    size = 0
+            metrics.record(name, time.perf_counter() - start, payload=size, error=error)
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def instrument_methods(prefix, payloads=None):
+    """Class decorator: time every public method as ``<prefix>.<method>``.
+
+    ``payloads`` maps method names to ``fn(args, kwargs, result) -> size`` for
+    methods whose payload (rows, bytes) should be summed.
+    """
+    payloads = payloads or {}
+
+    def decorate(cls):
+        for attr, value in list(vars(cls).items()):
+            if (attr.startswith("_") or not callable(value) or isinstance(value, (staticmethod, classmethod))
+                    or getattr(value, "__instrumented__", False)):
+                continue
+            setattr(cls, attr, _wrap(value, f"{prefix}.{attr}", payloads.get(attr)))
+        return cls
+    return decorate
+
+
+def _write_log(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"time": time.time(), **metrics.snapshot()}) + "\n")
+        except Exception:
+            logger.exception("Writing metrics log failed")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("/metrics", ""):
+            self.send_error(404)
+            return
+        body = json.dumps(metrics.snapshot()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def start_exporters(config):
+    """Start the JSON lines log and/or HTTP endpoint from a ``[metrics]`` section, once per process.
+
+    ``log_path`` + ``log_interval_seconds`` (default 60) append snapshots to a file;
+    ``port`` serves the current snapshot at ``http://127.0.0.1:<port>/metrics``.
+    """
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started or not config:
+            return
+        _exporters_started = True
+
+        if config.get("log_path"):
+            threading.Thread(
+                target=_write_log, args=(config["log_path"], float(config.get("log_interval_seconds", 60))),
+                name="metrics-log", daemon=True
+            ).start()
+
+        if config.get("port"):
+            server = ThreadingHTTPServer((config.get("host", "127.0.0.1"), int(config["port"])), _MetricsHandler)
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
@@ -0,0 +1,80 @@
+"""
+Partition Migration
+Splits the existing registration sheet into partitions (one per month or year
+of Tanggal Mulai, plus 'lifetime') listed in a manifest, then checks that
+every row arrived. The source sheet is only read, so it stays as a backup.
+Stop the app while migrating so no registration lands in the old sheet afterwards.
+
+    python migrate_partitions.py [--scheme month|year] [--dry-run] [--batch-size 2000]
+
+Afterwards set ``partition = "month"`` (or "year") in ``[storage]`` and restart.
+"""
+
+import argparse
+import sys
+from collections import Counter
+
+from config import load_config
+from google_services import GoogleServices, make_stores, with_retries
+from partitions import SCHEMES, partition_for
+from utils import normalize_key
+
+
+def with_partition(config, scheme):
+    """Copy of config with ``[storage] partition`` set (empty string for the unpartitioned table)"""
+    config = {section: value for section, value in config.items()}
+    config["storage"] = dict(config.get("storage") or {}, partition=scheme)
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split the registration sheet into partitions")
+    parser.add_argument("--scheme", choices=SCHEMES, default="month", help="one partition per month or per year")
+    parser.add_argument("--dry-run", action="store_true", help="only show how rows would be split")
+    parser.add_argument("--batch-size", type=int, default=2000, help="rows per append call")
+    args = parser.parse_args()
+
+    config = load_config()
+    source_config = with_partition(config, "")
+
+    # Rows still queued by the app belong in the source table before it is copied
+    source = GoogleServices(source_config)
+    flushed = source.flush_writes()
+    if flushed:
+        print(f"Flushed {flushed} queued rows to the source table")
+
+    values = with_retries(source.rows.read_all)
+    header, rows = (values[0], values[1:]) if values else ([], [])
+    rows = [row for row in rows if any(str(v).strip() for v in row)]
+    plan = Counter(partition_for(dict(zip(header, row)), args.scheme) for row in rows)
+
+    print(f"{len(rows)} rows -> {len(plan)} partitions ({args.scheme})")
+    for name, count in sorted(plan.items()):
+        print(f"  {name:<10} {count:>8}")
+    if args.dry_run or not rows:
+        return
+
+    target, _ = make_stores(with_partition(config, args.scheme))
+    if target.partition_names():
+        sys.exit("❌ Partitions already exist; migrate into an empty manifest only")
+
+    target.set_header(header)
+    for start in range(0, len(rows), args.batch_size):
+        with_retries(target.append_rows, rows[start:start + args.batch_size])
+        print(f"  copied {min(start + args.batch_size, len(rows))}/{len(rows)}")
+
+    # Verify: same number of rows and the same transaction hashes
+    copied = with_retries(target.read_all)
+    copied_header, copied_rows = (copied[0], copied[1:]) if copied else ([], [])
+    tx_col, copied_tx_col = header.index("Transaction Hash"), copied_header.index("Transaction Hash")
+    expected = Counter(normalize_key(row[tx_col]) for row in rows)
+    actual = Counter(normalize_key(row[copied_tx_col]) for row in copied_rows)
+    if len(copied_rows) != len(rows) or expected != actual:
+        sys.exit(f"❌ Verification failed: {len(rows)} source rows, {len(copied_rows)} copied")
+
+    print(f"✅ {len(rows)} rows copied into {len(plan)} partitions")
+    print(f'Set partition = "{args.scheme}" in [storage] and restart the app; the source sheet is left as it is.')
+
+
+if __name__ == "__main__":
+    main()
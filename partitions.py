@@ -0,0 +1,466 @@
+"""
+Partitioned registration table.
+
+Rows are split by ``Tanggal Mulai`` into one partition per month (or year).
+Packages without an expiry (Lifetime) get a partition of their own, so months
+whose subscriptions have all run out can be skipped when only active users
+are needed. A manifest table lists every partition and where it lives.
+
+``PartitionedRowStore`` presents the partitions as a single row store:
+appends are routed per row, and rows are numbered in the order they were
+read, so the shared cache and its incremental refresh work unchanged.
+"""
+
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timedelta
+
+from backends import MemoryRowStore, RowStore, SqliteRowStore
+from utils import PACKAGE_DURATIONS_DAYS, SHEET_HEADERS
+
+logger = logging.getLogger(__name__)
+
+SCHEMES = ("month", "year")
+
+# Partitions that are not a period of Tanggal Mulai
+NO_EXPIRY = "lifetime"
+UNDATED = "undated"
+
+MANIFEST_HEADER = ["Partition", "Location", "Created At"]
+
+
+def partition_for(record, scheme):
+    """Partition name for a registration: '2026-10' (month), '2026' (year), 'lifetime' or 'undated'"""
+    if record.get("Paket") not in PACKAGE_DURATIONS_DAYS:
+        return NO_EXPIRY
+    try:
+        start = datetime.strptime(str(record.get("Tanggal Mulai", "")).strip(), "%Y-%m-%d")
+    except ValueError:
+        return UNDATED
+    return start.strftime("%Y-%m" if scheme == "month" else "%Y")
+
+
+def partition_period(name):
+    """(first day, last day) of Tanggal Mulai in a month/year partition, or None for the others"""
+    try:
+        if len(name) == 7:
+            first = datetime.strptime(name, "%Y-%m").date()
+            last = (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+            return first, last
+        if len(name) == 4:
+            return date(int(name), 1, 1), date(int(name), 12, 31)
+    except ValueError:
+        pass
+    return None
+
+
+def _as_date(value):
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    return datetime.strptime(str(value)[:10], "%Y-%m-%d").date()
+
+
+def prune(names, start_from=None, start_to=None, active_on=None):
+    """Partitions that can hold rows with Tanggal Mulai in [start_from, start_to] and/or still active on a date.
+
+    Lifetime and undated rows have no expiry, so they always count as active;
+    undated rows never match a date range.
+    """
+    start_from, start_to, active_on = _as_date(start_from), _as_date(start_to), _as_date(active_on)
+    longest = timedelta(days=max(PACKAGE_DURATIONS_DAYS.values()))
+    selected = []
+    for name in names:
+        period = partition_period(name)
+        if period is None:
+            if name == UNDATED and (start_from or start_to):
+                continue
+            selected.append(name)
+            continue
+        first, last = period
+        if start_from and last < start_from:
+            continue
+        if start_to and first > start_to:
+            continue
+        if active_on and last + longest < active_on:
+            continue
+        selected.append(name)
+    return selected
+
+
+def _sort_key(name):
+    # Periods in date order, then lifetime / undated
+    return (partition_period(name) is None, name)
+
+
+def _is_blank(row):
+    return not any(str(v).strip() for v in row)
+
+
+def _merge_headers(headers):
+    merged = []
+    for header in headers:
+        merged.extend(h for h in header if h not in merged)
+    return merged
+
+
+def _align(row, source, target):
+    """Reorder a row from the ``source`` header layout to ``target``"""
+    if source == target:
+        return list(row) + [""] * (len(target) - len(row))
+    cells = dict(zip(source, row))
+    return [cells.get(h, "") for h in target]
+
+
+class PartitionCatalog(ABC):
+    """Where partition tables and the manifest live; locations are backend-specific strings"""
+
+    manifest_location = "_manifest"
+    manifest_ready = False
+
+    @abstractmethod
+    def open(self, location):
+        """Row store of an existing table"""
+
+    @abstractmethod
+    def create(self, name, header):
+        """Create the table for a new partition with a header row and return its location"""
+
+    @abstractmethod
+    def exists(self, location):
+        """True if the table exists"""
+
+    def ensure_manifest(self):
+        """Create the manifest table if it does not exist yet (checked once per catalog)"""
+        if not self.manifest_ready:
+            if not self.exists(self.manifest_location):
+                self.open_new(self.manifest_location, MANIFEST_HEADER)
+            self.manifest_ready = True
+
+    def open_new(self, location, header):
+        store = self.open(location)
+        store.set_header(header)
+        return store
+
+    def read_headers(self, locations):
+        """Header row of several tables; backends with batch reads override this"""
+        return [self.open(location).header() for location in locations]
+
+    def read_tables(self, requests):
+        """Rows of several tables from ``(location, first_row, width)``; first_row 1 and width None read everything"""
+        results = []
+        for location, first_row, width in requests:
+            store = self.open(location)
+            if width is None:
+                results.append(store.read_all()[first_row - 1:])
+            else:
+                results.append(store.read_from(first_row, width))
+        return results
+
+
+class MemoryCatalog(PartitionCatalog):
+    """Partitions as in-process MemoryRowStores sharing one injected latency"""
+
+    def __init__(self, latency=None):
+        self.latency = latency
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    def open(self, location):
+        with self.lock:
+            if location not in self.tables:
+                self.tables[location] = MemoryRowStore(self.latency, key=f"memory-{location}")
+            return self.tables[location]
+
+    def exists(self, location):
+        return location in self.tables
+
+    def create(self, name, header):
+        self.open_new(name, header)
+        return name
+
+
+class SqliteCatalog(PartitionCatalog):
+    """Partitions as SQLite files in one folder: <name>.db plus _manifest.db"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest_location = "_manifest.db"
+        self.tables = {}
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def open(self, location):
+        with self.lock:
+            if location not in self.tables:
+                self.tables[location] = SqliteRowStore(os.path.join(self.directory, location))
+            return self.tables[location]
+
+    def exists(self, location):
+        return location in self.tables or os.path.exists(os.path.join(self.directory, location))
+
+    def create(self, name, header):
+        location = f"{name}.db"
+        self.open_new(location, header)
+        return location
+
+
+class PartitionedRowStore(RowStore, metrics_prefix="partitions"):
+    """Row store over the partitions listed in a catalog's manifest.
+
+    Row numbers are positions in read order (partitions sorted by period,
+    then rows appended since), which is what the shared cache expects from
+    ``read_all`` / ``read_from``. They are not stable across processes, so
+    the SQLite mirror is not used for warm starts.
+    """
+
+    stable_rows = False
+
+    def __init__(self, catalog, scheme="month", key="partitioned"):
+        super().__init__()
+        if scheme not in SCHEMES:
+            raise ValueError(f"Unknown partition scheme: {scheme}")
+        self.catalog = catalog
+        self.scheme = scheme
+        self.key = key
+        self.lock = threading.RLock()
+        self._header = []
+        self.partitions = {}     # partition name -> location
+        self.headers = {}        # partition name -> header row
+        self.manifest_rows = 0   # manifest rows read so far, header included
+        self.seen = {}           # partition name -> table rows read so far, header included
+        self.locations = []      # data row number - 2 -> (partition name, table row)
+
+    # -- manifest --
+
+    def _add_manifest_rows(self, rows):
+        for row in rows:
+            if len(row) >= 2 and row[0] and row[0] not in self.partitions:
+                self.partitions[row[0]] = row[1]
+
+    def _load_manifest(self):
+        """Re-read the whole manifest (partitions created by other processes included)"""
+        self.catalog.ensure_manifest()
+        values = self.catalog.read_tables([(self.catalog.manifest_location, 1, None)])[0]
+        self._add_manifest_rows(values[1:])
+        self.manifest_rows = len(values)
+
+    def partition_names(self):
+        """All partitions, oldest period first"""
+        with self.lock:
+            self._load_manifest()
+            return sorted(self.partitions, key=_sort_key)
+
+    def _ensure_partition(self, name):
+        """Location of a partition, creating its table and manifest entry on first use"""
+        if name in self.partitions:
+            return self.partitions[name]
+        location = self.catalog.create(name, self._header_row())
+        self.catalog.open(self.catalog.manifest_location).append_rows(
+            [[name, location, datetime.now().strftime("%Y-%m-%d %H:%M:%S")]]
+        )
+        self.partitions[name] = location
+        self.headers[name] = self._header_row()
+        return location
+
+    # -- header --
+
+    def _header_row(self):
+        """Header new partitions are created with and rows are aligned to"""
+        return list(self._header or SHEET_HEADERS)
+
+    def _load_headers(self, names):
+        missing = [n for n in names if n not in self.headers]
+        if missing:
+            for name, header in zip(missing, self.catalog.read_headers([self.partitions[n] for n in missing])):
+                self.headers[name] = list(header)
+
+    def header(self):
+        with self.lock:
+            names = self.partition_names()
+            self._load_headers(names)
+            merged = _merge_headers(self.headers[n] for n in names)
+            if merged:
+                self._header = merged
+            return list(self._header)
+
+    def set_header(self, header):
+        with self.lock:
+            self._header = list(header)
+            names = self.partition_names()
+            self._load_headers(names)
+            # Keep each partition's own column order and add what it lacks at the end
+            for name in names:
+                missing = [h for h in header if h not in self.headers[name]]
+                if missing:
+                    self.headers[name] = self.headers[name] + missing
+                    self.catalog.open(self.partitions[name]).set_header(self.headers[name])
+
+    # -- reads --
+
+    def _take(self, name, values, first_row, header, out):
+        """Append the data rows of one table read to ``out`` and record their numbers"""
+        if first_row == 1 and values:
+            self.headers[name] = list(values[0])
+            values, first_row = values[1:], 2
+        for offset, row in enumerate(values):
+            if _is_blank(row):
+                continue
+            self.locations.append((name, first_row + offset))
+            out.append(_align(row, self.headers.get(name, header), header))
+        self.seen[name] = max(self.seen.get(name, 0), first_row + len(values) - 1)
+
+    def read_all(self):
+        with self.lock:
+            names = self.partition_names()
+            tables = self.catalog.read_tables([(self.partitions[n], 1, None) for n in names]) if names else []
+            for name, values in zip(names, tables):
+                if values:
+                    self.headers[name] = list(values[0])
+            header = _merge_headers([self.headers.get(n, []) for n in names]) or self._header
+            if not header:
+                return []
+            self._header = list(header)
+
+            self.locations = []
+            self.seen = {}
+            rows = []
+            for name, values in zip(names, tables):
+                self._take(name, values, 1, header, rows)
+            return [list(header)] + rows
+
+    def read_from(self, start_row, width):
+        with self.lock:
+            if start_row - 2 != len(self.locations):
+                # The caller's rows are not the ones this store numbered (e.g. a cache filled elsewhere)
+                logger.warning("Partitioned read from row %d does not follow row %d; re-reading all partitions",
+                               start_row, len(self.locations) + 1)
+                return [row[:width] for row in self.read_all()[start_row - 1:]]
+
+            if not self.manifest_rows:
+                self._load_manifest()
+
+            # Manifest tail and the tail of every known partition in one batch. Tails start at the
+            # last row already seen (ranges past the end of a sheet are rejected), which is dropped again.
+            names = sorted(self.partitions, key=_sort_key)
+            requests = [(self.catalog.manifest_location, self.manifest_rows, len(MANIFEST_HEADER))]
+            for name in names:
+                seen = self.seen.get(name, 0)
+                if seen:
+                    requests.append((self.partitions[name], seen, len(self.headers.get(name) or self._header_row())))
+                else:
+                    requests.append((self.partitions[name], 1, None))
+            tables = self.catalog.read_tables(requests)
+
+            new_entries = tables[0][1:]
+            self.manifest_rows += len(new_entries)
+            self._add_manifest_rows(new_entries)
+
+            header = self._header_row()
+            rows = []
+            for name, values in zip(names, tables[1:]):
+                seen = self.seen.get(name, 0)
+                if seen:
+                    self._take(name, values[1:], seen + 1, header, rows)
+                else:
+                    self._take(name, values, 1, header, rows)
+
+            # Partitions another process created since the last read
+            new_names = sorted((n for n in self.partitions if n not in names), key=_sort_key)
+            if new_names:
+                for name, values in zip(new_names, self.catalog.read_tables(
+                        [(self.partitions[n], 1, None) for n in new_names])):
+                    self._take(name, values, 1, header, rows)
+            return [row[:width] for row in rows]
+
+    def read_partitions(self, names):
+        """Header and rows of just the named partitions, without touching the row numbering"""
+        with self.lock:
+            names = [n for n in names if n in self.partitions]
+            tables = self.catalog.read_tables([(self.partitions[n], 1, None) for n in names]) if names else []
+            header = _merge_headers([t[0] for t in tables if t] + [self._header_row()])
+            rows = []
+            for values in tables:
+                if values:
+                    rows.extend(_align(row, values[0], header) for row in values[1:] if not _is_blank(row))
+            return header, rows
+
+    def select(self, start_from=None, start_to=None, active_on=None):
+        """Partitions needed for a Tanggal Mulai range and/or the users active on a date (see prune)"""
+        return prune(self.partition_names(), start_from, start_to, active_on)
+
+    # -- writes --
+
+    def append_rows(self, rows):
+        with self.lock:
+            if not self.partitions:
+                self._load_manifest()
+            header = self._header_row()
+            routed = {}
+            for row in rows:
+                name = partition_for(dict(zip(header, row)), self.scheme)
+                routed.setdefault(name, []).append(row)
+            for name, batch in sorted(routed.items(), key=lambda item: _sort_key(item[0])):
+                location = self._ensure_partition(name)
+                self._load_headers([name])
+                self.catalog.open(location).append_rows([_align(row, header, self.headers[name]) for row in batch])
+
+    def update_cells(self, updates):
+        with self.lock:
+            header = self._header_row()
+            routed = {}
+            for row, col, value in updates:
+                name, table_row = self._location(row)
+                column = header[col - 1]
+                if column not in self.headers[name]:
+                    self.headers[name] = self.headers[name] + [column]
+                    self.catalog.open(self.partitions[name]).set_header(self.headers[name])
+                routed.setdefault(name, []).append((table_row, self.headers[name].index(column) + 1, value))
+            for name, cells in routed.items():
+                self.catalog.open(self.partitions[name]).update_cells(cells)
+
+    def _location(self, row):
+        location = self.locations[row - 2] if 0 <= row - 2 < len(self.locations) else None
+        if location is None:
+            raise KeyError(f"Row {row} is not known to this store (moved or not read yet)")
+        return location
+
+    def read_rows(self, row_numbers, width):
+        with self.lock:
+            header = self._header_row()
+            routed = {}
+            for row in row_numbers:
+                name, table_row = self._location(row)
+                routed.setdefault(name, []).append(table_row)
+            found = {}
+            for name, table_rows in routed.items():
+                values = self.catalog.open(self.partitions[name]).read_rows(table_rows, len(self.headers[name]))
+                for table_row, cells in zip(table_rows, values):
+                    found[(name, table_row)] = _align(cells, self.headers[name], header) if cells else []
+            return [found[self._location(row)][:width] for row in row_numbers]
+
+    def update_rows(self, rows):
+        """Overwrite rows in place; a row whose Tanggal Mulai / Paket now belongs to another
+        partition is appended there and blanked in the old one, so pruned reads stay right.
+        Moved rows have no number in this store until the next read_all."""
+        with self.lock:
+            header = self._header_row()
+            routed, moved = {}, []
+            for row, values in rows:
+                name, table_row = self._location(row)
+                target = partition_for(dict(zip(header, values)), self.scheme)
+                if target == name:
+                    routed.setdefault(name, []).append((table_row, _align(values, header, self.headers[name])))
+                    continue
+                location = self._ensure_partition(target)
+                self._load_headers([target])
+                self.catalog.open(location).append_rows([_align(values, header, self.headers[target])])
+                routed.setdefault(name, []).append((table_row, [""] * len(self.headers[name])))
+                self.locations[row - 2] = None
+                moved.append(row)
+            for name, updates in routed.items():
+                self.catalog.open(self.partitions[name]).update_rows(updates)
+            return moved
@@ -0,0 +1,129 @@
+"""
+Proof image fingerprints.
+
+Every stored proof carries two hashes: the SHA-256 of the uploaded file, which
+also names its blob (``proofs/<sha256>.webp``) so an identical upload reuses the
+stored object, and a 64-bit dHash of the picture, which stays close when a
+screenshot is re-encoded, resized or slightly edited. ``ProofIndex`` maps both
+back to the registration that used the proof first, so a later registration
+with the same (or a near-identical) screenshot gets a Proof Match.
+"""
+
+import hashlib
+
+PROOF_PREFIX = "proofs/"
+
+# Differing dHash bits (of 64) still counted as the same picture
+MATCH_DISTANCE = 4
+
+# Plain or smoothly shaded pictures hash to (nearly) all zeros or ones and
+# would all look alike, so only hashes with this many differing bits take part
+MIN_DETAIL_BITS = 4
+
+# Popcount masks; numpy is imported on first match so the CLIs importing this stay fast
+_M1 = 0x5555555555555555
+_M2 = 0x3333333333333333
+_M4 = 0x0F0F0F0F0F0F0F0F
+_H01 = 0x0101010101010101
+
+
+def content_hash(data):
+    """SHA-256 of an uploaded file as hex"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def proof_blob_name(digest):
+    """Content-addressed blob name of a proof image"""
+    return f"{PROOF_PREFIX}{digest}.webp"
+
+
+def _has_detail(dhash):
+    """True if a dHash carries enough structure for similarity matching"""
+    bits = bin(int(dhash, 16)).count("1")
+    return MIN_DETAIL_BITS <= bits <= 64 - MIN_DETAIL_BITS
+
+
+def _popcount(values):
+    """Set bits per element of a uint64 array"""
+    import numpy as np
+
+    m1, m2, m4, h01 = (np.uint64(m) for m in (_M1, _M2, _M4, _H01))
+    values = values - ((values >> np.uint64(1)) & m1)
+    values = (values & m2) + ((values >> np.uint64(2)) & m2)
+    values = (values + (values >> np.uint64(4))) & m4
+    return (values * h01) >> np.uint64(56)
+
+
+class ProofIndex:
+    """Content and perceptual hashes of stored proofs -> the registration that used them first.
+
+    Not thread-safe; owners guard it with the lock of their duplicate index.
+    """
+
+    def __init__(self, max_distance=MATCH_DISTANCE):
+        self.max_distance = max_distance
+        # sha256 -> (image URL, thumbnail URL, dHash hex, transaction hash)
+        self.digests = {}
+        self._dhashes = []
+        self._refs = []
+        self._array = None
+
+    def __len__(self):
+        return len(self.digests)
+
+    def add(self, digest, dhash, image_url="", thumbnail_url="", ref=""):
+        """Record a stored proof; the first registration of a digest stays its reference.
+        Returns True if the digest was new."""
+        if not digest or digest in self.digests:
+            return False
+        self.digests[digest] = (image_url, thumbnail_url, dhash, ref)
+        if dhash and _has_detail(dhash):
+            self._dhashes.append(int(dhash, 16))
+            self._refs.append(ref)
+            self._array = None
+        return True
+
+    def remove(self, digest):
+        """Forget a proof recorded by add, for a registration that could not be written"""
+        entry = self.digests.pop(digest, None)
+        if entry is None or not entry[2] or not _has_detail(entry[2]):
+            return
+        value, ref = int(entry[2], 16), entry[3]
+        for i in range(len(self._dhashes) - 1, -1, -1):
+            if self._dhashes[i] == value and self._refs[i] == ref:
+                del self._dhashes[i], self._refs[i]
+                self._array = None
+                return
+
+    def add_rows(self, header, rows):
+        """Index raw registration rows that have proof hashes (rows from before fingerprinting have none)"""
+        if "Proof Hash" not in header:
+            return
+        cols = [header.index(c) if c in header else None
+                for c in ("Proof Hash", "Proof dHash", "Bukti Transfer", "Thumbnail", "Transaction Hash")]
+        for row in rows:
+            values = [str(row[c]).strip() if c is not None and c < len(row) else "" for c in cols]
+            if values[0]:
+                self.add(*values)
+
+    def stored(self, digest):
+        """(image URL, thumbnail URL, dHash hex) of a known digest, or None"""
+        entry = self.digests.get(digest)
+        return entry[:3] if entry else None
+
+    def match(self, digest, dhash):
+        """Proof Match text for a proof: the earlier transaction using it, or empty string"""
+        entry = self.digests.get(digest)
+        if entry:
+            return f"exact: {entry[3]}"
+        if not dhash or not self._dhashes or not _has_detail(dhash):
+            return ""
+        import numpy as np
+
+        if self._array is None:
+            self._array = np.array(self._dhashes, dtype=np.uint64)
+        distances = _popcount(self._array ^ np.uint64(int(dhash, 16)))
+        best = int(distances.argmin())
+        if distances[best] > self.max_distance:
+            return ""
+        return f"similar ({int(distances[best])} bits): {self._refs[best]}"
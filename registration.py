@@ -0,0 +1,139 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from google_services import with_retries
+from repository import DUPLICATE_TX_MESSAGE
+from utils import generate_telegram_link, generate_explorer_link, new_row_id
+
+logger = logging.getLogger(__name__)
+
+PACKAGES = ["Monthly", "Quarterly", "Lifetime"]
+NETWORKS = ["BSC (BEP20)", "Ethereum (ERC20)", "Polygon", "Arbitrum", "Optimism"]
+
+# Validation messages shared by the form and bulk import
+REQUIRED_MESSAGE = "❌ Semua field wajib diisi!"
+TELEGRAM_ID_MESSAGE = "❌ Telegram User ID harus berupa angka!"
+TX_PREFIX_MESSAGE = "❌ Transaction Hash harus diawali dengan '0x'"
+
+# Columns a renewal replaces in the user's row; Timestamp and Row ID stay
+RENEWAL_COLUMNS = ["Nama User", "Paket", "Harga (USDT)", "Tanggal Mulai", "Blockchain Network",
+                   "Transaction Hash", "Bukti Transfer", "Thumbnail", "Proof Hash", "Proof dHash", "Proof Match"]
+
+# Image uploads run here so the submit thread can prepare the sheet side meanwhile
+_upload_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="proof-upload")
+
+
+def validate_registration(user_name, telegram_user_id, price, tx_hash, uploaded_image):
+    """Return an error message for invalid form input, or None if it is valid"""
+    if not all([user_name, telegram_user_id, price, tx_hash, uploaded_image]):
+        return REQUIRED_MESSAGE
+    if not telegram_user_id.isdigit():
+        return TELEGRAM_ID_MESSAGE
+    if not tx_hash.startswith("0x"):
+        return TX_PREFIX_MESSAGE
+    return None
+
+
+def build_user_data(user_name, telegram_user_id, package, price, start_date, blockchain_network, tx_hash):
+    """Prepare a sheet row for a registration; proof image columns are filled on submit"""
+    return {
+        "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "Nama User": user_name,
+        "Telegram User ID": telegram_user_id,
+        "Telegram Link": generate_telegram_link(telegram_user_id),
+        "Paket": package,
+        "Harga (USDT)": price,
+        "Tanggal Mulai": start_date.strftime("%Y-%m-%d"),
+        "Blockchain Network": blockchain_network,
+        "Transaction Hash": tx_hash,
+        "Explorer Link": generate_explorer_link(blockchain_network, tx_hash),
+        "Bukti Transfer": "",
+        "Thumbnail": "",
+        "Proof Hash": "",
+        "Proof dHash": "",
+        "Proof Match": "",
+        "Row ID": new_row_id(),
+        "Revision": "1",
+        "Updated At": "",
+        "TX History": "",
+        "Payment History": ""
+    }
+
+
+def submit_registration(gs, user_data, uploaded_image):
+    """Upload the proof image and save the registration.
+
+    The GCS upload runs on a worker thread while the sheet side is prepared,
+    so submit latency is roughly the slower of the two instead of their sum.
+    If the sheet write ultimately fails, the upload is rolled back (content-
+    addressed proof blobs stay, another submit may be using them).
+    Duplicate transaction hashes are rejected before anything is uploaded.
+    Returns the saved row; its Proof Match names an earlier registration
+    with the same proof image, if any.
+    """
+    # Claim the hash before any upload so two concurrent submits can't both pass
+    tx_hash = user_data["Transaction Hash"]
+    if not gs.reserve_transaction(tx_hash):
+        raise Exception(DUPLICATE_TX_MESSAGE)
+
+    try:
+        return _upload_and_append(gs, user_data, uploaded_image)
+    except Exception:
+        gs.release_transaction(tx_hash)
+        raise
+
+
+def _upload_and_append(gs, user_data, uploaded_image):
+    """Upload the proof image in the background, then append the row"""
+    upload = _upload_pool.submit(gs.upload_image_to_gcs, uploaded_image, user_data["Nama User"])
+
+    try:
+        gs.prepare_append()
+    except Exception as e:
+        # Only a warm-up; the append itself refreshes what it needs
+        logger.warning("Preparing sheet append failed: %s", e)
+
+    image_url = upload.result()
+    user_data = dict(user_data)
+    user_data["Bukti Transfer"] = image_url
+    user_data["Thumbnail"] = gs.thumbnail_url_for(image_url)
+    user_data.update(gs.proof_fields_for(image_url))
+
+    try:
+        with_retries(gs.append_to_sheet, user_data)
+    except Exception:
+        # Compensate through the backend; it knows whether the image may be shared
+        gs.delete_image(image_url)
+        raise
+
+    return user_data
+
+
+def submit_renewal(gs, registration, user_data, uploaded_image):
+    """Renew an existing registration in place instead of appending a new row.
+
+    ``registration`` is the row the operator saw (see latest_registration);
+    its Revision guards against a concurrent edit, and its current payment is
+    kept in Payment History for the revenue figures. Duplicate hashes are
+    rejected before the upload; update_registration claims the new hash
+    itself, so a concurrent registration of the same hash still loses one of
+    the two. The upload is rolled back like submit_registration's if the
+    update fails. Returns the updated row.
+    """
+    if gs.is_duplicate_transaction(user_data["Transaction Hash"]):
+        raise Exception(DUPLICATE_TX_MESSAGE)
+
+    image_url = gs.upload_image_to_gcs(uploaded_image, user_data["Nama User"])
+    changes = {column: user_data[column] for column in RENEWAL_COLUMNS if column in user_data}
+    changes["Bukti Transfer"] = image_url
+    changes["Thumbnail"] = gs.thumbnail_url_for(image_url)
+    changes.update(gs.proof_fields_for(image_url))
+
+    try:
+        # Not retried: a conflict needs the operator to look at the row again
+        return gs.update_registration(registration["Row ID"], changes, registration.get("Revision", ""),
+                                      renewal=True)
+    except Exception:
+        gs.delete_image(image_url)
+        raise
@@ -0,0 +1,100 @@
+from abc import ABC, abstractmethod
+
+DUPLICATE_TX_MESSAGE = "Transaction Hash sudah pernah didaftarkan!"
+
+
+class EditConflict(Exception):
+    """A registration changed (or moved) after the caller read it; reload and retry the edit"""
+
+
+class RegistrationRepository(ABC):
+    """Storage-agnostic interface the app and CLI tools program against.
+
+    Implemented by GoogleServices (Sheets + Cloud Storage) and LocalServices
+    (SQLite + local folder). Methods with a body are optional hooks that
+    backends without caching or queuing can leave as they are.
+    """
+
+    @abstractmethod
+    def get_all_users(self):
+        """All registrations as a DataFrame"""
+
+    @abstractmethod
+    def find_users(self, filters=None, start_from=None, start_to=None):
+        """Registrations matching exact column values and/or a Tanggal Mulai range"""
+
+    @abstractmethod
+    def append_to_sheet(self, user_data):
+        """Store one registration; fills in its Proof Match"""
+
+    def append_many_to_sheet(self, users):
+        """Store several registrations; backends override this with a single batched write"""
+        for user_data in users:
+            self.append_to_sheet(user_data)
+
+    @abstractmethod
+    def latest_registration(self, telegram_user_id):
+        """Most recent registration row of a Telegram user as a dict of strings, or None"""
+
+    @abstractmethod
+    def update_registration(self, row_id, changes, expected_revision, renewal=False):
+        """Edit a registration in place; raises EditConflict if its Revision is no longer
+        ``expected_revision``. A changed Transaction Hash must be neither registered nor
+        reserved. A renewal keeps the replaced payment in Payment History.
+        Returns the stored row as a dict"""
+
+    @abstractmethod
+    def upload_image_to_gcs(self, uploaded_file, user_name):
+        """Store a payment proof image and return its URL or path"""
+
+    @abstractmethod
+    def delete_image(self, image_url):
+        """Roll back a proof image upload after a failed registration"""
+
+    @abstractmethod
+    def is_duplicate_transaction(self, tx_hash):
+        """True if the transaction hash is already registered"""
+
+    @abstractmethod
+    def has_telegram_user(self, telegram_user_id):
+        """True if the Telegram User ID already has a registration"""
+
+    @abstractmethod
+    def reserve_transaction(self, tx_hash):
+        """Atomically claim a transaction hash; False if already taken"""
+
+    @abstractmethod
+    def release_transaction(self, tx_hash):
+        """Give back a reserved transaction hash after a failed registration"""
+
+    @property
+    @abstractmethod
+    def data_version(self):
+        """Counter that changes whenever stored rows change"""
+
+    def get_active_users(self, today=None):
+        """Registrations that have not expired on ``today`` (Lifetime included)"""
+        from utils import active_users
+        return active_users(self.get_all_users(), today).reset_index(drop=True)
+
+    def thumbnail_url_for(self, image_url):
+        """Thumbnail for a stored image, or empty string"""
+        return ""
+
+    def proof_fields_for(self, image_url):
+        """Proof Hash / Proof dHash columns for an image stored by upload_image_to_gcs"""
+        return {}
+
+    def prepare_append(self):
+        """Warm up before an append; runs while the proof image uploads"""
+
+    def flush_writes(self):
+        """Write queued rows now; returns the number of rows written"""
+        return 0
+
+    def invalidate_cache(self, full=False):
+        """Mark cached rows as stale"""
+
+    def startup_report(self):
+        """Seconds spent in each one-time setup step"""
+        return {}
@@ -0,0 +1,101 @@
+"""
+Typed DataFrame schema for registrations.
+
+Rows are read as strings from the sheet (or the SQLite mirror) and converted
+once per data version: dates are parsed, Paket / Blockchain Network become
+categoricals and Telegram User IDs and Revisions integers. The Telegram and explorer links
+are not kept per row; ``with_links`` derives them for the rows being shown or
+exported.
+"""
+
+import pandas as pd
+
+from utils import SHEET_HEADERS, generate_explorer_link, generate_telegram_link
+
+# Column -> kind; columns not listed are text
+SCHEMA = {
+    "Timestamp": "datetime",
+    "Telegram User ID": "id",
+    "Paket": "category",
+    "Harga (USDT)": "float",
+    "Tanggal Mulai": "date",
+    "Blockchain Network": "category",
+    "Revision": "int",
+}
+
+# Derivable columns dropped from the typed frame
+DERIVED_COLUMNS = ["Telegram Link", "Explorer Link"]
+
+DATE_FORMAT = "%Y-%m-%d"
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _text_dtype():
+    """Arrow-backed strings when pyarrow is installed (a fraction of the memory of Python str objects)"""
+    try:
+        import pyarrow  # noqa: F401
+        return "string[pyarrow]"
+    except ImportError:
+        return object
+
+
+def _convert(values, kind):
+    if kind == "datetime":
+        return pd.to_datetime(values, format=DATETIME_FORMAT, errors="coerce")
+    if kind == "date":
+        return pd.to_datetime(values, format=DATE_FORMAT, errors="coerce")
+    if kind == "category":
+        return values.astype("category")
+    if kind == "float":
+        return pd.to_numeric(values.str.replace(",", "", regex=False), errors="coerce").astype("float64")
+    if kind == "int":
+        # Missing or malformed counts as 0, like utils.row_revision
+        return pd.to_numeric(values, errors="coerce").fillna(0).astype("int64")
+    if kind == "id":
+        ids = pd.to_numeric(values, errors="coerce")
+        # Keep the text if any non-empty ID is not a number, so nothing is lost
+        if (ids.isna() & (values != "")).any():
+            return values
+        return ids.astype("Int64")
+    return values.astype(_text_dtype())
+
+
+def users_frame(header, rows):
+    """Typed users DataFrame from raw sheet rows (lists of cell strings)"""
+    width = len(header)
+    frame = pd.DataFrame(
+        [[str(v) for v in row[:width]] + [""] * (width - len(row)) for row in rows],
+        columns=header, dtype=object
+    )
+
+    columns = {}
+    for column in header:
+        if column in DERIVED_COLUMNS:
+            continue
+        columns[column] = _convert(frame[column], SCHEMA.get(column)) if len(frame) else frame[column]
+    return pd.DataFrame(columns, index=frame.index)
+
+
+def with_links(df):
+    """Copy of df with Telegram Link / Explorer Link derived from ID, network and hash, in sheet column order"""
+    df = df.copy()
+    if "Telegram User ID" in df.columns:
+        ids = df["Telegram User ID"].astype("string").fillna("")
+        df["Telegram Link"] = [generate_telegram_link(i) if i else "" for i in ids]
+    if "Blockchain Network" in df.columns and "Transaction Hash" in df.columns:
+        df["Explorer Link"] = [
+            generate_explorer_link(network, tx_hash) if tx_hash else ""
+            for network, tx_hash in zip(df["Blockchain Network"].astype("string").fillna(""),
+                                        df["Transaction Hash"].astype("string").fillna(""))
+        ]
+    ordered = [c for c in SHEET_HEADERS if c in df.columns]
+    return df[ordered + [c for c in df.columns if c not in ordered]]
+
+
+def format_date(value, fmt=DATE_FORMAT, missing="N/A"):
+    """Format a parsed date for display; NaT / empty values show as ``missing``"""
+    if value is None or pd.isna(value):
+        return missing
+    if isinstance(value, str):
+        return value
+    return value.strftime(fmt)
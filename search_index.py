@@ -0,0 +1,219 @@
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+
+import numpy as np
+
+from utils import edit_version
+
+# Columns searched by the user lists
+SEARCH_COLUMNS = ["Nama User", "Telegram User ID", "Transaction Hash"]
+
+# Minimum query token length for substring (trigram) and fuzzy matching
+MIN_SUBSTRING_LENGTH = 3
+MIN_FUZZY_LENGTH = 4
+
+_token_split = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text):
+    """Lowercase and strip accents so 'José' matches 'jose'"""
+    text = str(text)
+    if text.isascii():
+        return text.lower()
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    """Split normalized text into alphanumeric tokens"""
+    return [t for t in _token_split.split(normalize(text)) if t]
+
+
+def _trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+def _deletes(token):
+    """All variants of a token with one character removed (for edit-distance-1 lookups)"""
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def _sorted_unique(rows):
+    """Sort-based unique; faster than np.unique's hashing for small int arrays"""
+    rows = np.sort(rows)
+    if len(rows) < 2:
+        return rows
+    keep = np.empty(len(rows), dtype=bool)
+    keep[0] = True
+    np.not_equal(rows[1:], rows[:-1], out=keep[1:])
+    return rows[keep]
+
+
+class SearchIndex:
+    """Token index over user name, Telegram User ID and transaction hash.
+
+    Every query token must match the row by prefix (any column), substring
+    (name tokens, via trigrams) or, if fuzzy, within one edit of a name token
+    (via a deletion-variant index). Row lists are stored as slices of one
+    NumPy array, so a query costs a few dict lookups and array unions.
+    Results are row positions in the indexed DataFrame.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows = 0
+        self.anchor = None
+        self.sorted_tokens = []
+        self.spans = {}
+        self.postings = np.empty(0, dtype=np.int64)
+        self.extra = {}
+        self.trigrams = {}
+        self.deletes = {}
+
+    @staticmethod
+    def _row_tokens(df, start):
+        """Yield (position, token, is_name_token) for rows df.iloc[start:]"""
+        columns = [df[c].iloc[start:].astype("string").fillna("").tolist() if c in df.columns
+                   else [""] * (len(df) - start) for c in SEARCH_COLUMNS]
+        for offset, (name, telegram_id, tx_hash) in enumerate(zip(*columns)):
+            position = start + offset
+            for token in set(tokenize(name)):
+                yield position, token, True
+            for value in (telegram_id, tx_hash):
+                token = normalize(value).strip()
+                if token:
+                    yield position, token, False
+
+    def _index_name_token(self, token):
+        for gram in _trigrams(token):
+            self.trigrams.setdefault(gram, set()).add(token)
+        for variant in _deletes(token) | {token}:
+            self.deletes.setdefault(variant, set()).add(token)
+
+    def build(self, df):
+        """Index all rows of df"""
+        token_rows = {}
+        name_tokens = set()
+        for position, token, is_name in self._row_tokens(df, 0):
+            token_rows.setdefault(token, []).append(position)
+            if is_name:
+                name_tokens.add(token)
+
+        with self.lock:
+            self.sorted_tokens = sorted(token_rows)
+            sizes = [len(token_rows[t]) for t in self.sorted_tokens]
+            ends = np.cumsum(sizes)
+            self.spans = {t: (int(end - size), int(end)) for t, size, end in zip(self.sorted_tokens, sizes, ends)}
+            self.postings = np.fromiter(
+                (p for t in self.sorted_tokens for p in token_rows[t]), dtype=np.int64, count=int(sum(sizes))
+            )
+            self.extra = {}
+            for token in name_tokens:
+                self._index_name_token(token)
+        self.rows = len(df)
+        return self
+
+    def add_rows(self, df, start):
+        """Index appended rows df.iloc[start:] without rebuilding"""
+        with self.lock:
+            for position, token, is_name in self._row_tokens(df, start):
+                if token not in self.spans and token not in self.extra:
+                    insort(self.sorted_tokens, token)
+                    if is_name:
+                        self._index_name_token(token)
+                self.extra.setdefault(token, []).append(position)
+        self.rows = len(df)
+        return self
+
+    def _matching_rows(self, query_token, fuzzy):
+        """Row positions matched by one query token"""
+        parts = []
+        matched = set()
+
+        # Prefix: a contiguous range of sorted tokens, and for tokens present at
+        # build time also one contiguous slice of the postings array
+        i = j = bisect_left(self.sorted_tokens, query_token)
+        while j < len(self.sorted_tokens) and self.sorted_tokens[j].startswith(query_token):
+            j += 1
+        built = [t for t in self.sorted_tokens[i:j] if t in self.spans]
+        if built:
+            parts.append(self.postings[self.spans[built[0]][0]:self.spans[built[-1]][1]])
+        matched.update(t for t in self.sorted_tokens[i:j] if t in self.extra)
+
+        # Substring inside name tokens: intersect trigram postings, then verify
+        if len(query_token) >= MIN_SUBSTRING_LENGTH:
+            grams = sorted(_trigrams(query_token), key=lambda g: len(self.trigrams.get(g, ())))
+            candidates = set(self.trigrams.get(grams[0], ()))
+            for gram in grams[1:]:
+                candidates &= self.trigrams.get(gram, set())
+                if not candidates:
+                    break
+            matched.update(t for t in candidates if query_token in t and not t.startswith(query_token))
+
+        # Fuzzy: tokens within one insertion/deletion/substitution/transposition
+        if fuzzy and len(query_token) >= MIN_FUZZY_LENGTH:
+            for variant in _deletes(query_token) | {query_token}:
+                matched.update(t for t in self.deletes.get(variant, ()) if not t.startswith(query_token))
+
+        for token in matched:
+            span = self.spans.get(token)
+            if span is not None:
+                parts.append(self.postings[span[0]:span[1]])
+            if token in self.extra:
+                parts.append(np.asarray(self.extra[token], dtype=np.int64))
+
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return _sorted_unique(np.concatenate(parts))
+
+    def search(self, query, fuzzy=True):
+        """Sorted array of row positions matching every token of the query.
+
+        Punctuation only separates tokens, so a query without letters or digits
+        matches no rows (unlike the substring filter this index replaced).
+        """
+        with self.lock:
+            result = None
+            for query_token in tokenize(query):
+                rows = self._matching_rows(query_token, fuzzy)
+                result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+                if not len(result):
+                    break
+            return result if result is not None else np.empty(0, dtype=np.int64)
+
+
+# One index per data source in this process, kept in step with the data
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _anchor(df, rows):
+    """Identity of the last indexed row, and the edit version of all indexed rows"""
+    if rows == 0 or len(df) < rows:
+        return None
+    last = df.iloc[rows - 1]
+    return (last.get("Timestamp"), last.get("Transaction Hash"), edit_version(df, rows))
+
+
+def get_search_index(df, data_version, source="default"):
+    """Shared search index for a data source, built once per data version.
+
+    When the data only grew since the last build, just the new rows are indexed;
+    an in-place edit (see utils.edit_version) rebuilds it.
+    """
+    with _indexes_lock:
+        entry = _indexes.get(source)
+        if entry is not None and entry[0] == data_version:
+            return entry[1]
+
+        index = entry[1] if entry is not None else None
+        if index is not None and index.rows and len(df) >= index.rows and _anchor(df, index.rows) == index.anchor:
+            index.add_rows(df, start=index.rows)
+        else:
+            index = SearchIndex().build(df)
+        index.anchor = _anchor(df, index.rows)
+
+        _indexes[source] = (data_version, index)
+        return index
@@ -0,0 +1,50 @@
+import io
+import os
+import sys
+import uuid
+
+import pytest
+
+# The app's modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def make_services(tmp_path):
+    """GoogleServices over in-memory stores, with its own cache, spool and blob store"""
+    from backends import MemoryBlobStore, MemoryRowStore
+    from google_services import GoogleServices
+
+    def make(row_store=None, blob_store=None, mirror=None, **google_config):
+        config = {"google_config": dict({"spool_dir": str(tmp_path / "spool")}, **google_config)}
+        if mirror:
+            config["local_store"] = {"path": mirror}
+        return GoogleServices(config, row_store=row_store or MemoryRowStore(key=f"memory-{uuid.uuid4().hex}"),
+                              blob_store=blob_store or MemoryBlobStore())
+    return make
+
+
+@pytest.fixture
+def user():
+    """Factory for a registration's user_data, as built by the form"""
+    import pandas as pd
+    from registration import build_user_data
+
+    def make(tx, telegram_id="100", package="Monthly", price=25, start="2026-01-15", network="Polygon", name=None):
+        return build_user_data(name or f"User {tx}", telegram_id, package, price, pd.Timestamp(start), network, tx)
+    return make
+
+
+@pytest.fixture
+def proof_image():
+    """Factory for distinct PNG proof images as file-like objects"""
+    import numpy as np
+    from PIL import Image
+
+    def make(seed):
+        pixels = np.random.default_rng(seed).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="PNG")
+        buffer.seek(0)
+        return buffer
+    return make
@@ -0,0 +1,90 @@
+import zipfile
+from io import BytesIO
+
+import pandas as pd
+
+from bulk_import import IMPORT_COLUMNS, IMPORTED, import_registrations, read_batch, read_images
+from registration import REQUIRED_MESSAGE, TELEGRAM_ID_MESSAGE, TX_PREFIX_MESSAGE
+
+
+def batch(*rows):
+    """Import file bytes for rows of (name, telegram id, price, tx hash, image name)"""
+    lines = [[name, telegram_id, "Monthly", price, "2026-01-15", "Polygon", tx, image]
+             for name, telegram_id, price, tx, image in rows]
+    return pd.DataFrame(lines, columns=IMPORT_COLUMNS).to_csv(index=False).encode("utf-8")
+
+
+def archive(files):
+    """ZIP bytes holding ``files`` ({path inside the ZIP: bytes})"""
+    data = BytesIO()
+    with zipfile.ZipFile(data, "w") as zf:
+        for path, content in files.items():
+            zf.writestr(path, content)
+    return data.getvalue()
+
+
+def test_zip_images_are_matched_by_lowercased_file_name(proof_image):
+    images = read_images(archive({
+        "proofs/Alice.PNG": proof_image(1).getvalue(),
+        "__MACOSX/proofs/._Alice.PNG": b"resource fork",
+        "notes.txt": b"not an image",
+    }))
+
+    assert list(images) == ["alice.png"]
+    assert images["alice.png"] == proof_image(1).getvalue()
+
+
+def test_bad_rows_are_reported_and_good_rows_written_in_one_append(make_services, proof_image, monkeypatch):
+    gs = make_services()
+    appends = []
+    append_rows = gs.rows.append_rows
+
+    def recorded_append(rows):
+        appends.append(len(rows))
+        return append_rows(rows)
+
+    monkeypatch.setattr(gs.rows, "append_rows", recorded_append)
+    df = read_batch("import.csv", batch(
+        ("Alice", "101", "25", "0x1", "Alice.png"),
+        ("Bob", "abc", "25", "0x2", "bob.png"),
+        ("Carol", "103", "", "0x3", "carol.png"),
+        ("Dave", "104", "25", "1x4", "dave.png"),
+        ("Erin", "105", "25", "0x5", "missing.png"),
+        ("Frank", "106", "25", "0x1", "frank.png"),
+        ("Grace", "107", "25", "0x7", "grace.png"),
+    ))
+    images = read_images(archive({f"{name}.png": proof_image(i).getvalue()
+                                  for i, name in enumerate(["alice", "bob", "carol", "dave", "frank", "grace"])}))
+
+    result = import_registrations(gs, df, images)
+
+    assert result["Status"].tolist() == [
+        IMPORTED, TELEGRAM_ID_MESSAGE, REQUIRED_MESSAGE, TX_PREFIX_MESSAGE,
+        "❌ Bukti transfer tidak ada di file ZIP!", "❌ Transaction Hash dobel di file ini!", IMPORTED,
+    ]
+    assert appends == [2]
+    assert gs.get_all_users()["Nama User"].astype(str).tolist() == ["Alice", "Grace"]
+
+
+def test_failed_upload_does_not_stop_the_rest(make_services, proof_image, monkeypatch):
+    gs = make_services()
+    bad = proof_image(2).getvalue()
+    upload = gs.upload_image_to_gcs
+
+    def flaky_upload(uploaded_file, user_name):
+        if uploaded_file.getvalue() == bad:
+            raise Exception("Failed to upload image: timeout")
+        return upload(uploaded_file, user_name)
+
+    monkeypatch.setattr(gs, "upload_image_to_gcs", flaky_upload)
+    df = read_batch("import.csv", batch(*[(name, str(100 + i), "25", f"0x{i}", f"{name}.png")
+                                         for i, name in enumerate(["alice", "bob", "carol"])]))
+    images = read_images(archive({f"{name}.png": proof_image(i + 1).getvalue()
+                                  for i, name in enumerate(["alice", "bob", "carol"])}))
+
+    result = import_registrations(gs, df, images)
+
+    assert result["Status"].tolist() == [IMPORTED, "❌ Failed to upload image: timeout", IMPORTED]
+    assert sorted(gs.get_all_users()["Transaction Hash"].astype(str)) == ["0x0", "0x2"]
+    # The failed row's hash is free again for a retry
+    assert gs.reserve_transaction("0x1")
@@ -0,0 +1,90 @@
+import uuid
+
+from aggregates import get_aggregates
+from registration import submit_registration, submit_renewal
+from repository import DUPLICATE_TX_MESSAGE
+from search_index import get_search_index
+
+
+NAMES = ["Alice", "Bob", "Carol"]
+
+
+def registered(make_services, user, proof_image):
+    gs = make_services()
+    for i, name in enumerate(NAMES):
+        submit_registration(gs, user(f"0x{i}", telegram_id=str(100 + i), name=name), proof_image(i))
+    gs.flush_writes()
+    return gs
+
+
+def edit(gs, telegram_id, changes):
+    row = gs.latest_registration(telegram_id)
+    return gs.update_registration(row["Row ID"], changes, row["Revision"])
+
+
+def test_aggregates_follow_in_place_edits(make_services, user, proof_image):
+    gs = registered(make_services, user, proof_image)
+    source = uuid.uuid4().hex
+    assert get_aggregates(gs.get_all_users(), source).totals() == {"users": 3, "revenue": 75.0}
+
+    edit(gs, "101", {"Harga (USDT)": 100, "Paket": "Quarterly"})
+    aggregates = get_aggregates(gs.get_all_users(), source)
+
+    assert aggregates.totals() == {"users": 3, "revenue": 150.0}
+    assert aggregates.package_counts() == {"Monthly": 2, "Quarterly": 1}
+
+
+def test_search_index_follows_in_place_edits(make_services, user, proof_image):
+    gs = registered(make_services, user, proof_image)
+    source = uuid.uuid4().hex
+    assert list(get_search_index(gs.get_all_users(), gs.data_version, source).search("bob")) == [1]
+
+    edit(gs, "101", {"Nama User": "Zed"})
+    df = gs.get_all_users()
+    index = get_search_index(df, gs.data_version, source)
+
+    assert list(index.search("zed")) == [1]
+    assert list(index.search("bob")) == []
+
+
+def test_renewals_keep_earlier_revenue(make_services, user, proof_image):
+    gs = registered(make_services, user, proof_image)
+    source = uuid.uuid4().hex
+    get_aggregates(gs.get_all_users(), source)
+
+    for i, start in enumerate(["2026-02-14", "2026-03-16"]):
+        registration = gs.latest_registration("101")
+        renewal = user(f"0x1{i}", telegram_id="101", package="Quarterly", price=60, start=start, name="Bob")
+        renewed = submit_renewal(gs, registration, renewal, proof_image(10 + i))
+    assert renewed["Payment History"] == ("2026-01-15|Monthly|25|Polygon|0x1; "
+                                          "2026-02-14|Quarterly|60|Polygon|0x10")
+
+    aggregates = get_aggregates(gs.get_all_users(), source)
+    assert aggregates.totals() == {"users": 3, "revenue": 195.0}
+    assert aggregates.package_counts() == {"Monthly": 2, "Quarterly": 1}
+    assert aggregates.expiry_counts(today="2026-01-20")["active"] == 3
+    by_month = aggregates.revenue_by("Month").set_index("Month")
+    assert by_month["Revenue"].to_dict() == {"2026-01": 75.0, "2026-02": 60.0, "2026-03": 60.0}
+    assert by_month["Users"].to_dict() == {"2026-01": 2, "2026-02": 0, "2026-03": 1}
+
+
+def test_plain_edits_do_not_add_payments(make_services, user, proof_image):
+    gs = registered(make_services, user, proof_image)
+
+    assert edit(gs, "101", {"Harga (USDT)": 30})["Payment History"] == ""
+
+
+def test_edits_respect_pending_reservations(make_services, user, proof_image, tmp_path):
+    import pytest
+    from local_store import LocalServices
+
+    for gs in (make_services(), LocalServices(str(tmp_path / "registrations.db"), str(tmp_path / "images"))):
+        submit_registration(gs, user("0x1", telegram_id="101", name="Bob"), proof_image(1))
+        assert gs.reserve_transaction("0x9")
+
+        with pytest.raises(Exception, match=DUPLICATE_TX_MESSAGE):
+            edit(gs, "101", {"Transaction Hash": "0x9"})
+        edit(gs, "101", {"Transaction Hash": "0x8"})
+
+        assert not gs.reserve_transaction("0x9")
+        assert not gs.reserve_transaction("0x8")
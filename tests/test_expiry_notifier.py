@@ -0,0 +1,48 @@
+from expiry_notifier import EXPIRED, EXPIRING, load_state, run
+from local_store import LocalServices, LocalStore
+from registration import submit_registration, submit_renewal
+from utils import SHEET_HEADERS
+
+
+class ListSink:
+    def __init__(self):
+        self.sent = []
+
+    def emit(self, notifications):
+        self.sent.extend(notifications)
+
+
+def test_generation_changes_on_rewrites_not_appends(tmp_path):
+    store = LocalStore(str(tmp_path / "registrations.db"))
+    store.replace_all(SHEET_HEADERS, [])
+    generation = store.generation()
+
+    store.append_rows([["a"] * len(SHEET_HEADERS), ["b"] * len(SHEET_HEADERS)])
+    assert store.generation() == generation
+
+    store.upsert_rows(3, [["c"] * len(SHEET_HEADERS)])
+    assert store.generation() == generation + 1
+    assert store.replace_row_if(2, ["d"] * len(SHEET_HEADERS), "Revision", "a")
+    assert store.generation() == generation + 2
+    assert not store.replace_row_if(2, ["e"] * len(SHEET_HEADERS), "Revision", "a")
+    assert store.generation() == generation + 2
+
+
+def test_renewal_replaces_the_expiry_the_notifier_knows(tmp_path, user, proof_image):
+    db = str(tmp_path / "registrations.db")
+    gs = LocalServices(db, str(tmp_path / "images"))
+    registration = submit_registration(gs, user("0x1", start="2026-01-01"), proof_image(1))
+    state, sink = load_state(str(tmp_path / "state.json")), ListSink()
+
+    run(LocalStore(db), state, sink, today="2026-01-28")
+    assert [(n["event"], n["expiry_date"]) for n in sink.sent] == [(EXPIRING, "2026-01-31")]
+
+    submit_renewal(gs, registration, user("0x2", start="2026-02-01"), proof_image(2))
+    run(LocalStore(db), state, sink, today="2026-02-03")
+
+    assert [n["event"] for n in sink.sent] == [EXPIRING]
+    assert state["users"]["100"]["Expiry Date"] == "2026-03-03"
+    assert state["users"]["100"]["Transaction Hash"] == "0x2"
+
+    run(LocalStore(db), state, sink, today="2026-03-05")
+    assert [(n["event"], n["expiry_date"]) for n in sink.sent][-1] == (EXPIRED, "2026-03-03")
@@ -0,0 +1,79 @@
+import gzip
+import uuid
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+import export
+from export import EXPORT_FORMATS, build_export, export_key, get_export
+
+USERS = pd.DataFrame({
+    "Nama User": ["Alice", "Bob, Jr.", "José \"JC\""],
+    "Telegram User ID": ["7058728559", "123", "0042"],
+    "Harga (USDT)": [25.0, 60.5, 0.0],
+    "Days Remaining": pd.array([3, None, -2], dtype="Int64"),
+})
+
+
+def test_csv_round_trip():
+    data = build_export(USERS, "CSV")
+    back = pd.read_csv(BytesIO(data), dtype={"Telegram User ID": str})
+
+    assert back["Nama User"].tolist() == USERS["Nama User"].tolist()
+    assert back["Telegram User ID"].tolist() == USERS["Telegram User ID"].tolist()
+    assert back["Harga (USDT)"].tolist() == USERS["Harga (USDT)"].tolist()
+
+
+def test_csv_is_the_same_in_chunks_and_gzip():
+    whole = USERS.to_csv(index=False).encode("utf-8")
+
+    assert b"".join(c.encode("utf-8") for c in export.iter_csv_chunks(USERS, chunk_rows=1)) == whole
+    assert build_export(USERS, "CSV") == whole
+    assert gzip.decompress(build_export(USERS, "CSV (gzip)")) == whole
+
+
+def test_parquet_round_trip_keeps_types():
+    back = pd.read_parquet(BytesIO(build_export(USERS, "Parquet")))
+
+    pd.testing.assert_frame_equal(back, USERS)
+
+
+def test_every_listed_format_builds():
+    assert all(build_export(USERS, fmt) for fmt in EXPORT_FORMATS)
+    with pytest.raises(ValueError):
+        build_export(USERS, "XLS")
+
+
+def test_exports_are_rebuilt_when_data_or_filters_change():
+    builds = []
+
+    def frame():
+        builds.append(1)
+        return USERS
+
+    version = uuid.uuid4().hex
+    first = get_export(export_key(version, ("Monthly",), "CSV"), frame, "CSV")
+    assert get_export(export_key(version, ("Monthly",), "CSV"), frame, "CSV") is first
+    assert len(builds) == 1
+
+    get_export(export_key(version + "-next", ("Monthly",), "CSV"), frame, "CSV")
+    get_export(export_key(version, ("Quarterly",), "CSV"), frame, "CSV")
+    get_export(export_key(version, ("Monthly",), "Parquet"), frame, "Parquet")
+    assert len(builds) == 4
+
+
+def test_cache_is_bounded_by_total_size(monkeypatch):
+    size = len(build_export(USERS, "CSV"))
+    monkeypatch.setattr(export, "_cache", export.OrderedDict())
+    monkeypatch.setattr(export, "_cache_bytes", 0)
+    monkeypatch.setattr(export, "MAX_CACHED_EXPORT_BYTES", 2 * size)
+
+    for n in range(3):
+        get_export(("v", n), lambda: USERS, "CSV")
+    assert list(export._cache) == [("v", 1), ("v", 2)]
+    assert export._cache_bytes == 2 * size
+
+    monkeypatch.setattr(export, "MAX_CACHED_EXPORT_BYTES", size - 1)
+    get_export(("v", 3), lambda: USERS, "CSV")
+    assert ("v", 3) not in export._cache
@@ -0,0 +1,58 @@
+import re
+
+import pytest
+
+from google_services import GoogleSheetRowStore
+
+
+class GridSheet:
+    """Worksheet stand-in with a fixed grid that rejects ranges starting past it, like the Sheets API"""
+
+    def __init__(self, values, grid_rows):
+        self.values = values
+        self.grid_rows = grid_rows
+
+    def get_values(self, range_name):
+        first, last_col = re.match(r"A(\d+):([A-Z]+)$", range_name).groups()
+        first = int(first)
+        if first > self.grid_rows:
+            raise Exception(f"Range ({range_name}) exceeds grid limits. Max rows: {self.grid_rows}")
+        width = ord(last_col) - ord("A") + 1
+        rows = [row[:width] for row in self.values[first - 1:]]
+        return rows or [[]]
+
+
+class Clients:
+    timings = {}
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+
+    def worksheet(self, sheet_id, title=None):
+        return self.sheet
+
+
+def store_for(values, grid_rows):
+    return GoogleSheetRowStore(Clients(GridSheet(values, grid_rows)), "sheet")
+
+
+def test_read_from_full_grid_returns_no_rows():
+    values = [["Timestamp", "Nama User"]] + [[f"t{i}", f"user {i}"] for i in range(3)]
+    store = store_for(values, grid_rows=len(values))
+
+    assert store.read_from(len(values) + 1, 2) == []
+
+
+def test_read_from_returns_only_new_rows():
+    values = [["Timestamp", "Nama User"]] + [[f"t{i}", f"user {i}"] for i in range(5)]
+    store = store_for(values, grid_rows=len(values))
+
+    assert store.read_from(4, 2) == [["t2", "user 2"], ["t3", "user 3"], ["t4", "user 4"]]
+
+
+@pytest.mark.parametrize("rows", [0, 1])
+def test_read_from_small_sheet(rows):
+    values = [["Timestamp", "Nama User"]] + [["t", "user"]] * rows
+    store = store_for(values, grid_rows=1000)
+
+    assert store.read_from(rows + 2, 2) == []
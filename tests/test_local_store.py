@@ -0,0 +1,61 @@
+from backends import MemoryRowStore
+from local_store import INDEXED_COLUMNS, LocalStore
+from utils import SHEET_HEADERS
+
+
+def no_full_read():
+    raise AssertionError("full sheet read on a warm start")
+
+
+def sheet_rows(user, *registrations):
+    """Sheet rows for (tx, telegram id, start date) registrations"""
+    return [[str(user(tx, telegram_id=telegram_id, start=start).get(h, "")) for h in SHEET_HEADERS]
+            for tx, telegram_id, start in registrations]
+
+
+def test_mirror_queries_use_indexes_and_follow_writes(tmp_path, user):
+    store = LocalStore(str(tmp_path / "mirror.db"))
+    store.replace_all(SHEET_HEADERS, sheet_rows(user, ("0x1", "101", "2026-01-05"), ("0x2", "102", "2026-02-05")))
+    indexes = {name for (name,) in store.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_" + c.lower().replace(" ", "_") for c in INDEXED_COLUMNS} <= indexes
+
+    generation = store.generation()
+    store.append_rows(sheet_rows(user, ("0x3", "101", "2026-03-05")))
+    assert store.generation() == generation
+    store.upsert_rows(2, sheet_rows(user, ("0x4", "101", "2026-01-20")))
+    assert store.generation() == generation + 1
+
+    by_user = store.query({"Telegram User ID": "101"})
+    assert by_user["Transaction Hash"].astype(str).tolist() == ["0x4", "0x3"]
+    in_range = store.query(start_from="2026-01-15", start_to="2026-02-28")
+    assert in_range["Transaction Hash"].astype(str).tolist() == ["0x4", "0x2"]
+    assert store.query({"Paket": "Lifetime"}).empty
+
+
+def test_warm_start_reads_the_mirror_then_only_new_rows(make_services, user, tmp_path, monkeypatch):
+    mirror = str(tmp_path / "mirror.db")
+    sheet = MemoryRowStore()
+    sheet.set_header(SHEET_HEADERS)
+    sheet.append_rows(sheet_rows(user, ("0x1", "101", "2026-01-05"), ("0x2", "102", "2026-02-05")))
+    first = make_services(row_store=sheet, mirror=mirror)
+    assert len(first.get_all_users()) == 2
+    assert LocalStore(mirror).row_count() == 2
+
+    # A new process over the same sheet, which got one more row meanwhile
+    sheet.append_rows(sheet_rows(user, ("0x3", "103", "2026-03-05")))
+    restarted = MemoryRowStore()
+    restarted.values = sheet.values
+    reads = []
+    read_from = restarted.read_from
+
+    def recorded_read_from(start_row, width):
+        reads.append(start_row)
+        return read_from(start_row, width)
+
+    monkeypatch.setattr(restarted, "read_all", no_full_read)
+    monkeypatch.setattr(restarted, "read_from", recorded_read_from)
+    second = make_services(row_store=restarted, mirror=mirror)
+
+    assert second.get_all_users()["Transaction Hash"].astype(str).tolist() == ["0x1", "0x2", "0x3"]
+    assert reads == [4]
+    assert LocalStore(mirror).row_count() == 3
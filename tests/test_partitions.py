@@ -0,0 +1,172 @@
+import uuid
+
+import pytest
+
+from partitions import NO_EXPIRY, UNDATED, MemoryCatalog, PartitionedRowStore, SqliteCatalog, partition_for, prune
+from utils import SHEET_HEADERS
+
+
+def row(tx, start="2026-01-15", package="Monthly"):
+    record = {"Paket": package, "Tanggal Mulai": start, "Transaction Hash": tx, "Row ID": tx, "Revision": "1"}
+    return [record.get(h, "") for h in SHEET_HEADERS]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    catalog = MemoryCatalog() if request.param == "memory" else SqliteCatalog(str(tmp_path / "partitions"))
+    store = PartitionedRowStore(catalog, "month", key=f"test-{uuid.uuid4().hex}")
+    store.set_header(SHEET_HEADERS)
+    return store
+
+
+def tx_column(values):
+    col = values[0].index("Transaction Hash")
+    return [r[col] for r in values[1:]]
+
+
+@pytest.mark.parametrize("record, scheme, expected", [
+    ({"Paket": "Monthly", "Tanggal Mulai": "2026-03-31"}, "month", "2026-03"),
+    ({"Paket": "Quarterly", "Tanggal Mulai": "2026-03-31"}, "year", "2026"),
+    ({"Paket": "Lifetime", "Tanggal Mulai": "2026-03-31"}, "month", NO_EXPIRY),
+    ({"Paket": "Monthly", "Tanggal Mulai": "31/03/2026"}, "month", UNDATED),
+])
+def test_partition_for(record, scheme, expected):
+    assert partition_for(record, scheme) == expected
+
+
+def test_prune_skips_months_that_cannot_match():
+    names = ["2025-01", "2026-01", "2026-02", NO_EXPIRY, UNDATED]
+
+    assert prune(names, start_from="2026-02-01", start_to="2026-02-28") == ["2026-02", NO_EXPIRY]
+    # Quarterly subscriptions from January 2026 can still run on 2026-03-15; 2025 ones cannot
+    assert prune(names, active_on="2026-03-15") == ["2026-01", "2026-02", NO_EXPIRY, UNDATED]
+
+
+def test_appends_are_routed_and_read_back_in_partition_order(store):
+    store.append_rows([row("0xfeb", "2026-02-01"), row("0xjan", "2026-01-10"), row("0xlife", package="Lifetime")])
+
+    assert store.partition_names() == ["2026-01", "2026-02", NO_EXPIRY]
+    assert tx_column(store.read_all()) == ["0xjan", "0xfeb", "0xlife"]
+    header, rows = store.read_partitions(["2026-02"])
+    assert [r[header.index("Transaction Hash")] for r in rows] == ["0xfeb"]
+
+
+def test_read_from_returns_only_rows_appended_since(store):
+    store.append_rows([row("0x1", "2026-01-10"), row("0x2", "2026-02-10")])
+    values = store.read_all()
+    store.append_rows([row("0x3", "2026-02-11"), row("0x4", "2026-03-01")])
+
+    new_rows = store.read_from(len(values) + 1, len(SHEET_HEADERS))
+    assert [r[SHEET_HEADERS.index("Transaction Hash")] for r in new_rows] == ["0x3", "0x4"]
+
+
+def test_update_moves_a_row_to_its_new_partition(store):
+    store.append_rows([row("0x1", "2026-01-10"), row("0x2", "2026-01-20")])
+    store.read_all()
+
+    assert store.update_rows([(2, row("0x1", "2026-01-11"))]) == []
+    assert store.update_rows([(3, row("0x2", "2026-05-01"))]) == [3]
+    with pytest.raises(KeyError):
+        store.read_rows([3], len(SHEET_HEADERS))
+
+    assert store.select("2026-05-01", "2026-05-31") == ["2026-05"]
+    header, rows = store.read_partitions(["2026-01"])
+    assert [r[header.index("Transaction Hash")] for r in rows] == ["0x1"]
+    assert sorted(tx_column(store.read_all())) == ["0x1", "0x2"]
+
+
+def test_renewal_through_services_moves_the_row(make_services, user, proof_image):
+    from registration import submit_registration, submit_renewal
+
+    store = PartitionedRowStore(MemoryCatalog(), "month", key=f"test-{uuid.uuid4().hex}")
+    gs = make_services(row_store=store)
+    submit_registration(gs, user("0x1", start="2026-01-15"), proof_image(1))
+    submit_registration(gs, user("0x2", telegram_id="200", start="2026-01-20"), proof_image(2))
+
+    latest = gs.latest_registration("100")
+    renewed = submit_renewal(gs, latest, user("0x3", start="2026-05-01"), proof_image(3))
+    assert renewed["Revision"] == "2"
+
+    df = gs.get_all_users()
+    assert sorted(df["Transaction Hash"].astype(str)) == ["0x2", "0x3"]
+    assert store.select("2026-05-01", "2026-05-31") == ["2026-05"]
+    assert gs.is_duplicate_transaction("0x1")
+
+    # The moved row is found again for the next edit
+    edited = gs.update_registration(renewed["Row ID"], {"Nama User": "Renamed"}, renewed["Revision"])
+    assert edited["Revision"] == "3"
+    assert "Renamed" in set(gs.get_all_users()["Nama User"].astype(str))
+
+
+@pytest.fixture
+def partitioned(make_services, user, proof_image, monkeypatch):
+    """Services over a month-partitioned store with one old, two live and one Lifetime registration,
+    a warm cache, and the partitions every later read touches"""
+    from registration import submit_registration
+
+    store = PartitionedRowStore(MemoryCatalog(), "month", key=f"test-{uuid.uuid4().hex}")
+    gs = make_services(row_store=store)
+    registrations = [("2025-01-10", "Monthly"), ("2026-09-20", "Monthly"), ("2026-10-05", "Monthly"),
+                     ("2024-05-01", "Lifetime")]
+    for i, (start, package) in enumerate(registrations):
+        submit_registration(gs, user(f"0x{i}", telegram_id=str(100 + i), start=start, package=package),
+                            proof_image(i))
+    gs.flush_writes()
+    assert len(gs.get_all_users()) == 4
+
+    reads = []
+    read_partitions = store.read_partitions
+    monkeypatch.setattr(store, "read_partitions", lambda names: reads.append(list(names)) or read_partitions(names))
+    monkeypatch.setattr(store, "read_all", lambda: pytest.fail("pruned reads must not read every partition"))
+    return gs, reads
+
+
+def test_active_users_skip_expired_months_with_a_warm_cache(partitioned):
+    gs, reads = partitioned
+
+    active = gs.get_active_users(today="2026-10-17")
+
+    assert reads == [["2026-09", "2026-10", NO_EXPIRY]]
+    assert sorted(active["Transaction Hash"].astype(str)) == ["0x1", "0x2", "0x3"]
+    gs.get_active_users(today="2026-10-17")
+    assert len(reads) == 1
+
+
+def test_date_ranged_find_users_reads_only_matching_months(partitioned):
+    gs, reads = partitioned
+
+    found = gs.find_users(start_from="2026-10-01", start_to="2026-10-31")
+
+    assert reads == [["2026-10", NO_EXPIRY]]
+    assert list(found["Transaction Hash"].astype(str)) == ["0x2"]
+
+
+def test_notifier_reads_only_live_partitions(partitioned):
+    from expiry_notifier import EXPIRING, load_state, run
+
+    gs, reads = partitioned
+    sent = []
+    sink = type("Sink", (), {"emit": lambda self, notifications: sent.extend(notifications)})()
+
+    run(gs, load_state(""), sink, days=7, expired_lookback=7, today="2026-10-17")
+
+    assert reads == [["2026-09", "2026-10", NO_EXPIRY]]
+    assert [(n["event"], n["transaction_hash"]) for n in sent] == [(EXPIRING, "0x1")]
+
+
+def test_edit_in_place_reaches_the_mirror(make_services, user, proof_image, tmp_path):
+    from local_store import LocalStore
+    from registration import submit_registration
+
+    store = PartitionedRowStore(MemoryCatalog(), "month", key=f"test-{uuid.uuid4().hex}")
+    mirror = str(tmp_path / "mirror.db")
+    gs = make_services(row_store=store, mirror=mirror)
+    submit_registration(gs, user("0x1", start="2026-01-15", name="Bob"), proof_image(1))
+    registration = gs.latest_registration("100")
+
+    edited = gs.update_registration(registration["Row ID"], {"Nama User": "Zed"}, registration["Revision"])
+
+    assert store.select("2026-01-01", "2026-01-31") == ["2026-01"]
+    found = gs.find_users(filters={"Row ID": edited["Row ID"]})
+    assert list(found["Nama User"].astype(str)) == ["Zed"]
+    assert LocalStore(mirror).find_row("Row ID", edited["Row ID"])[1][SHEET_HEADERS.index("Nama User")] == "Zed"
@@ -0,0 +1,96 @@
+import pytest
+
+from local_store import LocalServices
+from proof_index import ProofIndex
+from registration import submit_registration, submit_renewal
+
+DETAILED = "0f0f0f0f0f0f0f0f"
+
+
+def test_remove_forgets_exact_and_similar_matches():
+    index = ProofIndex()
+    index.add("a" * 64, "0f0f0f0f0f0f0f0e", ref="0xfirst")
+    assert index.add("b" * 64, DETAILED, ref="0xsecond")
+    assert not index.add("b" * 64, DETAILED, ref="0xthird")
+    assert index.match("b" * 64, DETAILED) == "exact: 0xsecond"
+
+    index.remove("b" * 64)
+
+    assert index.stored("b" * 64) is None
+    assert index.match("c" * 64, DETAILED) == "similar (1 bits): 0xfirst"
+    index.remove("a" * 64)
+    assert index.match("c" * 64, DETAILED) == ""
+
+
+def fail(*args, **kwargs):
+    raise Exception("quota exceeded")
+
+
+def test_failed_append_leaves_no_proof_behind(make_services, user, proof_image, monkeypatch):
+    gs = make_services()
+    with monkeypatch.context() as patch:
+        patch.setattr(gs._writes, "put", fail)
+        with pytest.raises(Exception, match="quota exceeded"):
+            submit_registration(gs, user("0x1"), proof_image(1))
+    kept = dict(gs.blob_store.objects)
+
+    saved = submit_registration(gs, user("0x1"), proof_image(1))
+
+    assert saved["Proof Match"] == ""
+    assert gs.blob_store.objects == kept
+    assert gs.blob_store.name_from_url(saved["Bukti Transfer"]) in gs.blob_store.objects
+    assert submit_registration(gs, user("0x2", telegram_id="200"), proof_image(1))["Proof Match"] == "exact: 0x1"
+
+
+def test_failed_renewal_leaves_no_proof_behind(make_services, user, proof_image, monkeypatch):
+    gs = make_services()
+    submit_registration(gs, user("0x1"), proof_image(1))
+    gs.flush_writes()
+    registration = gs.latest_registration("100")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(gs.rows, "update_rows", fail)
+        with pytest.raises(Exception, match="quota exceeded"):
+            submit_renewal(gs, registration, user("0x2"), proof_image(2))
+
+    renewed = submit_renewal(gs, registration, user("0x2"), proof_image(2))
+    assert renewed["Proof Match"] == ""
+    assert gs.blob_store.name_from_url(renewed["Bukti Transfer"]) in gs.blob_store.objects
+
+
+def test_local_failed_append_leaves_no_proof_behind(tmp_path, user, proof_image, monkeypatch):
+    gs = LocalServices(str(tmp_path / "registrations.db"), str(tmp_path / "images"))
+    with monkeypatch.context() as patch:
+        patch.setattr(gs.store, "append_rows", fail)
+        with pytest.raises(Exception, match="quota exceeded"):
+            submit_registration(gs, user("0x1"), proof_image(1))
+
+    saved = submit_registration(gs, user("0x1"), proof_image(1))
+    assert saved["Proof Match"] == ""
+
+
+def test_written_image_is_not_deleted_by_a_later_failed_submit(make_services, user, proof_image, monkeypatch):
+    gs = make_services()
+    saved = submit_registration(gs, user("0x1"), proof_image(1))
+    gs.flush_writes()
+    assert len(gs._proofs) == len(gs._thumbnails) == 0
+
+    with monkeypatch.context() as patch:
+        patch.setattr(gs._writes, "put", fail)
+        with pytest.raises(Exception, match="quota exceeded"):
+            submit_registration(gs, user("0x2", telegram_id="200"), proof_image(1))
+
+    assert gs.blob_store.name_from_url(saved["Bukti Transfer"]) in gs.blob_store.objects
+
+
+def test_rollback_keeps_an_image_another_submit_reused(make_services, user, proof_image):
+    gs = make_services()
+    first = gs.upload_image_to_gcs(proof_image(1), "Alice")
+    second = gs.upload_image_to_gcs(proof_image(1), "Bob")
+    assert first == second
+
+    gs.delete_image(first)
+
+    assert gs.blob_store.name_from_url(second) in gs.blob_store.objects
+    assert gs.proof_fields_for(second)["Proof Hash"]
+    assert gs.thumbnail_url_for(second)
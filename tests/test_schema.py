@@ -0,0 +1,50 @@
+import pandas as pd
+
+from registration import build_user_data
+from schema import DERIVED_COLUMNS, users_frame, with_links
+from utils import SHEET_HEADERS
+
+
+def sheet_rows(*users):
+    return [[str(user.get(h, "")) for h in SHEET_HEADERS] for user in users]
+
+
+def registration(name, telegram_id, network, tx, start="2026-01-15"):
+    return build_user_data(name, telegram_id, "Monthly", 25, pd.Timestamp(start), network, tx)
+
+
+def test_users_frame_types_columns():
+    rows = sheet_rows(registration("Alice", "7058728559", "Polygon", "0x1"),
+                      registration("Bob", "", "Arbitrum", "0x2"))
+    rows[1][SHEET_HEADERS.index("Tanggal Mulai")] = "31/01/2026"
+    rows[1][SHEET_HEADERS.index("Revision")] = ""
+    rows[1][SHEET_HEADERS.index("Harga (USDT)")] = "1,250.5"
+
+    df = users_frame(SHEET_HEADERS, rows)
+
+    assert pd.api.types.is_datetime64_any_dtype(df["Tanggal Mulai"])
+    assert df["Tanggal Mulai"].iloc[0] == pd.Timestamp("2026-01-15") and pd.isna(df["Tanggal Mulai"].iloc[1])
+    assert pd.api.types.is_datetime64_any_dtype(df["Timestamp"])
+    assert isinstance(df["Paket"].dtype, pd.CategoricalDtype)
+    assert isinstance(df["Blockchain Network"].dtype, pd.CategoricalDtype)
+    assert str(df["Telegram User ID"].dtype) == "Int64"
+    assert df["Telegram User ID"].iloc[0] == 7058728559 and pd.isna(df["Telegram User ID"].iloc[1])
+    assert df["Harga (USDT)"].tolist() == [25.0, 1250.5]
+    assert df["Revision"].tolist() == [1, 0]
+    assert not set(DERIVED_COLUMNS) & set(df.columns)
+
+
+def test_non_numeric_telegram_ids_stay_text():
+    df = users_frame(SHEET_HEADERS, sheet_rows(registration("Alice", "7058728559", "Polygon", "0x1"),
+                                               registration("Bob", "@bob", "Polygon", "0x2")))
+
+    assert df["Telegram User ID"].tolist() == ["7058728559", "@bob"]
+
+
+def test_with_links_rebuilds_the_sheet_columns():
+    users = [registration("Alice", "7058728559", "Polygon", "0x1"), registration("Bob", "", "Arbitrum", "0x2")]
+    df = with_links(users_frame(SHEET_HEADERS, sheet_rows(*users)))
+
+    assert list(df.columns) == SHEET_HEADERS
+    assert df["Telegram Link"].tolist() == [users[0]["Telegram Link"], ""]
+    assert df["Explorer Link"].tolist() == [u["Explorer Link"] for u in users]
@@ -0,0 +1,53 @@
+import pandas as pd
+
+from search_index import SearchIndex
+
+USERS = pd.DataFrame({
+    "Nama User": ["Alice Johnson", "Bob-Marley", "José Carol"],
+    "Telegram User ID": ["7058728559", "123456", "7099"],
+    "Transaction Hash": ["0xAbC123", "0xdef456", "0xabd789"],
+})
+
+
+def search(query, fuzzy=True, df=USERS):
+    return SearchIndex().build(df).search(query, fuzzy=fuzzy).tolist()
+
+
+def test_prefix_and_substring_matches():
+    assert search("ali") == [0]
+    assert search("johns") == [0]
+    assert search("lic") == [0]
+    assert search("arle") == [1]
+    assert search("jose") == [2]
+
+
+def test_one_typo_matches_only_when_fuzzy():
+    assert search("alcie") == [0]
+    assert search("alixe") == [0]
+    assert search("alixe", fuzzy=False) == []
+    assert search("alx") == []
+
+
+def test_telegram_id_and_transaction_hash_match_by_prefix():
+    assert search("7058") == [0]
+    assert search("70") == [0, 2]
+    assert search("0XABC") == [0]
+    assert search("0xab") == [0, 2]
+    assert search("456") == []
+
+
+def test_every_query_token_must_match():
+    assert search("alice 7058") == [0]
+    assert search("alice 1234") == []
+    # Punctuation only separates tokens; a query without letters or digits matches nothing
+    assert search("bob-marley") == [1]
+    assert search("-") == []
+    assert search(" @ ") == []
+
+
+def test_appended_rows_are_found_without_a_rebuild():
+    index = SearchIndex().build(USERS.iloc[:2])
+    index.add_rows(USERS, start=2)
+
+    assert index.search("carol").tolist() == [2]
+    assert index.search("7").tolist() == [0, 2]
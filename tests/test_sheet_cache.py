@@ -0,0 +1,39 @@
+from utils import SHEET_HEADERS
+
+
+def test_incremental_read_keeps_blank_rows_in_place(make_services, user):
+    gs = make_services()
+    first, second = ([str(user(tx).get(h, "")) for h in SHEET_HEADERS] for tx in ("0x1", "0x2"))
+    blank = [""] * len(SHEET_HEADERS)
+    gs.rows.set_header(SHEET_HEADERS)
+    gs.rows.append_rows([first])
+    gs.get_all_users()
+
+    # Cleared by hand in the sheet between two refreshes, followed by a new registration
+    gs.rows.append_rows([blank, second, blank])
+    gs.invalidate_cache()
+    gs.get_all_users()
+    gs.invalidate_cache()
+    incremental = gs.get_all_users()
+
+    # Same rows at the same positions as a full read
+    assert gs._cache.rows == [first, blank, second]
+    assert gs._cache.row_ids[second[SHEET_HEADERS.index("Row ID")]] == 2
+    gs.invalidate_cache(full=True)
+    assert gs.get_all_users()["Transaction Hash"].tolist() == incremental["Transaction Hash"].tolist()
+
+
+def test_reservations_end_once_rows_are_indexed(make_services, user, proof_image):
+    from registration import submit_registration
+
+    gs = make_services()
+    for i in range(3):
+        submit_registration(gs, user(f"0x{i}", telegram_id=str(100 + i)), proof_image(i))
+    assert gs._cache.reserved_tx == {"0x0", "0x1", "0x2"}
+    assert gs.reserve_transaction("0x9")
+
+    gs.flush_writes()
+    gs.get_all_users()
+
+    assert gs._cache.reserved_tx == {"0x9"}
+    assert gs.is_duplicate_transaction("0x1") and not gs.reserve_transaction("0x1")
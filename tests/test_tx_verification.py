@@ -0,0 +1,109 @@
+import os
+import time
+
+import pytest
+
+from tx_verification import (ERROR, MISMATCH, NOT_FOUND, PENDING, REVERTED, USDT_CONTRACTS, VERIFIED, StubNode,
+                             TxVerifier)
+
+RECIPIENT = "0x" + "ab" * 20
+BSC_USDT = USDT_CONTRACTS["BSC (BEP20)"][1]
+
+
+def tx(i):
+    return f"0x{i:064x}"
+
+
+@pytest.fixture
+def node():
+    node = StubNode()
+    yield node
+    node.close()
+
+
+def make_verifier(tmp_path, node, **settings):
+    section = {"recipient": RECIPIENT, "rpc": {"bsc": node.url}, "cache_path": str(tmp_path / "cache.db"),
+               "requests_per_second": 1000}
+    section.update(settings)
+    return TxVerifier({"verification": section})
+
+
+def test_statuses(tmp_path, node):
+    node.add_transfer(tx(1), BSC_USDT, RECIPIENT, 25 * 10**18)
+    node.add_transfer(tx(2), BSC_USDT, RECIPIENT, 20 * 10**18)
+    node.add_transfer(tx(3), BSC_USDT, "0x" + "cd" * 20, 25 * 10**18)
+    node.add_transfer(tx(4), BSC_USDT, RECIPIENT, 25 * 10**18, success=False)
+    node.add_transfer(tx(5), BSC_USDT, RECIPIENT, 25 * 10**18, confirmations=3)
+    node.add_pending(tx(6))
+    items = [("BSC (BEP20)", tx(i), 25) for i in range(1, 8)] + [("Solana", tx(1), 25)]
+
+    results = make_verifier(tmp_path, node).verify_many(items)
+
+    assert [r["status"] for r in results] == [VERIFIED, MISMATCH, MISMATCH, REVERTED, PENDING, PENDING,
+                                              NOT_FOUND, ERROR]
+    assert results[1]["detail"] == "Kurang bayar: 20 USDT"
+    assert results[4]["detail"] == "3/12 konfirmasi"
+
+
+def test_networks_without_endpoint_are_errors(tmp_path, node):
+    result = make_verifier(tmp_path, node).verify("Polygon", tx(1), 25)
+
+    assert result["status"] == ERROR
+    assert "polygon" in result["detail"]
+
+
+def test_confirmed_transactions_are_not_looked_up_again(tmp_path, node):
+    node.add_transfer(tx(1), BSC_USDT, RECIPIENT, 25 * 10**18)
+    node.add_pending(tx(2))
+    items = [("BSC (BEP20)", tx(1), 25), ("BSC (BEP20)", tx(2), 25)]
+    make_verifier(tmp_path, node).verify_many(items)
+    receipts = node.calls["eth_getTransactionReceipt"]
+
+    # A new process: the receipt comes from the cache, only the pending one goes out again
+    verifier = make_verifier(tmp_path, node)
+    assert [r["status"] for r in verifier.cached_results(items)] == [VERIFIED, "unchecked"]
+    assert [r["status"] for r in verifier.verify_many(items)] == [VERIFIED, PENDING]
+    assert node.calls["eth_getTransactionReceipt"] == receipts + 1
+
+    # Cached facts are judged again against the current settings
+    other = make_verifier(tmp_path, node, recipient="0x" + "cd" * 20)
+    assert other.cached_results(items[:1])[0]["status"] == MISMATCH
+
+
+def test_requests_stay_within_the_network_rate_limit(tmp_path, node):
+    for i in range(1, 5):
+        node.add_transfer(tx(i), BSC_USDT, RECIPIENT, 25 * 10**18)
+    verifier = make_verifier(tmp_path, node, rate_limits={"bsc": 10})
+
+    start = time.monotonic()
+    results = verifier.verify_many([("BSC (BEP20)", tx(i), 25) for i in range(1, 5)])
+
+    # 4 receipts and one shared block number, spaced 0.1 s apart
+    assert sum(node.calls.values()) == 5
+    assert time.monotonic() - start >= 0.4
+    assert {r["status"] for r in results} == {VERIFIED}
+
+
+def test_throttled_requests_are_retried(tmp_path):
+    node = StubNode(max_requests_per_second=2)
+    try:
+        node.add_transfer(tx(1), BSC_USDT, RECIPIENT, 25 * 10**18)
+        node.add_transfer(tx(2), BSC_USDT, RECIPIENT, 25 * 10**18)
+        verifier = make_verifier(tmp_path, node, workers=1)
+
+        results = verifier.verify_many([("BSC (BEP20)", tx(1), 25), ("BSC (BEP20)", tx(2), 25)])
+    finally:
+        node.close()
+
+    assert node.throttled >= 1
+    assert [r["status"] for r in results] == [VERIFIED, VERIFIED]
+
+
+def test_cache_file_is_only_created_when_used(tmp_path, node):
+    path = tmp_path / "cache.db"
+    verifier = TxVerifier({"verification": {"cache_path": str(path)}})
+    assert not verifier.enabled
+    assert not os.path.exists(path)
+
+    make_verifier(tmp_path, node).cached_results([("BSC (BEP20)", tx(1), 25)])
+    assert os.path.exists(path)
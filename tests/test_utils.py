@@ -0,0 +1,47 @@
+import datetime
+
+import pandas as pd
+
+from utils import RecentItems, calculate_expiry_date, compute_expiry, get_days_remaining, get_status_color
+
+TODAY = datetime.datetime(2026, 3, 10, 14, 30)
+
+
+def test_recent_items_drops_the_least_recently_set():
+    items = RecentItems(limit=2)
+    items["a"], items["b"] = 1, 2
+    items["a"] = 3
+    items["c"] = 4
+
+    assert "b" not in items
+    assert (items.get("a"), items.get("c"), len(items)) == (3, 4, 2)
+    assert items.pop("a") == 3 and items.pop("a") is None
+
+
+class FrozenDatetime(datetime.datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return TODAY
+
+
+def test_compute_expiry_matches_the_per_row_functions(monkeypatch):
+    rows = [
+        ("2026-03-01", "Monthly"), ("2026-02-08", "Monthly"), ("2026-02-09", "Monthly"),
+        ("2026-02-17", "Monthly"), ("2026-02-16", "Monthly"), ("2025-12-10", "Quarterly"),
+        ("2024-01-01", "Lifetime"), ("2026-03-01", "Weekly"), ("not a date", "Monthly"), ("", "Quarterly"),
+    ]
+    df = pd.DataFrame(rows, columns=["Tanggal Mulai", "Paket"])
+
+    with monkeypatch.context() as patch:
+        patch.setattr(datetime, "datetime", FrozenDatetime)
+        expected = []
+        for start, package in rows:
+            expiry = calculate_expiry_date(start, package)
+            days = get_days_remaining(expiry)
+            expected.append((expiry, days, get_status_color(days)))
+
+    result = compute_expiry(df, today=TODAY)
+
+    assert [None if pd.isna(d) else d.to_pydatetime() for d in result["Expiry Date"]] == [e for e, _, _ in expected]
+    assert [None if pd.isna(d) else d for d in result["Days Remaining"]] == [d for _, d, _ in expected]
+    assert result["Status"].tolist() == [s for _, _, s in expected]
@@ -0,0 +1,40 @@
+from argparse import Namespace
+
+import pytest
+
+from verify_setup import FAIL, OK, verify_setup
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_report_probes_the_local_backends(backend, tmp_path, user, monkeypatch):
+    import google_services
+    from utils import SHEET_HEADERS
+
+    # Stores are shared per process by backend; start this one empty
+    monkeypatch.setattr(google_services, "_stores", {})
+    storage = {"backend": backend, "path": str(tmp_path / "registrations.db"), "image_dir": str(tmp_path / "images"),
+               "seed": 1}
+    config = {"storage": storage}
+    rows, _ = google_services.make_stores(config)
+    rows.set_header(SHEET_HEADERS)
+    rows.append_rows([[str(user(f"0x{i}").get(h, "")) for h in SHEET_HEADERS] for i in range(3)])
+    reads = []
+    read_all = rows.read_all
+
+    def recorded_read_all():
+        values = read_all()
+        reads.append(len(values))
+        return values
+
+    monkeypatch.setattr(rows, "read_all", recorded_read_all)
+
+    report = verify_setup(config, Namespace(repeat=4, concurrency=2, payload_kb=1, skip_probes=False))
+
+    checks = {check["name"]: check for check in report["checks"]}
+    assert report["status"] != FAIL
+    assert report["meta"]["backend"] == backend
+    probed = ("config", "sheet", "probe_sheet_read", "probe_sheet_append", "probe_blob")
+    assert {name: checks[name]["status"] for name in probed} == dict.fromkeys(probed, OK)
+    assert reads == [4] * 4
+    assert {op: report["latency"][op]["count"] for op in report["latency"]} == dict.fromkeys(
+        ("sheet_read", "sheet_append", "blob_upload", "blob_download"), 4)
@@ -0,0 +1,97 @@
+import json
+import os
+
+from google_services import _WriteBehindQueue
+
+NAME = "pending_rows_sheet"
+
+
+def make_queue(spool_dir, written=None):
+    queue = _WriteBehindQueue(str(spool_dir), NAME, batch_size=1000, flush_interval=3600)
+    if written is not None:
+        queue.flush_fn = written.extend
+    return queue
+
+
+def crash(queue):
+    """Stop owning the spool without flushing, like a killed process"""
+    queue._owner.close()
+
+
+def spool_rows(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_rows_of_a_stopped_process_are_replayed_once(tmp_path):
+    crashed = make_queue(tmp_path)
+    crashed.put_many([["a"], ["b"]])
+    crash(crashed)
+
+    written = []
+    queue = make_queue(tmp_path, written)
+    assert queue.snapshot() == [["a"], ["b"]]
+    assert not os.path.exists(crashed.spool_path)
+    assert spool_rows(queue.spool_path) == [["a"], ["b"]]
+
+    assert queue.flush() == 2
+    assert written == [["a"], ["b"]]
+    assert spool_rows(queue.spool_path) == []
+
+    # Nothing is left for the next process
+    assert make_queue(tmp_path).snapshot() == []
+
+
+def test_running_processes_keep_their_own_rows(tmp_path):
+    first_written, second_written = [], []
+    first = make_queue(tmp_path, first_written)
+    first.put(["first"])
+    second = make_queue(tmp_path, second_written)
+    second.put(["second"])
+
+    assert second.snapshot() == [["second"]]
+    assert first.spool_path != second.spool_path
+
+    # Flushing one process rewrites only its own spool
+    second.flush()
+    assert second_written == [["second"]]
+    assert spool_rows(first.spool_path) == [["first"]]
+    assert first.snapshot() == [["first"]]
+
+
+def test_spool_of_earlier_versions_is_replayed(tmp_path):
+    with open(tmp_path / f"{NAME}.jsonl", "w", encoding="utf-8") as f:
+        f.write(json.dumps(["legacy"]) + "\n")
+
+    queue = make_queue(tmp_path)
+    assert queue.snapshot() == [["legacy"]]
+    assert not os.path.exists(tmp_path / f"{NAME}.jsonl")
+
+
+def test_spool_removed_at_exit_when_flushed(tmp_path):
+    written = []
+    queue = make_queue(tmp_path, written)
+    queue.put(["row"])
+    queue._flush_at_exit()
+
+    assert written == [["row"]]
+    assert not os.path.exists(queue.spool_path)
+
+
+def test_store_keys_make_distinct_flat_spool_names(tmp_path):
+    from backends import SqliteRowStore
+    from google_services import _spool_name
+
+    first = SqliteRowStore(str(tmp_path / "a" / "rows.db"))
+    second = SqliteRowStore(str(tmp_path / "b" / "rows.db"))
+    assert first.key != second.key
+
+    names = {_spool_name(key) for key in (first.key, second.key, "sheet/_healthcheck", "sheet__healthcheck")}
+    assert len(names) == 4
+    assert all("/" not in name and "." not in name for name in names)
+    assert _spool_name("1AbC-d_9") == "pending_rows_1AbC-d_9"
+
+    titled = _WriteBehindQueue(str(tmp_path), _spool_name("sheet/Sheet 2"), batch_size=1000, flush_interval=3600)
+    titled.put(["row"])
+    assert spool_rows(titled.spool_path) == [["row"]]
+    assert os.path.dirname(titled.spool_path) == str(tmp_path)
@@ -0,0 +1,452 @@
+"""
+On-chain payment verification.
+
+The USDT transfer behind a registration's Transaction Hash is looked up over
+JSON-RPC on its Blockchain Network: the receipt must be successful, have
+enough confirmations and contain USDT Transfer events to the configured
+recipient worth at least Harga (USDT). Lookups run concurrently, with a
+request rate limit per network.
+
+A confirmed transaction never changes, so the facts read from its receipt
+(success, block, transfers) are cached permanently in SQLite and each hash is
+fetched only once. The verdict is worked out from those facts on every check,
+so fixing the recipient or a price needs no new lookup. Pending, unknown and
+failed lookups are not cached and are retried on the next run.
+"""
+
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from backends import Latency
+from metrics import timed
+from utils import normalize_key
+
+logger = logging.getLogger(__name__)
+
+# Blockchain Network -> (key in [verification.rpc], USDT contract, token decimals)
+USDT_CONTRACTS = {
+    "BSC (BEP20)": ("bsc", "0x55d398326f99059ff775485246999027b3197955", 18),
+    "Ethereum (ERC20)": ("ethereum", "0xdac17f958d2ee523a2206206994597c13d831ec7", 6),
+    "Polygon": ("polygon", "0xc2132d05d31c914a87c6611c10748aeb04b58e8f", 6),
+    "Arbitrum": ("arbitrum", "0xfd086bc7cd5c481dcc9c85ebe478a1c0b69fcbb9", 6),
+    "Optimism": ("optimism", "0x94b008aa00579c1307b0ef2c499ad98a8ce58e58", 6),
+}
+
+# keccak256("Transfer(address,address,uint256)")
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+VERIFIED = "verified"
+PENDING = "pending"
+NOT_FOUND = "not_found"
+REVERTED = "reverted"
+MISMATCH = "mismatch"
+ERROR = "error"
+UNCHECKED = "unchecked"
+
+# Statuses that will not change by looking again
+FINAL_STATUSES = (VERIFIED, REVERTED, MISMATCH)
+
+STATUS_LABELS = {
+    VERIFIED: "✅ Verified",
+    PENDING: "⏳ Pending",
+    NOT_FOUND: "❔ Not found",
+    REVERTED: "❌ Reverted",
+    MISMATCH: "❌ Mismatch",
+    ERROR: "⚠️ Error",
+    UNCHECKED: "—",
+}
+
+DEFAULT_REQUESTS_PER_SECOND = 5
+DEFAULT_MIN_CONFIRMATIONS = 12
+DEFAULT_WORKERS = 16
+
+# Seconds a network's latest block number is reused for confirmation counts
+BLOCK_NUMBER_TTL = 5
+
+# HTTP statuses worth another attempt, with the delay before the first retry
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_ATTEMPTS = 3
+RETRY_DELAY = 0.5
+
+
+class RpcError(Exception):
+    """JSON-RPC endpoint returned an error or an unusable response"""
+
+
+class RateLimiter:
+    """Spaces calls at most ``rate`` per second across all threads sharing it"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_at = 0.0
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.next_at = max(self.next_at, now)
+            wait = self.next_at - now
+            self.next_at += self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class JsonRpcClient:
+    """Minimal JSON-RPC 2.0 client over HTTP POST"""
+
+    def __init__(self, url, limiter, timeout=10):
+        self.url = url
+        self.limiter = limiter
+        self.timeout = timeout
+        self.ids = itertools.count(1)
+
+    def call(self, method, params):
+        body = json.dumps({"jsonrpc": "2.0", "id": next(self.ids), "method": method, "params": params}).encode()
+        for attempt in range(RETRY_ATTEMPTS):
+            self.limiter.acquire()
+            request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+            try:
+                with timed(f"rpc.{method}"):
+                    with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                        reply = json.loads(response.read())
+                break
+            except urllib.error.HTTPError as e:
+                if e.code not in RETRY_STATUSES or attempt == RETRY_ATTEMPTS - 1:
+                    raise RpcError(f"HTTP {e.code} from {method}")
+                time.sleep(RETRY_DELAY * 2 ** attempt)
+        if reply.get("error"):
+            raise RpcError(str(reply["error"].get("message", reply["error"])))
+        return reply.get("result")
+
+
+class VerificationCache:
+    """Permanent SQLite cache of receipt facts for confirmed transactions"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS receipts (network TEXT, tx_hash TEXT, facts TEXT, checked_at TEXT, "
+            "PRIMARY KEY (network, tx_hash))"
+        )
+        self.conn.commit()
+
+    def get_many(self, keys):
+        """{(network, tx_hash): facts} for the cached ones among (network, normalized tx_hash) keys"""
+        found = {}
+        keys = list(keys)
+        with self.lock:
+            # Bounded IN lists keep the statement under SQLite's variable limit
+            for start in range(0, len(keys), 400):
+                chunk = [normalize_key(tx) for _, tx in keys[start:start + 400]]
+                placeholders = ", ".join("?" * len(chunk))
+                cursor = self.conn.execute(
+                    f"SELECT network, tx_hash, facts FROM receipts WHERE tx_hash IN ({placeholders})", chunk
+                )
+                for network, tx_hash, facts in cursor:
+                    found[(network, tx_hash)] = json.loads(facts)
+        return {key: found[key] for key in keys if key in found}
+
+    def put(self, network, tx_hash, facts):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO receipts VALUES (?, ?, ?, ?)",
+                (network, normalize_key(tx_hash), json.dumps(facts), datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            )
+            self.conn.commit()
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM receipts").fetchone()[0]
+
+
+def receipt_facts(receipt):
+    """What verification needs from a transaction receipt, JSON-serializable"""
+    transfers = []
+    for log in receipt.get("logs") or []:
+        topics = log.get("topics") or []
+        if len(topics) == 3 and topics[0].lower() == TRANSFER_TOPIC:
+            transfers.append([log.get("address", "").lower(), "0x" + topics[2][-40:].lower(),
+                              str(int(log.get("data") or "0x0", 16))])
+    return {
+        "success": receipt.get("status") == "0x1",
+        "block": int(receipt["blockNumber"], 16),
+        "transfers": transfers,
+    }
+
+
+def evaluate(facts, network, price, recipient):
+    """(status, detail) of a confirmed transaction against the expected payment"""
+    _, contract, decimals = USDT_CONTRACTS[network]
+    if not facts["success"]:
+        return REVERTED, "Transaksi gagal (reverted)"
+
+    usdt = [t for t in facts["transfers"] if t[0] == contract]
+    if not usdt:
+        return MISMATCH, "Tidak ada transfer USDT"
+    received = sum(int(amount) for _, to, amount in usdt if to == recipient)
+    if not received:
+        return MISMATCH, "USDT tidak dikirim ke wallet penerima"
+
+    try:
+        expected = int(Decimal(str(price)) * 10 ** decimals)
+    except (InvalidOperation, ValueError):
+        return MISMATCH, f"Harga tidak valid: {price}"
+    paid = Decimal(received) / 10 ** decimals
+    if received < expected:
+        return MISMATCH, f"Kurang bayar: {paid:f} USDT"
+    return VERIFIED, f"{paid:f} USDT di blok {facts['block']}"
+
+
+class TxVerifier:
+    """Verifies registrations' transactions with the settings in ``[verification]``"""
+
+    def __init__(self, config=None):
+        section = (config or {}).get("verification") or {}
+        self.recipient = normalize_key(section.get("recipient", ""))
+        self.recipients = {k: normalize_key(v) for k, v in (section.get("recipients") or {}).items()}
+        self.rpc_urls = dict(section.get("rpc") or {})
+        self.rate_limits = dict(section.get("rate_limits") or {})
+        self.default_rate = float(section.get("requests_per_second", DEFAULT_REQUESTS_PER_SECOND))
+        self.min_confirmations = int(section.get("min_confirmations", DEFAULT_MIN_CONFIRMATIONS))
+        self.workers = int(section.get("workers", DEFAULT_WORKERS))
+        self.timeout = float(section.get("timeout_seconds", 10))
+        self.cache_path = section.get("cache_path", "data/tx_verifications.db")
+
+        self.lock = threading.Lock()
+        self._cache = None
+        self._clients = {}
+        self._heads = {}
+        self._head_locks = {}
+
+    @property
+    def enabled(self):
+        """True once a recipient and at least one RPC endpoint are configured"""
+        return bool(self.rpc_urls) and bool(self.recipient or self.recipients)
+
+    @property
+    def cache(self):
+        """Receipt cache, opened on first use so an unconfigured app creates no file"""
+        with self.lock:
+            if self._cache is None:
+                self._cache = VerificationCache(self.cache_path)
+            return self._cache
+
+    def _recipient(self, key):
+        return self.recipients.get(key, self.recipient)
+
+    def _client(self, key):
+        with self.lock:
+            if key not in self._clients:
+                if not self.rpc_urls.get(key):
+                    raise RpcError(f"Tidak ada RPC endpoint untuk '{key}'")
+                limiter = RateLimiter(float(self.rate_limits.get(key, self.default_rate)))
+                self._clients[key] = JsonRpcClient(self.rpc_urls[key], limiter, self.timeout)
+            return self._clients[key]
+
+    def _head(self, key, client):
+        """Latest block number, shared by lookups on the same network for a few seconds"""
+        with self.lock:
+            head_lock = self._head_locks.setdefault(key, threading.Lock())
+        # One fetch per network at a time; concurrent lookups wait and reuse it
+        with head_lock:
+            cached = self._heads.get(key)
+            if cached and time.monotonic() - cached[1] < BLOCK_NUMBER_TTL:
+                return cached[0]
+            head = int(client.call("eth_blockNumber", []), 16)
+            self._heads[key] = (head, time.monotonic())
+            return head
+
+    def _lookup(self, network, tx_hash):
+        """Receipt facts for a confirmed transaction (cached), or (status, detail) while it is not"""
+        key = USDT_CONTRACTS[network][0]
+        client = self._client(key)
+        receipt = client.call("eth_getTransactionReceipt", [tx_hash])
+        if receipt is None:
+            if client.call("eth_getTransactionByHash", [tx_hash]) is None:
+                return NOT_FOUND, "Transaksi tidak ditemukan di jaringan ini"
+            return PENDING, "Belum masuk blok"
+
+        facts = receipt_facts(receipt)
+        confirmations = self._head(key, client) - facts["block"] + 1
+        if confirmations < self.min_confirmations:
+            return PENDING, f"{max(confirmations, 0)}/{self.min_confirmations} konfirmasi"
+        self.cache.put(network, tx_hash, facts)
+        return facts
+
+    def _result(self, network, tx_hash, price, facts):
+        if isinstance(facts, tuple):
+            status, detail = facts
+        else:
+            status, detail = evaluate(facts, network, price, self._recipient(USDT_CONTRACTS[network][0]))
+        return {"status": status, "label": STATUS_LABELS[status], "detail": detail}
+
+    def cached_results(self, items):
+        """Results from the cache only, without network calls; UNCHECKED where nothing is cached.
+
+        ``items`` are (Blockchain Network, Transaction Hash, Harga (USDT)) tuples.
+        """
+        items = list(items)
+        cached = self.cache.get_many((network, normalize_key(tx)) for network, tx, _ in items if network in USDT_CONTRACTS)
+        results = []
+        for network, tx_hash, price in items:
+            facts = cached.get((network, normalize_key(tx_hash)))
+            if facts is None:
+                results.append({"status": UNCHECKED, "label": STATUS_LABELS[UNCHECKED], "detail": ""})
+            else:
+                results.append(self._result(network, tx_hash, price, facts))
+        return results
+
+    def verify_many(self, items, progress=None):
+        """Verify (network, tx hash, price) items concurrently; returns one result dict per item.
+
+        Cached transactions are answered from the cache; every other distinct
+        hash is looked up once, at most ``workers`` at a time and within each
+        network's rate limit. ``progress(done, total)`` is called per lookup.
+        """
+        items = list(items)
+        results = self.cached_results(items)
+
+        todo = {}
+        for i, (network, tx_hash, _) in enumerate(items):
+            if results[i]["status"] != UNCHECKED:
+                continue
+            if network not in USDT_CONTRACTS:
+                results[i] = {"status": ERROR, "label": STATUS_LABELS[ERROR], "detail": f"Network tidak dikenal: {network}"}
+                continue
+            todo.setdefault((network, str(tx_hash).strip()), []).append(i)
+
+        def lookup(key):
+            try:
+                return self._lookup(*key)
+            except Exception as e:
+                logger.warning("Verification of %s on %s failed: %s", key[1], key[0], e)
+                return ERROR, str(e)
+
+        if todo:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tx-verify") as pool:
+                for done, (key, facts) in enumerate(zip(todo, pool.map(lookup, todo)), start=1):
+                    for i in todo[key]:
+                        results[i] = self._result(key[0], key[1], items[i][2], facts)
+                    if progress:
+                        progress(done, len(todo))
+        return results
+
+    def verify(self, network, tx_hash, price):
+        """Result dict for one transaction"""
+        return self.verify_many([(network, tx_hash, price)])[0]
+
+
+class StubNode:
+    """Local JSON-RPC stand-in for an EVM node, for tests and benchmarks.
+
+    Serves eth_blockNumber, eth_getTransactionReceipt and
+    eth_getTransactionByHash for transactions registered with add_transfer /
+    add_pending, with injectable latency and an optional rate limit that
+    answers HTTP 429 like public endpoints do.
+    """
+
+    def __init__(self, latency=None, max_requests_per_second=None, block=1_000_000):
+        self.latency = latency or Latency()
+        self.max_rate = max_requests_per_second
+        self.block = block
+        self.lock = threading.Lock()
+        self.receipts = {}
+        self.pending = set()
+        self.calls = {}
+        self.throttled = 0
+        self._window = []
+
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if not node._admit():
+                    self.send_response(429)
+                    self.end_headers()
+                    return
+                node.latency.pause()
+                body = json.dumps(node.handle(request)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True, name="stub-node").start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _admit(self):
+        """False if the request exceeds the per-second limit"""
+        if not self.max_rate:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self._window = [t for t in self._window if now - t < 1.0]
+            if len(self._window) >= self.max_rate:
+                self.throttled += 1
+                return False
+            self._window.append(now)
+            return True
+
+    def add_transfer(self, tx_hash, token, to, amount, confirmations=20, success=True):
+        """A mined transaction with one ERC-20 Transfer of ``amount`` base units"""
+        with self.lock:
+            self.receipts[normalize_key(tx_hash)] = {
+                "transactionHash": tx_hash,
+                "status": "0x1" if success else "0x0",
+                "blockNumber": hex(self.block - confirmations + 1),
+                "logs": [{
+                    "address": token,
+                    "topics": [TRANSFER_TOPIC, "0x" + "0" * 64, "0x" + "0" * 24 + to[2:].lower()],
+                    "data": hex(amount),
+                }],
+            }
+
+    def add_pending(self, tx_hash):
+        """A transaction known to the node but not mined yet"""
+        with self.lock:
+            self.pending.add(normalize_key(tx_hash))
+
+    def handle(self, request):
+        method, params = request.get("method"), request.get("params") or []
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            if method == "eth_blockNumber":
+                result = hex(self.block)
+            elif method == "eth_getTransactionReceipt":
+                result = self.receipts.get(normalize_key(params[0]))
+            elif method == "eth_getTransactionByHash":
+                key = normalize_key(params[0])
+                result = {"hash": params[0]} if key in self.receipts or key in self.pending else None
+            else:
+                return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32601, "message": "Method not found"}}
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
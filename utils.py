@@ -1,3 +1,79 @@
+# Column order of the registration sheet
+SHEET_HEADERS = [
+    "Timestamp",
+    "Nama User",
+    "Telegram User ID",
+    "Telegram Link",
+    "Paket",
+    "Harga (USDT)",
+    "Tanggal Mulai",
+    "Blockchain Network",
+    "Transaction Hash",
+    "Explorer Link",
+    "Bukti Transfer",
+    "Thumbnail",
+    "Proof Hash",
+    "Proof dHash",
+    "Proof Match",
+    "Row ID",
+    "Revision",
+    "Updated At",
+    "TX History",
+    "Payment History"
+]
+
+# Columns maintained by edit_row, never set directly by an edit
+MANAGED_COLUMNS = ["Row ID", "Revision", "Updated At", "TX History", "Payment History", "Telegram Link", "Explorer Link"]
+
+# Fields of a payment replaced by a renewal, as kept in Payment History ("a|b|c|d|e; ...")
+PAYMENT_FIELDS = ["Tanggal Mulai", "Paket", "Harga (USDT)", "Blockchain Network", "Transaction Hash"]
+
+def column_letter(col):
+    """Sheet column letter for a 1-based column number (1 -> A, 27 -> AA)"""
+    label = ""
+    while col:
+        col, mod = divmod(col - 1, 26)
+        label = chr(ord("A") + mod) + label
+    return label
+
+def normalize_key(value):
+    """Normalize a transaction hash or Telegram ID for index lookups"""
+    return str(value).strip().lower()
+
+def new_row_id():
+    """Stable identifier for a new registration row"""
+    import uuid
+    
+    return uuid.uuid4().hex
+
+def row_revision(value):
+    """Revision number stored in a row; rows from before revisions count as 0"""
+    value = str(value).strip()
+    return int(value) if value.isdigit() else 0
+
+def edit_row(header, row, changes, updated_at, renewal=False):
+    """Raw row with ``changes`` applied for an in-place edit.
+
+    Links are regenerated, the revision is bumped and a replaced Transaction
+    Hash is kept in TX History so it still counts as used. For a renewal the
+    replaced payment is kept in Payment History so its revenue still counts.
+    """
+    record = dict(zip(header, list(row) + [""] * (len(header) - len(row))))
+    old_tx = str(record.get("Transaction Hash", "")).strip()
+    if renewal and "Payment History" in record:
+        payment = "|".join(str(record.get(field, "")).strip() for field in PAYMENT_FIELDS)
+        record["Payment History"] = "; ".join(p for p in (record["Payment History"].strip(), payment) if p)
+    record.update({k: str(v) for k, v in changes.items() if k in record and k not in MANAGED_COLUMNS})
+    
+    new_tx = str(record.get("Transaction Hash", "")).strip()
+    if old_tx and normalize_key(old_tx) != normalize_key(new_tx):
+        record["TX History"] = " ".join(t for t in (record.get("TX History", "").strip(), old_tx) if t)
+    record["Telegram Link"] = generate_telegram_link(record.get("Telegram User ID", ""))
+    record["Explorer Link"] = generate_explorer_link(record.get("Blockchain Network", ""), new_tx)
+    record["Revision"] = str(row_revision(record.get("Revision", "")) + 1)
+    record["Updated At"] = updated_at
+    return [record[h] for h in header]
+
 def generate_telegram_link(user_id):
     """Generate Telegram profile link from User ID"""
     return f"https://web.telegram.org/a/#{user_id}"
@@ -14,6 +90,13 @@ def generate_explorer_link(network, tx_hash):
     
     return explorers.get(network, f"https://etherscan.io/tx/{tx_hash}")
 
+def paginate(df, page, page_size):
+    """Return the rows of one page (1-based) and the total number of pages"""
+    total_pages = max(1, -(-len(df) // page_size))
+    page = min(max(1, int(page)), total_pages)
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size], total_pages
+
 def format_currency(amount):
     """Format currency with USDT symbol"""
     return f"${amount:,.2f} USDT"
@@ -62,3 +145,105 @@ def get_status_color(days_remaining):
         return "🟠"  # Expiring soon
     else:
         return "🟢"  # Active
+
+# Subscription length per package; packages not listed (e.g. Lifetime) never expire
+PACKAGE_DURATIONS_DAYS = {
+    "Monthly": 30,
+    "Quarterly": 90
+}
+
+def start_dates(df):
+    """'Tanggal Mulai' as datetimes; text (raw sheet rows) is parsed, typed frames are used as is"""
+    import pandas as pd
+    
+    start_date = df['Tanggal Mulai']
+    if pd.api.types.is_datetime64_any_dtype(start_date):
+        return start_date
+    return pd.to_datetime(start_date, format="%Y-%m-%d", errors="coerce")
+
+def expiry_dates(df):
+    """Vectorized calculate_expiry_date: expiry per row, NaT for Lifetime/unknown packages or bad dates"""
+    import pandas as pd
+    
+    start_date = start_dates(df)
+    duration = pd.to_timedelta(df['Paket'].map(PACKAGE_DURATIONS_DAYS).astype(float), unit="D")
+    return start_date + duration
+
+def compute_expiry(df, today=None):
+    """Vectorized calculate_expiry_date / get_days_remaining / get_status_color.
+
+    Works on whole columns of ``df`` ('Tanggal Mulai', 'Paket') against a single
+    ``today`` reference and returns a DataFrame (same index) with 'Expiry Date',
+    'Days Remaining' (nullable Int64, NA for no expiry), 'Status' and 'Sort Key'.
+    """
+    import numpy as np
+    import pandas as pd
+    
+    now = pd.Timestamp.now() if today is None else pd.Timestamp(today)
+    expiry_date = expiry_dates(df)
+    
+    # Floor division matches timedelta.days (rounds toward negative infinity)
+    days = ((expiry_date - now) // pd.Timedelta(days=1)).to_numpy(dtype=float, na_value=np.nan)
+    no_expiry = np.isnan(days)
+    
+    status = np.where(days < 0, "🔴", np.where(days <= 7, "🟠", "🟢"))
+    
+    # Soonest first, lifetime/unknown after active, expired at the very end
+    sort_key = np.where(no_expiry, 999999, np.where(days < 0, 1000000 - days, days))
+    
+    return pd.DataFrame({
+        'Expiry Date': expiry_date,
+        'Days Remaining': pd.Series(days, index=df.index).astype("Int64"),
+        'Status': status,
+        'Sort Key': sort_key
+    }, index=df.index)
+
+def edit_version(df, rows=None):
+    """Sum of the Revisions of the first ``rows`` rows of df; every in-place edit raises it"""
+    import pandas as pd
+    
+    if "Revision" not in df.columns:
+        return 0
+    revisions = df["Revision"] if rows is None else df["Revision"].iloc[:rows]
+    return int(pd.to_numeric(revisions, errors="coerce").fillna(0).sum())
+
+def active_users(df, today=None):
+    """Rows of df whose subscription has not expired (Days Remaining >= 0, or no expiry at all)"""
+    days = compute_expiry(df, today)['Days Remaining']
+    return df[days.isna() | (days >= 0)]
+
+# Uploads remembered per process until their row is written; above a full bulk import (5000 rows)
+RECENT_UPLOADS = 10000
+
+class RecentItems:
+    """Thread-safe mapping that keeps only the ``limit`` most recently set keys"""
+    
+    def __init__(self, limit=256):
+        import threading
+        from collections import OrderedDict
+        
+        self.limit = limit
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+    
+    def __len__(self):
+        return len(self._items)
+    
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.limit:
+                self._items.popitem(last=False)
+    
+    def get(self, key, default=None):
+        with self._lock:
+            return self._items.get(key, default)
+    
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._items.pop(key, default)
@@ -1,118 +1,406 @@
 """
-Setup Verification Script
-Run this to verify all configurations are correct before deployment
+Setup Verification & Health Probe
+Checks dependencies and configuration, then probes the configured backend:
+independent checks run concurrently, and sheet read/append plus blob
+upload/download are repeated to measure latency percentiles. Reads settings
+through config.load_config() and never imports Streamlit.
+
+    python verify_setup.py [--repeat 20] [--concurrency 1] [--payload-kb 64]
+                           [--output report.json] [--history data/health.jsonl] [--json]
+
+Appends go to a separate _healthcheck table and probe blobs are deleted
+afterwards, so registrations are never touched. Exits with status 1 when a
+check fails; append every report to --history to track latency over time.
 """
 
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import re
+import subprocess
 import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
-def verify_setup():
-    print("=" * 60)
-    print("LuxQuant Registration - Setup Verification")
-    print("=" * 60)
-    
-    errors = []
-    warnings = []
-    
-    # 1. Check Python version
-    print("\n1. Checking Python version...")
-    if sys.version_info >= (3, 8):
-        print(f"   ✅ Python {sys.version.split()[0]} (OK)")
-    else:
-        errors.append("Python 3.8+ required")
-        print(f"   ❌ Python {sys.version.split()[0]} (Too old)")
-    
-    # 2. Check dependencies
-    print("\n2. Checking dependencies...")
-    required_packages = [
-        'streamlit',
-        'gspread',
-        'google.auth',
-        'pandas',
-        'PIL'
-    ]
-    
-    for package in required_packages:
-        try:
-            __import__(package.replace('.', '_') if '.' in package else package)
-            print(f"   ✅ {package}")
-        except ImportError:
-            errors.append(f"Missing package: {package}")
-            print(f"   ❌ {package}")
-    
-    # 3. Check secrets file
-    print("\n3. Checking secrets configuration...")
+from config import load_config
+from metrics import Metrics
+
+OK = "ok"
+WARN = "warn"
+FAIL = "fail"
+
+ICONS = {OK: "✅", WARN: "⚠️ ", FAIL: "❌"}
+
+# Import name -> pip package; checked with find_spec so nothing heavy is imported
+REQUIRED_PACKAGES = {
+    "streamlit": "streamlit",
+    "gspread": "gspread",
+    "google.auth": "google-auth",
+    "google.cloud.storage": "google-cloud-storage",
+    "pandas": "pandas",
+    "numpy": "numpy",
+    "PIL": "pillow",
+}
+OPTIONAL_PACKAGES = {
+    "pyarrow": "pyarrow (Parquet export)",
+    "openpyxl": "openpyxl (XLSX import)",
+}
+
+SERVICE_ACCOUNT_KEYS = ["type", "project_id", "private_key", "client_email"]
+
+# Cloud Storage bucket names: 3-63 characters, up to 222 when dotted
+BUCKET_NAME_PATTERN = re.compile(r"^[a-z0-9][a-z0-9._-]{1,220}[a-z0-9]$")
+
+PROBE_PREFIX = "_healthcheck/"
+
+
+def find_package(name):
+    """True if a module can be imported, without importing it"""
     try:
-        import streamlit as st
-        
-        # Check GCP credentials
-        if "gcp_service_account" in st.secrets:
-            required_keys = ['type', 'project_id', 'private_key', 'client_email']
-            missing_keys = [k for k in required_keys if k not in st.secrets["gcp_service_account"]]
-            
-            if missing_keys:
-                errors.append(f"Missing keys in gcp_service_account: {missing_keys}")
-                print(f"   ❌ GCP credentials incomplete")
-            else:
-                print(f"   ✅ GCP service account credentials")
-        else:
-            errors.append("Missing gcp_service_account in secrets")
-            print(f"   ❌ GCP credentials not found")
-        
-        # Check Google config
-        if "google_config" in st.secrets:
-            if "sheet_id" in st.secrets["google_config"] and "folder_id" in st.secrets["google_config"]:
-                print(f"   ✅ Google Sheet & Drive configuration")
-            else:
-                errors.append("Missing sheet_id or folder_id in google_config")
-                print(f"   ❌ Sheet/Drive IDs not configured")
+        return importlib.util.find_spec(name) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+def check_python(config):
+    version = sys.version.split()[0]
+    if sys.version_info < (3, 8):
+        return FAIL, f"Python {version} (3.8+ required)"
+    return OK, f"Python {version}"
+
+
+def check_packages(config):
+    missing = [pip for module, pip in REQUIRED_PACKAGES.items() if not find_package(module)]
+    if missing:
+        return FAIL, f"Missing packages: {', '.join(missing)}"
+    optional = [label for module, label in OPTIONAL_PACKAGES.items() if not find_package(module)]
+    if optional:
+        return WARN, f"Optional packages not installed: {', '.join(optional)}"
+    return OK, f"{len(REQUIRED_PACKAGES)} required packages installed"
+
+
+def config_problems(config):
+    """(errors, warnings) found in the settings"""
+    from partitions import SCHEMES
+    from tx_verification import USDT_CONTRACTS
+
+    errors, warnings = [], []
+    storage_config = config.get("storage") or {}
+    backend = storage_config.get("backend", "google")
+    if backend not in ("google", "sqlite", "memory"):
+        errors.append(f"Unknown [storage] backend: {backend}")
+    if storage_config.get("partition") and storage_config["partition"] not in SCHEMES:
+        errors.append(f"[storage] partition must be one of: {', '.join(SCHEMES)}")
+
+    google_config = config.get("google_config") or {}
+    if backend == "google":
+        account = config.get("gcp_service_account")
+        if not account:
+            errors.append("Missing [gcp_service_account] (or GOOGLE_APPLICATION_CREDENTIALS)")
         else:
-            errors.append("Missing google_config in secrets")
-            print(f"   ❌ Google config not found")
-            
+            missing = [key for key in SERVICE_ACCOUNT_KEYS if not account.get(key)]
+            if missing:
+                errors.append(f"Missing keys in gcp_service_account: {', '.join(missing)}")
+        if not google_config.get("sheet_id"):
+            errors.append("Missing sheet_id in [google_config]")
+        bucket_name = google_config.get("bucket_name", "")
+        if not bucket_name:
+            errors.append("Missing bucket_name in [google_config]")
+        elif (not BUCKET_NAME_PATTERN.match(bucket_name) or ".." in bucket_name
+              or ("." not in bucket_name and len(bucket_name) > 63)):
+            errors.append(f"Invalid bucket_name: '{bucket_name}'")
+    if "folder_id" in google_config:
+        warnings.append("folder_id in [google_config] is no longer used (images go to bucket_name)")
+
+    verification = config.get("verification") or {}
+    known = {key for key, _, _ in USDT_CONTRACTS.values()}
+    unknown = sorted(set(verification.get("rpc") or {}) - known)
+    if unknown:
+        warnings.append(f"Unknown networks in [verification.rpc]: {', '.join(unknown)}")
+    if verification.get("rpc") and not (verification.get("recipient") or verification.get("recipients")):
+        warnings.append("[verification] has rpc endpoints but no recipient")
+    return errors, warnings
+
+
+def check_config(config):
+    if not config:
+        return FAIL, "No settings found (.streamlit/secrets.toml or LUXQUANT_CONFIG)"
+    errors, warnings = config_problems(config)
+    if errors:
+        return FAIL, "; ".join(errors)
+    if warnings:
+        return WARN, "; ".join(warnings)
+    backend = (config.get("storage") or {}).get("backend", "google")
+    return OK, f"backend {backend}"
+
+
+def check_mirror(config):
+    path = (config.get("local_store") or {}).get("path")
+    if not path:
+        return OK, "No SQLite mirror configured"
+    if not os.path.exists(path):
+        return WARN, f"Mirror not created yet: {path}"
+    from local_store import LocalStore
+
+    return OK, f"{LocalStore(path).row_count()} rows in {path}"
+
+
+def check_rpc(config):
+    from tx_verification import JsonRpcClient, RateLimiter
+
+    verification = config.get("verification") or {}
+    endpoints = verification.get("rpc") or {}
+    if not endpoints:
+        return OK, "No verification endpoints configured"
+
+    def head(item):
+        key, url = item
+        try:
+            client = JsonRpcClient(url, RateLimiter(0), timeout=float(verification.get("timeout_seconds", 10)))
+            return f"{key} block {int(client.call('eth_blockNumber', []), 16)}", True
+        except Exception as e:
+            return f"{key}: {str(e)}", False
+
+    with ThreadPoolExecutor(max_workers=len(endpoints)) as pool:
+        results = list(pool.map(head, endpoints.items()))
+    detail = "; ".join(text for text, _ in results)
+    # Verification is optional, so an unreachable node is a warning only
+    return (OK if all(ok for _, ok in results) else WARN), detail
+
+
+def check_sheet(config):
+    from google_services import make_stores
+    from utils import SHEET_HEADERS
+
+    rows, _ = make_stores(config)
+    header = rows.header()
+    if not header:
+        return WARN, "Registration table is empty (header is written on the first registration)"
+    missing = [c for c in SHEET_HEADERS if c not in header]
+    if missing:
+        return WARN, f"{len(header)} columns; added on next write: {', '.join(missing)}"
+    return OK, f"{len(header)} columns"
+
+
+CHECKS = {
+    "python": check_python,
+    "packages": check_packages,
+    "config": check_config,
+    "local_mirror": check_mirror,
+    "verification_rpc": check_rpc,
+}
+
+# Checks that need a usable config
+ACCESS_CHECKS = {
+    "sheet": check_sheet,
+}
+
+
+def run_check(name, fn, config):
+    start = time.perf_counter()
+    try:
+        status, detail = fn(config)
     except Exception as e:
-        errors.append(f"Error reading secrets: {str(e)}")
-        print(f"   ❌ Secrets file error: {str(e)}")
-    
-    # 4. Test Google Services connection
-    print("\n4. Testing Google Services connection...")
+        status, detail = FAIL, str(e)
+    return {"name": name, "status": status, "detail": detail,
+            "ms": round((time.perf_counter() - start) * 1000, 3)}
+
+
+def repeat(probe, name, fn, times, concurrency):
+    """Call fn(i) ``times`` times, ``concurrency`` at once, timing each call as ``name``"""
+    errors = []
+
+    def attempt(i):
+        try:
+            with probe.timed(name):
+                fn(i)
+        except Exception as e:
+            errors.append(str(e))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(attempt, range(times)))
+    return errors
+
+
+def probe_sheet_read(config, probe, args):
+    """Time full reads of the registration table, what a cold start or a full refresh pays"""
+    from google_services import make_stores
+
+    rows, _ = make_stores(config)
+    return repeat(probe, "sheet_read", lambda i: rows.read_all(), args.repeat, args.concurrency)
+
+
+def probe_sheet_append(config, probe, args):
+    from google_services import make_probe_store
+
+    store = make_probe_store(config)
+    store.set_header(["Timestamp", "Host", "Run", "Index"])
+    run_id = uuid.uuid4().hex[:8]
+    host = platform.node()
+    return repeat(probe, "sheet_append",
+                  lambda i: store.append_rows([[datetime.now().strftime("%Y-%m-%d %H:%M:%S"), host, run_id, str(i)]]),
+                  args.repeat, args.concurrency)
+
+
+def probe_blob(config, probe, args):
+    """Upload then download ``repeat`` probe blobs, and delete them afterwards"""
+    from google_services import make_stores
+
+    _, blobs = make_stores(config)
+    payload = os.urandom(args.payload_kb * 1024)
+    names = [f"{PROBE_PREFIX}{uuid.uuid4().hex}.bin" for _ in range(args.repeat)]
+    uploaded = set()
+
+    def upload(i):
+        blobs.upload(names[i], payload, "application/octet-stream")
+        uploaded.add(names[i])
+
+    def download(i):
+        if names[i] in uploaded and blobs.download(names[i]) != payload:
+            raise Exception(f"Downloaded {names[i]} differs from the upload")
+
+    errors = repeat(probe, "blob_upload", upload, args.repeat, args.concurrency)
+    errors += repeat(probe, "blob_download", download, args.repeat, args.concurrency)
+    for name in uploaded:
+        try:
+            blobs.delete(name)
+        except Exception as e:
+            errors.append(f"Cleanup of {name} failed: {str(e)}")
+    return errors
+
+
+# Probe -> (function, timed operations)
+PROBES = {
+    "sheet_read": (probe_sheet_read, ["sheet_read"]),
+    "sheet_append": (probe_sheet_append, ["sheet_append"]),
+    "blob": (probe_blob, ["blob_upload", "blob_download"]),
+}
+
+
+def run_probe(name, fn, ops, config, probe, args):
+    start = time.perf_counter()
     try:
-        from google_services import GoogleServices
-        gs = GoogleServices()
-        print(f"   ✅ Google Sheets connection")
-        print(f"   ✅ Google Drive connection")
-        
-        # Try to read sheet
-        df = gs.get_all_users()
-        print(f"   ✅ Sheet accessible (current rows: {len(df)})")
-        
+        errors = fn(config, probe, args)
     except Exception as e:
-        errors.append(f"Google Services error: {str(e)}")
-        print(f"   ❌ Connection failed: {str(e)}")
-    
-    # Summary
-    print("\n" + "=" * 60)
-    print("VERIFICATION SUMMARY")
+        errors = [str(e)]
+    if not errors:
+        status, detail = OK, f"{args.repeat} runs"
+    else:
+        # Only calls that never succeed fail the probe; occasional errors are a warning
+        stats = probe.snapshot()["stages"]
+        failed = any(op not in stats or stats[op]["errors"] == stats[op]["count"] for op in ops)
+        status, detail = (FAIL if failed else WARN), f"{len(errors)} errors, first: {errors[0]}"
+    return {"name": f"probe_{name}", "status": status, "detail": detail,
+            "ms": round((time.perf_counter() - start) * 1000, 3)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def verify_setup(config, args):
+    """Run every check and probe concurrently; returns the report dict"""
+    storage_config = config.get("storage") or {}
+    probe = Metrics()
+    started = time.perf_counter()
+
+    config_ok = run_check("config", check_config, config)["status"] != FAIL
+    with ThreadPoolExecutor(max_workers=len(CHECKS) + len(ACCESS_CHECKS) + len(PROBES)) as pool:
+        futures = [pool.submit(run_check, name, fn, config) for name, fn in CHECKS.items()]
+        if config_ok:
+            futures += [pool.submit(run_check, name, fn, config) for name, fn in ACCESS_CHECKS.items()]
+        if config_ok and not args.skip_probes:
+            futures += [pool.submit(run_probe, name, fn, ops, config, probe, args)
+                        for name, (fn, ops) in PROBES.items()]
+        results = [f.result() for f in futures]
+
+    statuses = {r["status"] for r in results}
+    latency = {}
+    for op, stats in probe.snapshot()["stages"].items():
+        latency[op] = {k: stats[k] for k in ("count", "errors", "mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms",
+                                              "histogram")}
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "backend": storage_config.get("backend", "google"),
+            "partition": storage_config.get("partition") or "",
+            "repeat": args.repeat,
+            "concurrency": args.concurrency,
+            "payload_kb": args.payload_kb,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+        },
+        "status": FAIL if FAIL in statuses else WARN if WARN in statuses else OK,
+        "checks": results,
+        "latency": latency,
+    }
+
+
+def print_report(report):
+    meta = report["meta"]
     print("=" * 60)
-    
-    if not errors and not warnings:
-        print("\n✅ ALL CHECKS PASSED!")
-        print("\nYou can now run the app with:")
-        print("   streamlit run app.py")
-        print("\nOr deploy to Streamlit Cloud!")
+    print("LuxQuant Registration - Setup Verification")
+    print("=" * 60)
+    print(f"backend {meta['backend']}, {meta['repeat']} runs x {meta['concurrency']} concurrent, "
+          f"{meta['duration_ms'] / 1000:.1f}s\n")
+    for check in report["checks"]:
+        print(f"{ICONS[check['status']]} {check['name']:<18} {check['detail']} ({check['ms']:.0f} ms)")
+
+    if report["latency"]:
+        print(f"\n{'operation':<16} {'runs':>6} {'errors':>7} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+        for op, stats in report["latency"].items():
+            print(f"{op:<16} {stats['count']:>6} {stats['errors']:>7} {stats['p50_ms']:>10.1f} "
+                  f"{stats['p90_ms']:>10.1f} {stats['p99_ms']:>10.1f} {stats['max_ms']:>10.1f}")
+
+    print()
+    if report["status"] == FAIL:
+        print("❌ Please fix the errors above before running the app.")
+    elif report["status"] == WARN:
+        print("⚠️  Checks passed with warnings. Run the app with: streamlit run app.py")
     else:
-        if errors:
-            print(f"\n❌ ERRORS FOUND ({len(errors)}):")
-            for i, error in enumerate(errors, 1):
-                print(f"   {i}. {error}")
-        
-        if warnings:
-            print(f"\n⚠️  WARNINGS ({len(warnings)}):")
-            for i, warning in enumerate(warnings, 1):
-                print(f"   {i}. {warning}")
-        
-        print("\nPlease fix the errors above before running the app.")
-    
-    print("\n" + "=" * 60)
+        print("✅ ALL CHECKS PASSED! Run the app with: streamlit run app.py")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify the setup and measure backend latency")
+    parser.add_argument("--repeat", type=int, default=10, help="timed calls per probe operation")
+    parser.add_argument("--concurrency", type=int, default=1, help="calls in flight at once per probe operation")
+    parser.add_argument("--payload-kb", type=int, default=64, help="size of each probe blob")
+    parser.add_argument("--skip-probes", action="store_true", help="only check dependencies, config and access")
+    parser.add_argument("--output", default=None, help="write the JSON report to this file")
+    parser.add_argument("--history", default=None, help="append the report as one JSON line to this file")
+    parser.add_argument("--json", action="store_true", help="print the JSON report instead of the summary")
+    args = parser.parse_args()
+    args.repeat = max(1, args.repeat)
+    args.concurrency = max(1, args.concurrency)
+
+    report = verify_setup(load_config(), args)
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.history:
+        os.makedirs(os.path.dirname(args.history) or ".", exist_ok=True)
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps(report, ensure_ascii=False) + "\n")
+
+    sys.exit(1 if report["status"] == FAIL else 0)
+
 
 if __name__ == "__main__":
-    verify_setup()
+    main()
@@ -0,0 +1,66 @@
+"""
+Transaction Verification
+Headless batch job for cron: checks every registration's USDT payment on its
+blockchain network (see [verification] in README). Reads the SQLite mirror
+(see [local_store] in README) and never imports Streamlit.
+
+    python verify_transactions.py [--db data/registrations.db] [--only-unverified] [--show-failed]
+
+Confirmed transactions are cached, so repeated runs only look up new,
+pending or previously unreachable transactions.
+"""
+
+import argparse
+import os
+import sys
+from collections import Counter
+
+from config import load_config
+from local_store import LocalStore
+from tx_verification import STATUS_LABELS, UNCHECKED, VERIFIED, TxVerifier
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify registration payments on-chain")
+    parser.add_argument("--db", default="data/registrations.db", help="SQLite mirror of the registration sheet")
+    parser.add_argument("--only-unverified", action="store_true", help="skip rows that are already verified")
+    parser.add_argument("--show-failed", action="store_true", help="list every row that is not verified")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        sys.exit(f"❌ Mirror not found: {args.db}")
+
+    verifier = TxVerifier(load_config())
+    if not verifier.enabled:
+        sys.exit("❌ Configure recipient and rpc endpoints in [verification]")
+
+    header, rows = LocalStore(args.db).get_rows()
+    records = [dict(zip(header, row)) for row in rows if any(str(v).strip() for v in row)]
+    items = [(r.get("Blockchain Network", ""), r.get("Transaction Hash", ""), r.get("Harga (USDT)", ""))
+             for r in records]
+
+    if args.only_unverified:
+        cached = verifier.cached_results(items)
+        keep = [i for i, result in enumerate(cached) if result["status"] != VERIFIED]
+        records, items = [records[i] for i in keep], [items[i] for i in keep]
+
+    def progress(done, total):
+        if done % 50 == 0 or done == total:
+            print(f"  looked up {done}/{total}", file=sys.stderr)
+
+    results = verifier.verify_many(items, progress=progress)
+
+    counts = Counter(result["status"] for result in results)
+    for status, label in STATUS_LABELS.items():
+        if counts.get(status) and status != UNCHECKED:
+            print(f"  {label:<16} {counts[status]:>6}")
+    if args.show_failed:
+        for record, result in zip(records, results):
+            if result["status"] != VERIFIED:
+                print(f"{result['label']}\t{record.get('Nama User', '')}\t{record.get('Transaction Hash', '')}\t{result['detail']}")
+
+    print(f"✅ Checked {len(results)} registrations, {counts.get(VERIFIED, 0)} verified")
+
+
+if __name__ == "__main__":
+    main()